@@ -0,0 +1,58 @@
+"""Measure peak memory when capturing large outputs with each capture policy.
+
+Usage: python -m benchmarks.capture_memory [size-in-mb]
+
+Each policy is measured in a separate Python process so that peak memory
+usage isn't affected by earlier measurements.
+"""
+
+from __future__ import print_function
+
+import resource
+import subprocess
+import sys
+import time
+
+import spur
+from .shells import create_shells
+
+
+_POLICIES = {
+    "everything": lambda: spur.capture.everything(),
+    "discard": lambda: spur.capture.discard(),
+    "tail(1MB)": lambda: spur.capture.tail(1024 * 1024),
+    "head_and_tail(1MB)": lambda: spur.capture.head_and_tail(512 * 1024, 512 * 1024),
+    "spill_to_file(1MB)": lambda: spur.capture.spill_to_file(1024 * 1024),
+}
+
+
+def main(size_mb=1024):
+    for shell_name, create_shell in create_shells():
+        for policy_name in sorted(_POLICIES):
+            subprocess.check_call([
+                sys.executable, "-m", "benchmarks.capture_memory",
+                "--measure", shell_name, policy_name, str(size_mb),
+            ])
+
+
+def _measure(shell_name, policy_name, size_mb):
+    create_shell = dict(create_shells())[shell_name]
+    size = size_mb * 1024 * 1024
+    with create_shell() as shell:
+        start = time.time()
+        result = shell.run(
+            ["head", "-c", str(size), "/dev/zero"],
+            capture=_POLICIES[policy_name](),
+        )
+        elapsed = time.time() - start
+
+    peak_rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+    print("{0:<6} {1:<20} peak rss: {2:8.1f} MB  {3:6.1f} MB/s".format(
+        shell_name, policy_name, peak_rss_mb, size_mb / elapsed))
+
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ["--measure"]:
+        _measure(sys.argv[2], sys.argv[3], int(sys.argv[4]))
+    else:
+        main(*map(int, sys.argv[1:]))
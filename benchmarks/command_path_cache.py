@@ -0,0 +1,32 @@
+"""Measure the time taken to run the same command many times over SSH, with
+and without caching the path of the command.
+
+Usage: python -m benchmarks.command_path_cache [number-of-commands]
+
+Uses the SSH server given by the TEST_SSH_* environment variables, or a
+stand-in server running in the same process if they're not set.
+"""
+
+from __future__ import print_function
+
+import sys
+import time
+
+from .shells import create_ssh_shell
+
+
+def main(command_count=200):
+    for name, ttl in [("no cache", None), ("cache", 60)]:
+        with create_ssh_shell(command_path_cache_ttl=ttl) as shell:
+            shell.run(["true"])
+            if ttl is not None:
+                shell.resolve_commands(["stat"])
+            start = time.time()
+            for index in range(command_count):
+                shell.run(["stat", "/tmp"])
+            elapsed = time.time() - start
+        print("{0:<9} {1:7.2f} ms per command".format(name, elapsed / command_count * 1000))
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:]))
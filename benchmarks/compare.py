@@ -0,0 +1,75 @@
+"""Compare two sets of results written by benchmarks.suite.
+
+Usage: python -m benchmarks.compare old-results.json new-results.json
+"""
+
+from __future__ import print_function
+
+import json
+import sys
+
+
+# Units for which a smaller value is better. For all other units, such as
+# MB/s, a larger value is better.
+_LOWER_IS_BETTER = set(["ms"])
+
+
+def main(old_path, new_path):
+    old = _load(old_path)
+    new = _load(new_path)
+
+    for environment in [old, new]:
+        print("{0}: {1}".format(
+            environment["path"],
+            ", ".join(
+                "{0}={1}".format(key, value)
+                for key, value in sorted(environment["environment"].items())
+            ),
+        ))
+    print()
+    # The change is the factor by which the new result is better than the
+    # old one, so that values above 1 are always improvements
+    print("{0:<6} {1:<40} {2:>18} {3:>18} {4:>8}".format("shell", "benchmark", "old", "new", "change"))
+    for shell_name in sorted(set(old["results"]) | set(new["results"])):
+        old_metrics = old["results"].get(shell_name, {})
+        new_metrics = new["results"].get(shell_name, {})
+        for name in sorted(set(old_metrics) | set(new_metrics)):
+            print("{0:<6} {1:<40} {2:>18} {3:>18} {4:>8}".format(
+                shell_name,
+                name,
+                _format_value(old_metrics.get(name)),
+                _format_value(new_metrics.get(name)),
+                _format_change(old_metrics.get(name), new_metrics.get(name)),
+            ))
+
+
+def _load(path):
+    with open(path) as results_file:
+        results = json.load(results_file)
+    results["path"] = path
+    return results
+
+
+def _format_value(metric):
+    if metric is None or "value" not in metric:
+        return "-"
+    else:
+        return "{0:.2f} {1}".format(metric["value"], metric["unit"])
+
+
+def _format_change(old_metric, new_metric):
+    if (
+        old_metric is None or new_metric is None or
+        "value" not in old_metric or "value" not in new_metric or
+        old_metric["value"] == 0
+    ):
+        return ""
+
+    ratio = new_metric["value"] / old_metric["value"]
+    if new_metric["unit"] in _LOWER_IS_BETTER:
+        ratio = 1 / ratio if ratio else float("inf")
+    return "{0:.2f}x".format(ratio)
+
+
+if __name__ == "__main__":
+    main(*sys.argv[1:])
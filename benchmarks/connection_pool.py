@@ -0,0 +1,39 @@
+"""Measure the latency of running a command with a fresh SshShell each time,
+with and without a connection pool.
+
+Usage: python -m benchmarks.connection_pool [number-of-commands]
+
+Uses the SSH server given by the TEST_SSH_* environment variables, or a
+stand-in server running in the same process if they're not set.
+"""
+
+from __future__ import print_function
+
+import sys
+import time
+
+import spur.pool
+from .shells import create_ssh_shell
+
+
+def main(command_count=50):
+    _benchmark("no pool", command_count, lambda: create_ssh_shell())
+
+    with spur.pool.ConnectionPool() as pool:
+        _benchmark("pool", command_count, lambda: create_ssh_shell(connection_pool=pool))
+        statistics = pool.statistics()
+        print("pool hits: {0}  misses: {1}  handshake time: {2:.2f}s".format(
+            statistics.hits, statistics.misses, statistics.handshake_time))
+
+
+def _benchmark(name, command_count, create_shell):
+    start = time.time()
+    for index in range(command_count):
+        with create_shell() as shell:
+            shell.run(["true"])
+    elapsed = time.time() - start
+    print("{0:<8} {1:7.1f} ms per command".format(name, elapsed / command_count * 1000))
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:]))
@@ -0,0 +1,42 @@
+"""Measure the number of file operations per second using shell.files, and
+for comparison, checking whether a file exists by running test as a process.
+
+Usage: python -m benchmarks.file_operations [number-of-files]
+"""
+
+from __future__ import print_function
+
+import sys
+import time
+import uuid
+
+from .shells import create_shells
+
+
+def main(file_count=200):
+    for name, create_shell in create_shells():
+        with create_shell() as shell:
+            root = "/tmp/{0}".format(uuid.uuid4())
+            paths = ["{0}/{1}".format(root, index) for index in range(file_count)]
+            shell.files.makedirs(root)
+            try:
+                _benchmark(name, "write_bytes", paths, lambda path: shell.files.write_bytes(path, b"hello\n"))
+                _benchmark(name, "exists", paths, shell.files.exists)
+                _benchmark(name, "stat", paths, shell.files.stat)
+                _benchmark(name, "read_bytes", paths, shell.files.read_bytes)
+                _benchmark(name, "run test -e", paths, lambda path: shell.run(["test", "-e", path]))
+                _benchmark(name, "remove", paths, shell.files.remove)
+            finally:
+                shell.run(["rm", "-rf", root])
+
+
+def _benchmark(shell_name, name, paths, operation):
+    start = time.time()
+    for path in paths:
+        operation(path)
+    elapsed = time.time() - start
+    print("{0:<6} {1:<12} {2:10.1f} operations per second".format(shell_name, name, len(paths) / elapsed))
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:]))
@@ -0,0 +1,71 @@
+"""Measure the throughput of SshShell.upload_files and download_files for
+many small files and for a few large files, with different concurrency.
+
+Usage: python -m benchmarks.file_transfer [small-file-count] [large-file-size-in-mb]
+
+Uses the SSH server given by the TEST_SSH_* environment variables, or a
+stand-in server running in the same process if they're not set.
+"""
+
+from __future__ import print_function
+
+import os
+import sys
+import time
+import uuid
+
+from spur.tempdir import create_temporary_dir
+from .shells import create_ssh_shell
+
+
+_CONCURRENCIES = [1, 4, 8]
+
+
+def main(small_file_count=1000, large_file_size_mb=64):
+    workloads = [
+        ("small", small_file_count, 4 * 1024),
+        ("large", 4, large_file_size_mb * 1024 * 1024),
+    ]
+    with create_ssh_shell() as shell:
+        for workload_name, file_count, file_size in workloads:
+            with create_temporary_dir() as local_dir:
+                local_paths = _write_files(local_dir, file_count, file_size)
+                for concurrency in _CONCURRENCIES:
+                    remote_dir = "/tmp/{0}".format(uuid.uuid4())
+                    remote_paths = ["{0}/{1}".format(remote_dir, index) for index in range(file_count)]
+                    download_paths = [path + ".download" for path in local_paths]
+                    try:
+                        upload = _time(lambda: shell.upload_files(zip(local_paths, remote_paths), concurrency=concurrency))
+                        download = _time(lambda: shell.download_files(zip(remote_paths, download_paths), concurrency=concurrency))
+                    finally:
+                        shell.run(["rm", "-rf", remote_dir])
+                        for path in download_paths:
+                            if os.path.exists(path):
+                                os.remove(path)
+
+                    total_mb = file_count * file_size / (1024.0 * 1024.0)
+                    print("{0:<6} concurrency {1}: upload {2:7.1f} MB/s {3:7.1f} files/s, download {4:7.1f} MB/s {5:7.1f} files/s".format(
+                        workload_name, concurrency,
+                        total_mb / upload, file_count / upload,
+                        total_mb / download, file_count / download,
+                    ))
+
+
+def _time(func):
+    start = time.time()
+    func()
+    return time.time() - start
+
+
+def _write_files(root, file_count, file_size):
+    paths = []
+    for index in range(file_count):
+        path = os.path.join(root, str(index))
+        with open(path, "wb") as f:
+            f.write(os.urandom(file_size))
+        paths.append(path)
+    return paths
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:]))
@@ -0,0 +1,40 @@
+"""Measure how the latency of running a command on a group of shells grows
+with the number of shells.
+
+Usage: python -m benchmarks.group_latency [max-concurrency]
+
+Each shell in the group is a separate instance, so SshShell instances each
+make their own connection.
+"""
+
+from __future__ import print_function
+
+import sys
+import time
+
+import spur
+from .shells import create_shells
+
+
+_SHELL_COUNTS = [1, 10, 50, 100, 300]
+
+
+def main(max_concurrency=32):
+    for shell_name, create_shell in create_shells():
+        for shell_count in _SHELL_COUNTS:
+            with spur.ShellGroup([create_shell() for i in range(shell_count)], max_concurrency=max_concurrency) as group:
+                start = time.time()
+                first_result = None
+                for result in group.run(["sh", "-c", "sleep 0.1; echo hello"]):
+                    if result.error is not None:
+                        raise result.error
+                    if first_result is None:
+                        first_result = time.time()
+                finished = time.time()
+
+            print("{0:<6} shells: {1:4}  first result: {2:6.2f}s  all results: {3:6.2f}s".format(
+                shell_name, shell_count, first_result - start, finished - start))
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:]))
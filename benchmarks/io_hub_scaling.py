@@ -0,0 +1,53 @@
+"""Compare reading output with a thread per stream against SelectorIoHub.
+
+Usage: python -m benchmarks.io_hub_scaling [number-of-processes]
+"""
+
+from __future__ import print_function
+
+import sys
+import threading
+import time
+
+import spur
+import spur.io
+
+
+class _NullFile(object):
+    def write(self, value):
+        pass
+
+
+def main(process_count=500):
+    _benchmark("threads", process_count, spur.LocalShell())
+    with spur.io.SelectorIoHub() as hub:
+        _benchmark("selector", process_count, spur.LocalShell(io_hub=hub))
+
+
+def _benchmark(name, process_count, shell):
+    rss_before = _rss_kb()
+    start = time.time()
+    processes = [
+        shell.spawn(["sh", "-c", "echo hello; sleep 1"], stdout=_NullFile())
+        for i in range(process_count)
+    ]
+    spawned = time.time()
+    thread_count = threading.active_count()
+    rss = _rss_kb()
+    for process in processes:
+        process.wait_for_result()
+    finished = time.time()
+
+    print("{0:<9} threads: {1:5}  rss: +{2:6} KiB  spawn: {3:.2f}s  total: {4:.2f}s".format(
+        name, thread_count, rss - rss_before, spawned - start, finished - start))
+
+
+def _rss_kb():
+    with open("/proc/self/status") as status:
+        for line in status:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1])
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:]))
@@ -0,0 +1,83 @@
+"""A TCP proxy that delays data in each direction, used to simulate a
+high-latency link to an SSH server running locally.
+"""
+
+import socket
+import threading
+import time
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+
+class LatencyProxy(object):
+    def __init__(self, target_host, target_port, round_trip_time):
+        self._target = (target_host, target_port)
+        self._delay = round_trip_time / 2.0
+        self._server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._server.bind(("127.0.0.1", 0))
+        self._server.listen(16)
+        self.port = self._server.getsockname()[1]
+        self._closed = False
+        _start_daemon(self._accept)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        self._closed = True
+        self._server.close()
+
+    def _accept(self):
+        while not self._closed:
+            try:
+                client, address = self._server.accept()
+            except (socket.error, OSError):
+                return
+            server = socket.create_connection(self._target)
+            for sock in (client, server):
+                sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            self._forward(client, server)
+            self._forward(server, client)
+
+    def _forward(self, source, destination):
+        # Data is queued with the time it should be sent, so that delaying
+        # data doesn't also limit throughput
+        pending = queue.Queue()
+
+        def receive():
+            while True:
+                try:
+                    data = source.recv(64 * 1024)
+                except (socket.error, OSError):
+                    data = b""
+                pending.put((time.time() + self._delay, data))
+                if not data:
+                    return
+
+        def send():
+            while True:
+                send_time, data = pending.get()
+                time.sleep(max(0, send_time - time.time()))
+                try:
+                    if data:
+                        destination.sendall(data)
+                    else:
+                        destination.shutdown(socket.SHUT_WR)
+                        return
+                except (socket.error, OSError):
+                    return
+
+        _start_daemon(receive)
+        _start_daemon(send)
+
+
+def _start_daemon(target):
+    thread = threading.Thread(target=target)
+    thread.daemon = True
+    thread.start()
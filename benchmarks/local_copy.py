@@ -0,0 +1,76 @@
+"""Measure the time and CPU time taken to copy a large local file using
+spur.fastcopy, compared to shutil.copyfile, copying through a Python buffer,
+and running cp as a process (as used by FileOperations.copy_file).
+
+Usage: python -m benchmarks.local_copy [file-size-in-mb] [dir]
+"""
+
+from __future__ import print_function
+
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from spur import fastcopy
+
+
+def _copy_through_buffer(source, destination):
+    with open(source, "rb") as source_file:
+        with open(destination, "wb") as destination_file:
+            shutil.copyfileobj(source_file, destination_file, 1024 * 1024)
+
+
+_METHODS = [
+    ("fastcopy", fastcopy.copyfile),
+    ("shutil.copyfile", shutil.copyfile),
+    ("python buffer", _copy_through_buffer),
+    ("cp process", lambda source, destination: subprocess.check_call(["cp", source, destination])),
+]
+
+_REPEATS = 3
+
+
+def main(size_mb=1024, dir_path=None):
+    temp_dir = tempfile.mkdtemp(dir=dir_path)
+    try:
+        source = os.path.join(temp_dir, "source")
+        with open(source, "wb") as f:
+            for index in range(size_mb):
+                f.write(os.urandom(1024 * 1024))
+
+        destination = os.path.join(temp_dir, "destination")
+        # The first copy is slower regardless of the method used
+        _time_copy(shutil.copyfile, source, destination)
+
+        for name, copy in _METHODS:
+            elapsed, cpu = min(_time_copy(copy, source, destination) for repeat in range(_REPEATS))
+            print("{0:<16} {1:6.2f}s  {2:7.1f} MB/s  cpu {3:5.2f}s".format(name, elapsed, size_mb / elapsed, cpu))
+    finally:
+        shutil.rmtree(temp_dir)
+
+
+def _time_copy(copy, source, destination):
+    cpu_before = _cpu_time()
+    start = time.time()
+    copy(source, destination)
+    elapsed = time.time() - start
+    cpu = _cpu_time() - cpu_before
+    os.remove(destination)
+    return elapsed, cpu
+
+
+def _cpu_time():
+    total = 0
+    for who in [resource.RUSAGE_SELF, resource.RUSAGE_CHILDREN]:
+        usage = resource.getrusage(who)
+        total += usage.ru_utime + usage.ru_stime
+    return total
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    main(*([int(arg) for arg in args[:1]] + args[1:]))
@@ -0,0 +1,43 @@
+"""Measure how quickly LocalShell spawns commands from a process using a lot
+of memory, where the cost of copying the process when spawning dominates.
+
+Usage: python -m benchmarks.local_spawn [resident-size-in-mb] [number-of-commands]
+
+For comparison, also spawns commands using subprocess with
+preexec_fn=os.setpgrp, which forces the process to be copied using fork.
+"""
+
+from __future__ import print_function
+
+import os
+import subprocess
+import sys
+import time
+
+import spur
+
+
+def main(rss_mb=1024, command_count=200):
+    # Touch every page so that the memory is resident
+    memory = bytearray(rss_mb * 1024 * 1024)
+    for index in range(0, len(memory), 4096):
+        memory[index] = 1
+
+    shell = spur.LocalShell()
+    modes = [
+        ("default", lambda: shell.run(["true"])),
+        ("new_process_group", lambda: shell.run(["true"], new_process_group=True)),
+        ("update_env", lambda: shell.run(["true"], update_env={"SPUR_BENCHMARK": "1"})),
+        ("subprocess preexec_fn", lambda: subprocess.Popen(["true"], preexec_fn=os.setpgrp).wait()),
+    ]
+    for name, run in modes:
+        run()
+        start = time.time()
+        for index in range(command_count):
+            run()
+        elapsed = time.time() - start
+        print("{0:<22} {1:8.0f} spawns/s".format(name, command_count / elapsed))
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:]))
@@ -0,0 +1,48 @@
+"""Measure the throughput of running many commands in parallel on one
+SshShell, and of reading their output, with different numbers of
+connections.
+
+Usage: python -m benchmarks.max_connections [number-of-commands] [output-size-mb]
+
+Uses the SSH server given by the TEST_SSH_* environment variables, or a
+stand-in server running in the same process if they're not set.
+"""
+
+from __future__ import print_function
+
+import concurrent.futures
+import sys
+import time
+
+from .shells import create_ssh_shell
+
+
+def main(command_count=50, output_size_mb=4):
+    for max_connections in [1, 2, 4, 8]:
+        with create_ssh_shell(max_connections=max_connections) as shell:
+            # Open the connections before timing anything
+            _run_in_parallel(shell, command_count, ["true"])
+            commands_per_second = _run_in_parallel(shell, command_count, ["true"])
+
+            size = output_size_mb * 1024 * 1024
+            output_command = ["head", "-c", str(size), "/dev/zero"]
+            start = time.time()
+            _run_in_parallel(shell, 8, output_command)
+            throughput = 8 * output_size_mb / (time.time() - start)
+
+        print("{0} connections: {1:7.1f} commands/s  {2:7.1f} MB/s".format(
+            max_connections, commands_per_second, throughput))
+
+
+def _run_in_parallel(shell, command_count, command):
+    executor = concurrent.futures.ThreadPoolExecutor(max_workers=command_count)
+    try:
+        start = time.time()
+        list(executor.map(lambda index: shell.run(command), range(command_count)))
+        return command_count / (time.time() - start)
+    finally:
+        executor.shutdown()
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:]))
@@ -0,0 +1,41 @@
+"""Measure how quickly the output of a command is captured.
+
+Usage: python -m benchmarks.output_throughput [size-in-mb]
+"""
+
+from __future__ import print_function
+
+import sys
+import time
+
+from .shells import create_shells
+
+
+class _NullFile(object):
+    def write(self, value):
+        pass
+
+
+def main(size_mb=100):
+    size = size_mb * 1024 * 1024
+    command = ["head", "-c", str(size), "/dev/zero"]
+    modes = [
+        ("captured", {}),
+        ("stdout sink", {"stdout": _NullFile()}),
+        ("stdout sink, encoding", {"stdout": _NullFile(), "encoding": "ascii"}),
+        ("pty", {"use_pty": True}),
+    ]
+
+    for shell_name, create_shell in create_shells():
+        with create_shell() as shell:
+            for mode_name, kwargs in modes:
+                start = time.time()
+                result = shell.run(command, **kwargs)
+                elapsed = time.time() - start
+                assert len(result.output) == size
+                print("{0:<6} {1:<24} {2:8.1f} MB/s".format(
+                    shell_name, mode_name, size_mb / elapsed))
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:]))
@@ -0,0 +1,69 @@
+"""Measure the throughput of SshShell under each performance profile when
+capturing the output of a command, reading a file using open, and uploading
+a directory.
+
+Usage: python -m benchmarks.performance_profiles [size-in-mb]
+
+Uses the SSH server given by the TEST_SSH_* environment variables, or a
+stand-in server running in the same process if they're not set. The data
+written and read is random, so isn't compressible; the "zeros" results use
+output that's all zero bytes instead.
+"""
+
+from __future__ import print_function
+
+import os
+import sys
+import time
+
+import spur.ssh
+from spur.tempdir import create_temporary_dir
+from .shells import create_ssh_shell
+
+
+_PROFILES = [
+    ("default", spur.ssh.PerformanceProfiles.default),
+    ("bulk", spur.ssh.PerformanceProfiles.bulk),
+    ("slow_network", spur.ssh.PerformanceProfiles.slow_network),
+]
+
+
+def main(size_mb=32):
+    size = size_mb * 1024 * 1024
+    with create_temporary_dir() as local_dir:
+        for index in range(size_mb):
+            with open(os.path.join(local_dir, str(index)), "wb") as f:
+                f.write(os.urandom(1024 * 1024))
+
+        for profile_name, profile in _PROFILES:
+            with create_ssh_shell(performance_profile=profile) as shell:
+                shell.run(["true"])
+                with shell.temporary_dir() as remote_dir:
+                    results = [
+                        ("output", _measure(lambda: shell.run(
+                            ["sh", "-c", "head -c {0} /dev/urandom".format(size)]))),
+                        ("output, zeros", _measure(lambda: shell.run(
+                            ["head", "-c", str(size), "/dev/zero"]))),
+                        ("upload_dir", _measure(lambda: shell.upload_dir(
+                            local_dir, "{0}/upload".format(remote_dir), ignore=[]))),
+                        ("open().read()", _measure(lambda: _read_files(
+                            shell, "{0}/upload".format(remote_dir), size_mb))),
+                    ]
+                for name, elapsed in results:
+                    print("{0:<14} {1:<16} {2:8.1f} MB/s".format(profile_name, name, size_mb / elapsed))
+
+
+def _measure(func):
+    start = time.time()
+    func()
+    return time.time() - start
+
+
+def _read_files(shell, remote_dir, file_count):
+    for index in range(file_count):
+        with shell.open("{0}/{1}".format(remote_dir, index), "rb") as f:
+            f.read()
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:]))
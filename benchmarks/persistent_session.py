@@ -0,0 +1,36 @@
+"""Measure the latency of running a command with the default sh shell type,
+which opens a channel for each command, and the persistent_sh shell type,
+over a link with a simulated round trip time.
+
+Usage: python -m benchmarks.persistent_session [number-of-commands] [round-trip-time-in-ms]
+
+Uses the SSH server given by the TEST_SSH_* environment variables, or a
+stand-in server running in the same process if they're not set.
+"""
+
+from __future__ import print_function
+
+import sys
+import time
+
+import spur.ssh
+from .latency_proxy import LatencyProxy
+from .shells import create_ssh_shell, ssh_server_settings
+
+
+def main(command_count=50, round_trip_ms=50):
+    server = ssh_server_settings()
+    with LatencyProxy(server["hostname"], server["port"], round_trip_ms / 1000.0) as proxy:
+        for name in ["sh", "persistent_sh"]:
+            shell_type = getattr(spur.ssh.ShellTypes, name)
+            with create_ssh_shell(hostname="127.0.0.1", port=proxy.port, shell_type=shell_type) as shell:
+                shell.run(["true"])
+                start = time.time()
+                for index in range(command_count):
+                    shell.run(["echo", "hello"], cwd="/tmp")
+                elapsed = time.time() - start
+            print("{0:<14} {1:8.2f} ms per command".format(name, elapsed / command_count * 1000))
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:]))
@@ -0,0 +1,54 @@
+"""Measure how quickly output is piped from one process to another with
+spur.pipe, between each pair of shells, compared with capturing the output
+of the first process and then writing it to the second.
+
+Usage: python -m benchmarks.pipeline [size-in-mb]
+
+Uses the SSH server given by the TEST_SSH_* environment variables, or a
+stand-in server running in the same process if they're not set.
+"""
+
+from __future__ import print_function
+
+import sys
+import time
+
+import spur
+from .shells import create_shells
+
+
+def main(size_mb=100):
+    size = size_mb * 1024 * 1024
+    shells = [(name, create_shell()) for name, create_shell in create_shells()]
+    try:
+        for source_name, source_shell in shells:
+            for destination_name, destination_shell in shells:
+                name = "{0} -> {1}".format(source_name, destination_name)
+                for mode_name, run in [("pipe", _pipe), ("capture", _capture)]:
+                    start = time.time()
+                    output = run(source_shell, destination_shell, size)
+                    elapsed = time.time() - start
+                    assert int(output) == size
+                    print("{0:<14} {1:<8} {2:8.1f} MB/s".format(name, mode_name, size_mb / elapsed))
+    finally:
+        for name, shell in shells:
+            shell.close()
+
+
+def _pipe(source_shell, destination_shell, size):
+    return spur.pipe(
+        source_shell.spawn(["head", "-c", str(size), "/dev/zero"]),
+        destination_shell.spawn(["wc", "-c"]),
+    ).wait_for_result().output
+
+
+def _capture(source_shell, destination_shell, size):
+    output = source_shell.run(["head", "-c", str(size), "/dev/zero"]).output
+    process = destination_shell.spawn(["wc", "-c"])
+    process.stdin_write(output)
+    process.stdin_close()
+    return process.wait_for_result().output
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:]))
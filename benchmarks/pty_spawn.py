@@ -0,0 +1,58 @@
+"""Spawn many commands using a pty, and check that file descriptors and
+threads are released once each command has finished.
+
+Usage: python -m benchmarks.pty_spawn [number-of-processes] [batch-size]
+
+Commands are spawned in batches, and the peak counts are measured while a
+batch is running.
+"""
+
+from __future__ import print_function
+
+import os
+import sys
+import threading
+import time
+
+import spur
+import spur.io
+
+
+def main(process_count=10000, batch_size=50):
+    _benchmark("threads", process_count, batch_size, spur.LocalShell())
+    with spur.io.SelectorIoHub() as hub:
+        _benchmark("selector", process_count, batch_size, spur.LocalShell(io_hub=hub))
+
+
+def _benchmark(name, process_count, batch_size, shell):
+    fd_count_before = _fd_count()
+    thread_count_before = threading.active_count()
+    peak_fd_count = fd_count_before
+    peak_thread_count = thread_count_before
+
+    start = time.time()
+    for batch_start in range(0, process_count, batch_size):
+        processes = [
+            shell.spawn(["echo", "hello"], use_pty=True)
+            for index in range(min(batch_size, process_count - batch_start))
+        ]
+        peak_fd_count = max(peak_fd_count, _fd_count())
+        peak_thread_count = max(peak_thread_count, threading.active_count())
+        for process in processes:
+            assert process.wait_for_result().output == b"hello\r\n"
+    elapsed = time.time() - start
+
+    print("{0:<9} fds: {1} -> peak {2} -> {3}  threads: {4} -> peak {5} -> {6}  {7:.0f} spawns/s".format(
+        name,
+        fd_count_before, peak_fd_count, _fd_count(),
+        thread_count_before, peak_thread_count, threading.active_count(),
+        process_count / elapsed,
+    ))
+
+
+def _fd_count():
+    return len(os.listdir("/proc/self/fd"))
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:]))
@@ -0,0 +1,42 @@
+"""Measure the per-command latency of run_batch compared to calling run for
+each command, over a link with a simulated round trip time.
+
+Usage: python -m benchmarks.run_batch [number-of-commands] [round-trip-time-in-ms]
+
+Uses the SSH server given by the TEST_SSH_* environment variables, or a
+stand-in server running in the same process if they're not set.
+"""
+
+from __future__ import print_function
+
+import sys
+import time
+
+from .latency_proxy import LatencyProxy
+from .shells import create_ssh_shell, ssh_server_settings
+
+
+def main(command_count=200, round_trip_ms=50):
+    commands = [
+        ["test", "-e", "/tmp"],
+        ["stat", "/tmp"],
+        ["cat", "/etc/hostname"],
+    ] * (command_count // 3)
+
+    server = ssh_server_settings()
+    with LatencyProxy(server["hostname"], server["port"], round_trip_ms / 1000.0) as proxy:
+        with create_ssh_shell(hostname="127.0.0.1", port=proxy.port) as shell:
+            shell.run(["true"])
+            _benchmark("run", len(commands), lambda: [shell.run(command, allow_error=True) for command in commands])
+            _benchmark("run_batch", len(commands), lambda: shell.run_batch(commands, allow_error=True))
+
+
+def _benchmark(name, command_count, func):
+    start = time.time()
+    func()
+    elapsed = time.time() - start
+    print("{0:<10} {1:8.2f} ms per command".format(name, elapsed / command_count * 1000))
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:]))
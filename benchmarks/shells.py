@@ -0,0 +1,63 @@
+import os
+import threading
+
+import spur
+import spur.ssh
+
+from .sshd import StandInServer
+
+
+def create_shells():
+    """Yield a (name, create_shell) pair for each shell to benchmark."""
+    yield "local", spur.LocalShell
+    yield "ssh", create_ssh_shell
+
+
+def create_ssh_shell(**kwargs):
+    """Create an SshShell connected to the server given by the same TEST_SSH_*
+    environment variables as used by the tests, or if they're not set, to a
+    stand-in server running in this process.
+    """
+    ssh_kwargs = dict(ssh_server_settings(), missing_host_key=spur.ssh.MissingHostKey.accept)
+    ssh_kwargs.update(kwargs)
+    return spur.SshShell(**ssh_kwargs)
+
+
+def ssh_server_settings():
+    if "TEST_SSH_USERNAME" in os.environ:
+        return dict(
+            hostname=os.environ.get("TEST_SSH_HOSTNAME", "127.0.0.1"),
+            username=os.environ["TEST_SSH_USERNAME"],
+            password=os.environ["TEST_SSH_PASSWORD"],
+            port=int(os.environ.get("TEST_SSH_PORT", 22)),
+        )
+    else:
+        server = _stand_in_server()
+        return dict(
+            hostname=server.hostname,
+            username=server.username,
+            password=server.password,
+            port=server.port,
+        )
+
+
+def ssh_server_description():
+    if "TEST_SSH_USERNAME" in os.environ:
+        return "external"
+    else:
+        return "stand-in"
+
+
+_lock = threading.Lock()
+_server = None
+
+
+def _stand_in_server():
+    # The server is started the first time it's needed, and runs until the
+    # process exits
+    global _server
+    with _lock:
+        if _server is None:
+            _server = StandInServer()
+            _server.start()
+        return _server
@@ -0,0 +1,42 @@
+"""Measure how many small files per second can be written over SSH with
+shell.files.write_file, compared to creating parent directories by running
+mkdir as a remote process.
+
+Usage: python -m benchmarks.small_file_writes [number-of-files]
+
+Uses the SSH server given by the TEST_SSH_* environment variables, or a
+stand-in server running in the same process if they're not set.
+"""
+
+from __future__ import print_function
+
+import sys
+import time
+import uuid
+
+import spur.files
+from .shells import create_ssh_shell
+
+
+def main(file_count=500):
+    with create_ssh_shell() as shell:
+        _benchmark("sftp", shell, shell.files, file_count)
+        _benchmark("mkdir", shell, spur.files.FileOperations(shell), file_count)
+
+
+def _benchmark(name, shell, files, file_count):
+    remote_dir = "/tmp/{0}".format(uuid.uuid4())
+    try:
+        start = time.time()
+        for index in range(file_count):
+            path = "{0}/{1}/{2}.conf".format(remote_dir, index % 10, index)
+            files.write_file(path, "value = {0}\n".format(index))
+        elapsed = time.time() - start
+    finally:
+        shell.run(["rm", "-rf", remote_dir])
+
+    print("{0:<6} {1:8.1f} files per second".format(name, file_count / elapsed))
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:]))
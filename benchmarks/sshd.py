@@ -0,0 +1,303 @@
+"""An SSH server that runs in the benchmark's own process, so that SshShell
+can be benchmarked without an external server.
+
+Commands are run locally using sh -c, as the current user. SFTP requests
+are served from the local filesystem. The server is meant for reproducible
+comparisons between versions of spur, rather than as a model of the
+performance of OpenSSH: paramiko's server implementation is considerably
+slower than sshd.
+"""
+
+from __future__ import absolute_import
+
+import os
+import pty
+import socket
+import subprocess
+import threading
+import uuid
+
+import paramiko
+
+
+class StandInServer(object):
+    def __init__(self):
+        self.hostname = "127.0.0.1"
+        self.username = "spur"
+        self.password = uuid.uuid4().hex
+        self.port = None
+        self._host_key = paramiko.ECDSAKey.generate()
+        self._sock = None
+        self._transports = []
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def start(self):
+        self._sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._sock.bind((self.hostname, 0))
+        self._sock.listen(100)
+        self.port = self._sock.getsockname()[1]
+
+        thread = threading.Thread(target=self._accept)
+        thread.daemon = True
+        thread.start()
+
+    def close(self):
+        self._sock.close()
+        with self._lock:
+            transports = self._transports
+            self._transports = []
+        for transport in transports:
+            transport.close()
+
+    def _accept(self):
+        while True:
+            try:
+                client, address = self._sock.accept()
+            except OSError:
+                return
+            transport = _Transport(client)
+            transport.add_server_key(self._host_key)
+            # Allow clients to use compression, as OpenSSH does by default
+            transport.use_compression(True)
+            transport.set_subsystem_handler("sftp", paramiko.SFTPServer, _SftpServer)
+            with self._lock:
+                self._transports.append(transport)
+            try:
+                transport.start_server(server=_Server(self.username, self.password))
+            except (paramiko.SSHException, EOFError):
+                pass
+
+
+class _Transport(paramiko.Transport):
+    # Commands are started once the reply to the exec request has been sent.
+    # Otherwise, a command that exits quickly may close its channel before
+    # the reply is sent, and the client treats the exec request as failed.
+    def _handle_channel_request(channel, message):
+        paramiko.Channel._handle_request(channel, message)
+        channel.transport.server_object.start_pending_command(channel)
+
+    _channel_handler_table = dict(paramiko.Transport._channel_handler_table)
+    _channel_handler_table[paramiko.common.MSG_CHANNEL_REQUEST] = _handle_channel_request
+
+
+class _Server(paramiko.ServerInterface):
+    def __init__(self, username, password):
+        self._username = username
+        self._password = password
+        self._ptys = set()
+        self._pending_commands = {}
+
+    def get_allowed_auths(self, username):
+        return "password"
+
+    def check_auth_password(self, username, password):
+        if username == self._username and password == self._password:
+            return paramiko.AUTH_SUCCESSFUL
+        else:
+            return paramiko.AUTH_FAILED
+
+    def check_channel_request(self, kind, channel_id):
+        if kind == "session":
+            return paramiko.OPEN_SUCCEEDED
+        else:
+            return paramiko.OPEN_FAILED_ADMINISTRATIVELY_PROHIBITED
+
+    def check_channel_pty_request(self, channel, term, width, height, pixel_width, pixel_height, modes):
+        self._ptys.add(channel.get_id())
+        return True
+
+    def check_channel_window_change_request(self, channel, width, height, pixel_width, pixel_height):
+        return True
+
+    def check_channel_exec_request(self, channel, command):
+        # Channel IDs are reused once channels are closed
+        use_pty = channel.get_id() in self._ptys
+        self._ptys.discard(channel.get_id())
+        self._pending_commands[channel.get_id()] = (command.decode("utf8"), use_pty)
+        return True
+
+    def start_pending_command(self, channel):
+        pending_command = self._pending_commands.pop(channel.get_id(), None)
+        if pending_command is not None:
+            _start_thread(_exec, channel, *pending_command)
+
+
+def _exec(channel, command, use_pty):
+    if use_pty:
+        return_code = _exec_with_pty(channel, command)
+    else:
+        return_code = _exec_with_pipes(channel, command)
+
+    if return_code < 0:
+        # Report processes killed by a signal in the same way as sh
+        return_code = 128 - return_code
+    channel.send_exit_status(return_code)
+    channel.close()
+
+
+def _exec_with_pipes(channel, command):
+    process = subprocess.Popen(
+        ["sh", "-c", command],
+        stdin=subprocess.PIPE,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        bufsize=0,
+    )
+
+    def write_stdin():
+        try:
+            _copy(channel.recv, process.stdin.write)
+        except (OSError, ValueError):
+            pass
+        finally:
+            try:
+                process.stdin.close()
+            except OSError:
+                pass
+
+    _start_thread(write_stdin)
+    stderr_thread = _start_thread(_copy, process.stderr.read, channel.sendall_stderr)
+    _copy(process.stdout.read, channel.sendall)
+    stderr_thread.join()
+    return process.wait()
+
+
+def _exec_with_pty(channel, command):
+    master, slave = pty.openpty()
+    process = subprocess.Popen(
+        ["sh", "-c", command],
+        stdin=slave,
+        stdout=slave,
+        stderr=slave,
+        start_new_session=True,
+    )
+    os.close(slave)
+    _start_thread(_copy, channel.recv, lambda data: os.write(master, data))
+
+    def read_master(size):
+        try:
+            return os.read(master, size)
+        except OSError:
+            # Reading from the master raises EIO once the slave is closed
+            return b""
+
+    _copy(read_master, channel.sendall)
+    os.close(master)
+    return process.wait()
+
+
+def _copy(read, write):
+    while True:
+        data = read(64 * 1024)
+        if not data:
+            return
+        write(data)
+
+
+def _start_thread(target, *args):
+    thread = threading.Thread(target=target, args=args)
+    thread.daemon = True
+    thread.start()
+    return thread
+
+
+def _sftp_errors(func):
+    def wrapped(*args):
+        try:
+            result = func(*args)
+        except OSError as error:
+            return paramiko.SFTPServer.convert_errno(error.errno)
+        return paramiko.SFTP_OK if result is None else result
+
+    return wrapped
+
+
+class _SftpHandle(paramiko.SFTPHandle):
+    @_sftp_errors
+    def stat(self):
+        return paramiko.SFTPAttributes.from_stat(os.fstat(self.readfile.fileno()))
+
+    @_sftp_errors
+    def chattr(self, attr):
+        paramiko.SFTPServer.set_file_attr(self.filename, attr)
+
+
+class _SftpServer(paramiko.SFTPServerInterface):
+    @_sftp_errors
+    def list_folder(self, path):
+        attributes = []
+        for name in os.listdir(path):
+            attribute = paramiko.SFTPAttributes.from_stat(os.lstat(os.path.join(path, name)))
+            attribute.filename = name
+            attributes.append(attribute)
+        return attributes
+
+    @_sftp_errors
+    def stat(self, path):
+        return paramiko.SFTPAttributes.from_stat(os.stat(path))
+
+    @_sftp_errors
+    def lstat(self, path):
+        return paramiko.SFTPAttributes.from_stat(os.lstat(path))
+
+    @_sftp_errors
+    def open(self, path, flags, attr):
+        mode = getattr(attr, "st_mode", None)
+        fd = os.open(path, flags, 0o666 if mode is None else mode)
+        if flags & os.O_CREAT and attr is not None:
+            attr._flags &= ~attr.FLAG_PERMISSIONS
+            paramiko.SFTPServer.set_file_attr(path, attr)
+
+        if flags & os.O_WRONLY:
+            file_mode = "ab" if flags & os.O_APPEND else "wb"
+        elif flags & os.O_RDWR:
+            file_mode = "a+b" if flags & os.O_APPEND else "r+b"
+        else:
+            file_mode = "rb"
+
+        handle = _SftpHandle(flags)
+        handle.filename = path
+        handle.readfile = handle.writefile = os.fdopen(fd, file_mode)
+        return handle
+
+    @_sftp_errors
+    def remove(self, path):
+        os.remove(path)
+
+    @_sftp_errors
+    def rename(self, old_path, new_path):
+        os.rename(old_path, new_path)
+
+    posix_rename = rename
+
+    @_sftp_errors
+    def mkdir(self, path, attr):
+        os.mkdir(path)
+        if attr is not None:
+            paramiko.SFTPServer.set_file_attr(path, attr)
+
+    @_sftp_errors
+    def rmdir(self, path):
+        os.rmdir(path)
+
+    @_sftp_errors
+    def chattr(self, path, attr):
+        paramiko.SFTPServer.set_file_attr(path, attr)
+
+    def canonicalize(self, path):
+        return os.path.normpath(os.path.join("/", path))
+
+    @_sftp_errors
+    def readlink(self, path):
+        return os.readlink(path)
+
+    @_sftp_errors
+    def symlink(self, target_path, path):
+        os.symlink(target_path, path)
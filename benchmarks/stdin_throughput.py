@@ -0,0 +1,65 @@
+"""Measure how quickly spawn(stdin=...) feeds a command its input from each
+kind of source, compared with calling stdin_write in a loop.
+
+Usage: python -m benchmarks.stdin_throughput [size-in-mb]
+
+Uses the SSH server given by the TEST_SSH_* environment variables, or a
+stand-in server running in the same process if they're not set.
+"""
+
+from __future__ import print_function
+
+import os
+import sys
+import time
+
+from spur.tempdir import create_temporary_dir
+from .shells import create_shells
+
+
+_CHUNK = b"x" * (64 * 1024)
+# Piped through cat since wc reads the size of a file without reading it
+_COMMAND = ["sh", "-c", "cat | wc -c"]
+
+
+def main(size_mb=100):
+    size = size_mb * 1024 * 1024
+    with create_temporary_dir() as temp_dir:
+        path = os.path.join(temp_dir, "input")
+        with open(path, "wb") as f:
+            for index in range(size // len(_CHUNK)):
+                f.write(_CHUNK)
+
+        def write_in_loop(shell):
+            process = shell.spawn(_COMMAND)
+            for index in range(size // len(_CHUNK)):
+                process.stdin_write(_CHUNK)
+            process.stdin_close()
+            return process.wait_for_result()
+
+        def run_with_file_object(shell):
+            with open(path, "rb") as f:
+                return shell.run(_COMMAND, stdin=f)
+
+        modes = [
+            ("stdin_write loop", write_in_loop),
+            ("path", lambda shell: shell.run(_COMMAND, stdin=path)),
+            ("file object", run_with_file_object),
+            ("iterator", lambda shell: shell.run(
+                _COMMAND,
+                stdin=(_CHUNK for index in range(size // len(_CHUNK))),
+            )),
+        ]
+
+        for shell_name, create_shell in create_shells():
+            with create_shell() as shell:
+                for mode_name, run in modes:
+                    start = time.time()
+                    result = run(shell)
+                    elapsed = time.time() - start
+                    assert int(result.output) == size
+                    print("{0:<6} {1:<18} {2:8.1f} MB/s".format(shell_name, mode_name, size_mb / elapsed))
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:]))
@@ -0,0 +1,256 @@
+"""Run a standard set of benchmarks against LocalShell and SshShell, and
+write the results as JSON so that they can be compared between versions
+using benchmarks.compare.
+
+Usage: python -m benchmarks.suite [--quick] [--output results.json]
+
+Uses the SSH server given by the TEST_SSH_* environment variables, or a
+stand-in server running in the same process if they're not set. Results
+from the stand-in server are only comparable with other results from the
+stand-in server.
+"""
+
+from __future__ import print_function
+
+import argparse
+import concurrent.futures
+import datetime
+import json
+import os
+import platform
+import re
+import subprocess
+import sys
+import time
+
+import paramiko
+
+import spur
+from spur.tempdir import create_temporary_dir
+from .shells import create_shells, ssh_server_description
+
+
+_SIZES = {
+    "full": dict(
+        command_count=200,
+        output_size_mb=64,
+        concurrency_levels=[1, 4, 16],
+        concurrent_commands=64,
+        small_file_count=500,
+        large_file_size_mb=64,
+        upload_dir_file_count=500,
+        upload_dir_file_size_kb=64,
+    ),
+    "quick": dict(
+        command_count=20,
+        output_size_mb=8,
+        concurrency_levels=[1, 4],
+        concurrent_commands=8,
+        small_file_count=50,
+        large_file_size_mb=8,
+        upload_dir_file_count=50,
+        upload_dir_file_size_kb=16,
+    ),
+}
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="Run the spur benchmark suite")
+    parser.add_argument("--quick", action="store_true", help="use smaller sizes and counts")
+    parser.add_argument("--output", help="write the results to this file rather than stdout")
+    args = parser.parse_args(argv)
+
+    parameters = _SIZES["quick" if args.quick else "full"]
+    results = {
+        "environment": _environment(),
+        "parameters": parameters,
+        "results": dict(
+            (shell_name, _run_benchmarks(shell_name, create_shell, parameters))
+            for shell_name, create_shell in create_shells()
+        ),
+    }
+
+    output = json.dumps(results, indent=2, sort_keys=True)
+    if args.output is None:
+        print(output)
+    else:
+        with open(args.output, "w") as output_file:
+            output_file.write(output + "\n")
+
+
+def _run_benchmarks(shell_name, create_shell, parameters):
+    results = {}
+    with create_shell() as shell:
+        # Connect before timing anything
+        shell.run(["true"])
+        for name, benchmark in _BENCHMARKS:
+            print("{0}: {1}".format(shell_name, name), file=sys.stderr)
+            try:
+                metrics = benchmark(shell, parameters)
+            except Exception as error:
+                # Older versions of spur may not support every benchmark
+                metrics = {name: {"error": "{0}: {1}".format(type(error).__name__, error)}}
+            results.update(metrics)
+    return results
+
+
+def _command_latency(shell, parameters):
+    latencies = []
+    for index in range(parameters["command_count"]):
+        start = time.time()
+        shell.run(["true"])
+        latencies.append(time.time() - start)
+    latencies.sort()
+    return {
+        "command_latency_median": _metric(latencies[len(latencies) // 2] * 1000, "ms"),
+        "command_latency_p90": _metric(latencies[int(len(latencies) * 0.9)] * 1000, "ms"),
+        "commands_per_second": _metric(len(latencies) / sum(latencies), "commands/s"),
+    }
+
+
+def _output_throughput(shell, parameters):
+    size = parameters["output_size_mb"] * 1024 * 1024
+    start = time.time()
+    result = shell.run(["head", "-c", str(size), "/dev/zero"])
+    elapsed = time.time() - start
+    assert len(result.output) == size
+    return {"output_throughput": _metric(parameters["output_size_mb"] / elapsed, "MB/s")}
+
+
+def _concurrent_spawn(shell, parameters):
+    command_count = parameters["concurrent_commands"]
+    metrics = {}
+    for concurrency in parameters["concurrency_levels"]:
+        executor = concurrent.futures.ThreadPoolExecutor(max_workers=concurrency)
+        try:
+            start = time.time()
+            list(executor.map(lambda index: shell.run(["true"]), range(command_count)))
+            elapsed = time.time() - start
+        finally:
+            executor.shutdown()
+        name = "concurrent_commands_per_second_{0}".format(concurrency)
+        metrics[name] = _metric(command_count / elapsed, "commands/s")
+    return metrics
+
+
+def _small_files(shell, parameters):
+    file_count = parameters["small_file_count"]
+    contents = b"x" * 1024
+    with shell.temporary_dir() as temp_dir:
+        start = time.time()
+        for index in range(file_count):
+            with shell.open("{0}/{1}".format(temp_dir, index), "wb") as f:
+                f.write(contents)
+        write_elapsed = time.time() - start
+
+        start = time.time()
+        for index in range(file_count):
+            with shell.open("{0}/{1}".format(temp_dir, index), "rb") as f:
+                assert f.read() == contents
+        read_elapsed = time.time() - start
+
+    return {
+        "small_file_writes_per_second": _metric(file_count / write_elapsed, "files/s"),
+        "small_file_reads_per_second": _metric(file_count / read_elapsed, "files/s"),
+    }
+
+
+def _large_file(shell, parameters):
+    size_mb = parameters["large_file_size_mb"]
+    chunk = b"x" * (1024 * 1024)
+    with shell.temporary_dir() as temp_dir:
+        path = "{0}/large".format(temp_dir)
+        start = time.time()
+        with shell.open(path, "wb") as f:
+            for index in range(size_mb):
+                f.write(chunk)
+        write_elapsed = time.time() - start
+
+        start = time.time()
+        size = 0
+        with shell.open(path, "rb") as f:
+            while True:
+                data = f.read(len(chunk))
+                if not data:
+                    break
+                size += len(data)
+        read_elapsed = time.time() - start
+        assert size == size_mb * len(chunk)
+
+    return {
+        "large_file_write_throughput": _metric(size_mb / write_elapsed, "MB/s"),
+        "large_file_read_throughput": _metric(size_mb / read_elapsed, "MB/s"),
+    }
+
+
+def _upload_dir(shell, parameters):
+    file_count = parameters["upload_dir_file_count"]
+    file_size = parameters["upload_dir_file_size_kb"] * 1024
+    with create_temporary_dir() as local_dir:
+        for index in range(file_count):
+            with open(os.path.join(local_dir, str(index)), "wb") as f:
+                f.write(os.urandom(file_size))
+
+        with shell.temporary_dir() as temp_dir:
+            start = time.time()
+            shell.upload_dir(local_dir, "{0}/upload".format(temp_dir), ignore=[])
+            elapsed = time.time() - start
+
+    size_mb = file_count * file_size / (1024.0 * 1024)
+    return {
+        "upload_dir_throughput": _metric(size_mb / elapsed, "MB/s"),
+        "upload_dir_files_per_second": _metric(file_count / elapsed, "files/s"),
+    }
+
+
+_BENCHMARKS = [
+    ("command_latency", _command_latency),
+    ("output_throughput", _output_throughput),
+    ("concurrent_spawn", _concurrent_spawn),
+    ("small_files", _small_files),
+    ("large_file", _large_file),
+    ("upload_dir", _upload_dir),
+]
+
+
+def _metric(value, unit):
+    return {"value": round(value, 3), "unit": unit}
+
+
+def _environment():
+    return {
+        "spur_version": _spur_version(),
+        "git_revision": _git_revision(),
+        "python_version": platform.python_version(),
+        "paramiko_version": paramiko.__version__,
+        "platform": platform.platform(),
+        "ssh_server": ssh_server_description(),
+        "timestamp": datetime.datetime.utcnow().strftime("%Y-%m-%dT%H:%M:%SZ"),
+    }
+
+
+def _spur_version():
+    # spur is usually imported from a checkout rather than installed when
+    # benchmarking, so read the version from setup.py
+    setup_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(spur.__file__))), "setup.py")
+    try:
+        with open(setup_path) as setup_file:
+            match = re.search(r"version=['\"]([^'\"]+)['\"]", setup_file.read())
+    except IOError:
+        return None
+    return match.group(1) if match else None
+
+
+def _git_revision():
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "HEAD"],
+            cwd=os.path.dirname(os.path.abspath(spur.__file__)),
+            stderr=subprocess.DEVNULL,
+        ).decode("ascii").strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,76 @@
+"""Measure the time taken by sync_dir to copy a tree of small files, and to
+sync it again after changing a fraction of the files, compared to uploading
+the whole tree again with upload_dir.
+
+Usage: python -m benchmarks.sync_dir [number-of-files] [percentage-changed]
+"""
+
+from __future__ import print_function
+
+import os
+import sys
+import time
+import uuid
+
+from spur.tempdir import create_temporary_dir
+from .shells import create_shells
+
+
+def main(file_count=50000, percentage_changed=1):
+    with create_temporary_dir() as local_dir:
+        _create_tree(local_dir, file_count)
+        for name, create_shell in create_shells():
+            with create_shell() as shell:
+                remote_dir = "/tmp/{0}".format(uuid.uuid4())
+                try:
+                    _time(name, "initial sync", lambda: shell.sync_dir(local_dir, remote_dir))
+                    _change_files(local_dir, file_count, percentage_changed)
+                    result = _time(name, "sync {0}% changed".format(percentage_changed), lambda: shell.sync_dir(local_dir, remote_dir))
+                    print("{0:<6} copied {1} files".format(name, len(result.copied)))
+                    _time(name, "upload_dir", lambda: _upload_dir(shell, local_dir, remote_dir))
+                finally:
+                    shell.run(["rm", "-rf", remote_dir])
+
+
+def _time(shell_name, name, func):
+    start = time.time()
+    result = func()
+    print("{0:<6} {1:<20} {2:6.2f}s".format(shell_name, name, time.time() - start))
+    return result
+
+
+def _upload_dir(shell, local_dir, remote_dir):
+    shell.run(["rm", "-rf", remote_dir])
+    shell.upload_dir(local_dir, remote_dir, [], stream=True)
+
+
+def _create_tree(root, file_count):
+    for index in range(file_count):
+        _write_file(_path(root, index), index, "original")
+
+
+def _change_files(root, file_count, percentage_changed):
+    step = max(1, int(100 / percentage_changed))
+    for index in range(0, file_count, step):
+        path = _path(root, index)
+        _write_file(path, index, "changed")
+        # Make sure the modification time changes even if the file was
+        # created less than a second ago
+        mtime = os.path.getmtime(path) + 10
+        os.utime(path, (mtime, mtime))
+
+
+def _path(root, index):
+    return os.path.join(root, str(index % 100), str(index // 100 % 10), "{0}.txt".format(index))
+
+
+def _write_file(path, index, contents):
+    dir_path = os.path.dirname(path)
+    if not os.path.exists(dir_path):
+        os.makedirs(dir_path)
+    with open(path, "w") as f:
+        f.write("{0} {1}\n".format(index, contents))
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:]))
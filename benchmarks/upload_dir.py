@@ -0,0 +1,56 @@
+"""Measure the time taken by SshShell.upload_dir to upload a directory using
+a temporary tarball, and by streaming an archive with each compression.
+
+Usage: python -m benchmarks.upload_dir [total-size-in-mb] [number-of-files]
+
+Uses the SSH server given by the TEST_SSH_* environment variables, or a
+stand-in server running in the same process if they're not set.
+"""
+
+from __future__ import print_function
+
+import os
+import sys
+import time
+import uuid
+
+from spur.tempdir import create_temporary_dir
+from .shells import create_ssh_shell
+
+
+_MODES = [
+    ("tarball", dict()),
+    ("stream none", dict(stream=True, compression="none")),
+    ("stream gzip", dict(stream=True, compression="gzip")),
+]
+
+
+def main(size_mb=64, file_count=256):
+    with create_temporary_dir() as local_dir:
+        _create_tree(local_dir, size_mb * 1024 * 1024, file_count)
+        with create_ssh_shell() as shell:
+            for name, kwargs in _MODES:
+                remote_dir = "/tmp/{0}".format(uuid.uuid4())
+                try:
+                    start = time.time()
+                    shell.upload_dir(local_dir, remote_dir, [], **kwargs)
+                    elapsed = time.time() - start
+                finally:
+                    shell.run(["rm", "-rf", remote_dir])
+                print("{0:<12} {1:6.2f}s  {2:7.1f} MB/s".format(name, elapsed, size_mb / elapsed))
+
+
+def _create_tree(root, total_size, file_count):
+    # Half random bytes and half zeroes, so that compression has some effect
+    file_size = total_size // file_count
+    for index in range(file_count):
+        dir_path = os.path.join(root, str(index % 16))
+        if not os.path.exists(dir_path):
+            os.makedirs(dir_path)
+        with open(os.path.join(dir_path, "{0}.bin".format(index)), "wb") as f:
+            f.write(os.urandom(file_size // 2))
+            f.write(b"\0" * (file_size - file_size // 2))
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:]))
@@ -1,10 +1,16 @@
 from .local import LocalShell
 from .ssh import SshShell
+from .aio import AsyncLocalShell, AsyncSshShell
+from .group import ShellGroup, run_many
+from .pipeline import pipe
 from .results import RunProcessError
-from .errors import NoSuchCommandError, CommandInitializationError, CouldNotChangeDirectoryError
+from . import capture
+from .errors import NoSuchCommandError, CommandInitializationError, CouldNotChangeDirectoryError, \
+    CommandTimeoutError
 
 __all__ = [
-    "LocalShell", "SshShell",
+    "LocalShell", "SshShell", "AsyncLocalShell", "AsyncSshShell",
+    "ShellGroup", "run_many", "pipe",
     "RunProcessError", "NoSuchCommandError", "CommandInitializationError",
-    "CouldNotChangeDirectoryError",
+    "CouldNotChangeDirectoryError", "CommandTimeoutError",
 ]
@@ -0,0 +1,418 @@
+from __future__ import absolute_import
+
+import asyncio
+import subprocess
+
+from .local import LocalShell
+from .ssh import SshShell
+from . import results
+from . import capture as capture_policies
+from .io import DEFAULT_CHUNK_SIZE, LineBuffer, create_decoder, already_capturing_error
+
+
+_MAX_POLL_INTERVAL = 0.1
+
+
+class AsyncLocalShell(object):
+    def __init__(self):
+        self._shell = LocalShell()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        self.close()
+
+    def close(self):
+        self._shell.close()
+
+    async def run(self, *args, **kwargs):
+        process = await self.spawn(*args, **kwargs)
+        return await process.wait_for_result()
+
+    async def spawn(self, command, *args, **kwargs):
+        stdout = kwargs.pop("stdout", None)
+        stderr = kwargs.pop("stderr", None)
+        allow_error = kwargs.pop("allow_error", False)
+        store_pid = kwargs.pop("store_pid", False)
+        use_pty = kwargs.pop("use_pty", False)
+        encoding = kwargs.pop("encoding", None)
+        capture = kwargs.pop("capture", None)
+        cwd = kwargs.get("cwd")
+        if use_pty:
+            raise ValueError("use_pty is not supported by AsyncLocalShell")
+
+        subprocess_args = self._shell._subprocess_args(command, *args, **kwargs)
+        del subprocess_args["args"]
+        try:
+            process = await asyncio.create_subprocess_exec(
+                *command,
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                **subprocess_args
+            )
+        except OSError as error:
+            raise self._shell._spawn_error(error, command, cwd)
+
+        spur_process = AsyncLocalProcess(
+            process,
+            allow_error=allow_error,
+            stdout=stdout,
+            stderr=stderr,
+            encoding=encoding,
+            capture=capture,
+        )
+        if store_pid:
+            spur_process.pid = process.pid
+        return spur_process
+
+
+class AsyncLocalProcess(object):
+    def __init__(self, process, allow_error, stdout, stderr, encoding, capture):
+        self._process = process
+        self._allow_error = allow_error
+        self._result = None
+
+        self._stdout = _AsyncOutput(process.stdout.read, stdout, encoding, capture)
+        self._stderr = _AsyncOutput(process.stderr.read, stderr, encoding, capture)
+
+    def is_running(self):
+        return self._process.returncode is None
+
+    async def stdin_write(self, value):
+        self._process.stdin.write(value)
+        await self._process.stdin.drain()
+
+    async def stdin_close(self):
+        self._process.stdin.close()
+
+    async def send_signal(self, signal):
+        self._process.send_signal(signal)
+
+    def iter_chunks(self):
+        return _iter_chunks(self._stdout, self._stderr)
+
+    def iter_lines(self):
+        return _iter_lines(self._stdout, self._stderr)
+
+    async def wait_for_result(self):
+        if self._result is None:
+            self._result = await self._generate_result()
+
+        return self._result
+
+    async def _generate_result(self):
+        output, stderr_output = await asyncio.gather(
+            self._stdout.wait(),
+            self._stderr.wait(),
+        )
+        return_code = await self._process.wait()
+
+        return results.result(
+            return_code,
+            self._allow_error,
+            output,
+            stderr_output
+        )
+
+
+class AsyncSshShell(object):
+    # Connecting, opening a channel and reading the lines printed by the
+    # shell type before the command is executed all block, so are run in
+    # the event loop's default executor. Once the command is running, its
+    # output and exit status are read without blocking the event loop.
+    def __init__(self, *args, **kwargs):
+        self._shell = SshShell(*args, **kwargs)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        self.close()
+
+    def close(self):
+        self._shell.close()
+
+    async def run(self, *args, **kwargs):
+        process = await self.spawn(*args, **kwargs)
+        return await process.wait_for_result()
+
+    async def spawn(self, command, *args, **kwargs):
+        stdout = kwargs.pop("stdout", None)
+        stderr = kwargs.pop("stderr", None)
+        allow_error = kwargs.pop("allow_error", False)
+        encoding = kwargs.pop("encoding", None)
+        capture = kwargs.pop("capture", None)
+        store_pid = kwargs.get("store_pid", False)
+
+        loop = asyncio.get_event_loop()
+        channel, process_stdout, pid = await loop.run_in_executor(
+            None,
+            lambda: self._shell._exec_command(command, *args, **kwargs),
+        )
+
+        process = AsyncSshProcess(
+            channel,
+            allow_error=allow_error,
+            process_stdout=process_stdout,
+            stdout=stdout,
+            stderr=stderr,
+            encoding=encoding,
+            capture=capture,
+            shell=self,
+        )
+        if store_pid:
+            process.pid = pid
+
+        return process
+
+
+class AsyncSshProcess(object):
+    def __init__(self, channel, allow_error, process_stdout, stdout, stderr, encoding, capture, shell):
+        self._channel = _AsyncChannel(channel, process_stdout.read_buffered())
+        self._allow_error = allow_error
+        self._shell = shell
+        self._result = None
+
+        self._stdout = _AsyncOutput(self._channel.read_stdout, stdout, encoding, capture)
+        self._stderr = _AsyncOutput(self._channel.read_stderr, stderr, encoding, capture)
+
+    def is_running(self):
+        return not self._channel.exit_status_ready()
+
+    async def stdin_write(self, value):
+        await self._channel.sendall(value)
+
+    async def stdin_close(self):
+        self._channel.shutdown_write()
+
+    async def send_signal(self, signal):
+        await self._shell.run(["kill", "-{0}".format(signal), str(self.pid)])
+
+    def iter_chunks(self):
+        return _iter_chunks(self._stdout, self._stderr)
+
+    def iter_lines(self):
+        return _iter_lines(self._stdout, self._stderr)
+
+    async def wait_for_result(self):
+        if self._result is None:
+            self._result = await self._generate_result()
+
+        return self._result
+
+    async def _generate_result(self):
+        try:
+            output, stderr_output = await asyncio.gather(
+                self._stdout.wait(),
+                self._stderr.wait(),
+            )
+            return_code = await self._channel.wait_for_exit_status()
+        finally:
+            self._channel.close()
+
+        return results.result(
+            return_code,
+            self._allow_error,
+            output,
+            stderr_output
+        )
+
+
+class _AsyncChannel(object):
+    # paramiko makes channel.fileno() readable whenever there's data to be
+    # read from stdout or stderr, or the channel has reached EOF
+    def __init__(self, channel, buffered_stdout):
+        self._channel = channel
+        self._buffered_stdout = buffered_stdout
+        self._waiters = []
+        self._loop = asyncio.get_event_loop()
+        self._fileno = channel.fileno()
+        self._watching = False
+        self._rewatch = None
+        self._rewatch_interval = _PollInterval()
+
+    async def read_stdout(self, size):
+        if self._buffered_stdout:
+            data = self._buffered_stdout[:size]
+            self._buffered_stdout = self._buffered_stdout[size:]
+            return data
+        else:
+            return await self._read(self._channel.recv_ready, self._channel.recv, size)
+
+    async def read_stderr(self, size):
+        return await self._read(self._channel.recv_stderr_ready, self._channel.recv_stderr, size)
+
+    async def _read(self, is_ready, recv, size):
+        while True:
+            # Check for EOF before checking for data, since any data will
+            # have been received before EOF
+            at_eof = self._channel.eof_received or self._channel.closed
+            if is_ready():
+                return recv(size)
+            elif at_eof:
+                return b""
+            else:
+                await self._wait_readable(is_ready)
+
+    def _wait_readable(self, is_ready):
+        future = self._loop.create_future()
+        self._waiters.append((is_ready, future))
+        self._watch()
+        return future
+
+    def _watch(self):
+        self._rewatch = None
+        if self._waiters and not self._watching:
+            self._watching = True
+            self._loop.add_reader(self._fileno, self._on_readable)
+
+    def _unwatch(self):
+        if self._watching:
+            self._watching = False
+            self._loop.remove_reader(self._fileno)
+        if self._rewatch is not None:
+            self._rewatch.cancel()
+            self._rewatch = None
+
+    def _on_readable(self):
+        # Only wake the readers of streams with data, since the other
+        # streams would otherwise find nothing to read and wait again
+        # straight away
+        self._unwatch()
+        at_eof = self._channel.eof_received or self._channel.closed
+        waiters = self._waiters
+        self._waiters = []
+        woken = False
+        for is_ready, waiter in waiters:
+            if waiter.done():
+                continue
+            elif at_eof or is_ready():
+                waiter.set_result(None)
+                woken = True
+            else:
+                self._waiters.append((is_ready, waiter))
+
+        if not self._waiters:
+            return
+        elif woken:
+            # The woken readers run before this callback, so data they read
+            # no longer makes the channel readable
+            self._rewatch_interval.reset()
+            self._rewatch = self._loop.call_soon(self._watch)
+        else:
+            # The channel is only readable because of data on another stream
+            # that isn't being read yet, so check again after a delay rather
+            # than spinning
+            self._rewatch = self._loop.call_later(self._rewatch_interval.next(), self._watch)
+
+    async def sendall(self, data):
+        data = memoryview(data)
+        poll_interval = _PollInterval()
+        while data:
+            if self._channel.send_ready():
+                sent = self._channel.send(data[:DEFAULT_CHUNK_SIZE])
+                data = data[sent:]
+                poll_interval.reset()
+            else:
+                await poll_interval.sleep()
+
+    def shutdown_write(self):
+        self._channel.shutdown_write()
+
+    def exit_status_ready(self):
+        return self._channel.exit_status_ready()
+
+    async def wait_for_exit_status(self):
+        # paramiko provides no way to wait for the exit status without
+        # blocking, so poll instead
+        poll_interval = _PollInterval()
+        while not self._channel.exit_status_ready():
+            await poll_interval.sleep()
+        return self._channel.recv_exit_status()
+
+    def close(self):
+        self._unwatch()
+        self._channel.close()
+
+
+class _PollInterval(object):
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self._interval = 0.001
+
+    async def sleep(self):
+        await asyncio.sleep(self.next())
+
+    def next(self):
+        interval = self._interval
+        self._interval = min(self._interval * 2, _MAX_POLL_INTERVAL)
+        return interval
+
+
+class _AsyncOutput(object):
+    def __init__(self, read, file_out, encoding, capture):
+        if capture is None:
+            capture = capture_policies.everything()
+
+        self._read = read
+        self._file_out = file_out
+        self._decoder = create_decoder(encoding)
+        self._output_buffer = capture.create_buffer(encoding)
+        self._capture = None
+
+        if file_out is not None:
+            self.start_capture()
+
+    def start_capture(self):
+        if self._capture is None:
+            self._capture = asyncio.ensure_future(self._capture_output())
+
+    def is_capturing(self):
+        return self._capture is not None
+
+    async def wait(self):
+        self.start_capture()
+        return await self._capture
+
+    async def read_chunk(self):
+        chunk = await self._read(DEFAULT_CHUNK_SIZE)
+        output = self._decoder.decode(chunk, final=not chunk)
+        if output and self._file_out is not None:
+            self._file_out.write(output)
+        return chunk, output
+
+    async def _capture_output(self):
+        while True:
+            chunk, output = await self.read_chunk()
+            if output:
+                self._output_buffer.append(output)
+            if not chunk:
+                return self._output_buffer.value()
+
+
+async def _iter_chunks(stdout, stderr):
+    if stdout.is_capturing():
+        raise already_capturing_error()
+
+    # Keep reading stderr so that the process doesn't block on a full pipe
+    stderr.start_capture()
+    while True:
+        chunk, output = await stdout.read_chunk()
+        if output:
+            yield output
+        if not chunk:
+            return
+
+
+async def _iter_lines(stdout, stderr):
+    line_buffer = LineBuffer()
+    async for output in _iter_chunks(stdout, stderr):
+        for line in line_buffer.feed(output):
+            yield line
+
+    for line in line_buffer.flush():
+        yield line
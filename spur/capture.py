@@ -0,0 +1,207 @@
+from __future__ import unicode_literals
+
+import collections
+import tempfile
+
+
+def everything():
+    return _Policy(_EverythingBuffer)
+
+
+def discard():
+    return _Policy(_DiscardBuffer)
+
+
+def tail(size):
+    return _Policy(lambda empty: _TailBuffer(empty, size))
+
+
+def head_and_tail(head_size, tail_size):
+    return _Policy(lambda empty: _HeadAndTailBuffer(empty, head_size, tail_size))
+
+
+def spill_to_file(max_memory_size):
+    return _Policy(lambda empty: _SpillBuffer(empty, max_memory_size))
+
+
+class _Policy(object):
+    def __init__(self, create_buffer):
+        self._create_buffer = create_buffer
+
+    def create_buffer(self, encoding):
+        empty = b"" if encoding is None else ""
+        return self._create_buffer(empty)
+
+
+class SpilledOutput(object):
+    def __init__(self, file, size, unit):
+        self._file = file
+        self.size = size
+        self._unit = unit
+
+    def __repr__(self):
+        return "<spilled output: {0} {1}>".format(self.size, self._unit)
+
+    def read(self):
+        self._file.seek(0)
+        return self._file.read()
+
+    def close(self):
+        self._file.close()
+
+
+class _EverythingBuffer(object):
+    def __init__(self, empty):
+        self._empty = empty
+        self._chunks = []
+
+    def append(self, output):
+        self._chunks.append(output)
+
+    def value(self):
+        return self._empty.join(self._chunks)
+
+
+class _DiscardBuffer(object):
+    def __init__(self, empty):
+        self._empty = empty
+
+    def append(self, output):
+        pass
+
+    def value(self):
+        return self._empty
+
+
+class _TailBuffer(object):
+    def __init__(self, empty, size):
+        self._empty = empty
+        self._size = size
+        self._chunks = collections.deque()
+        self._length = 0
+        self.omitted = 0
+
+    def append(self, output):
+        self._chunks.append(output)
+        self._length += len(output)
+        while self._length > self._size:
+            excess = self._length - self._size
+            first = self._chunks[0]
+            if len(first) <= excess:
+                self._chunks.popleft()
+                removed = len(first)
+            else:
+                self._chunks[0] = first[excess:]
+                removed = excess
+            self._length -= removed
+            self.omitted += removed
+
+    def value(self):
+        return _with_omission(self.retained(), 0, self.omitted)
+
+    def retained(self):
+        return self._empty.join(self._chunks)
+
+
+class _HeadAndTailBuffer(object):
+    def __init__(self, empty, head_size, tail_size):
+        self._empty = empty
+        self._head_size = head_size
+        self._head = []
+        self._head_length = 0
+        self._tail = _TailBuffer(empty, tail_size)
+
+    def append(self, output):
+        remaining_head = self._head_size - self._head_length
+        if remaining_head > 0:
+            self._head.append(output[:remaining_head])
+            self._head_length += len(self._head[-1])
+            output = output[remaining_head:]
+        if output:
+            self._tail.append(output)
+
+    def value(self):
+        head = self._empty.join(self._head)
+        return _with_omission(head + self._tail.retained(), len(head), self._tail.omitted)
+
+
+class _SpillBuffer(object):
+    def __init__(self, empty, max_memory_size):
+        self._empty = empty
+        self._max_memory_size = max_memory_size
+        self._chunks = []
+        self._length = 0
+        self._file = None
+
+    def append(self, output):
+        self._length += len(output)
+        if self._file is not None:
+            self._file.write(output)
+        elif self._length > self._max_memory_size:
+            self._file = self._create_file()
+            for chunk in self._chunks:
+                self._file.write(chunk)
+            self._file.write(output)
+            self._chunks = None
+        else:
+            self._chunks.append(output)
+
+    def value(self):
+        if self._file is None:
+            return self._empty.join(self._chunks)
+        else:
+            self._file.flush()
+            return SpilledOutput(self._file, self._length, _unit_name(self._empty))
+
+    def _create_file(self):
+        if isinstance(self._empty, bytes):
+            return tempfile.TemporaryFile("w+b")
+        else:
+            return tempfile.TemporaryFile("w+", encoding="utf-8", newline="")
+
+
+class _OmittedBytes(bytes):
+    pass
+
+
+class _OmittedText(str):
+    pass
+
+
+def _with_omission(output, offset, omitted):
+    # The output is only the output that was kept, but remembers how much
+    # was omitted, and where, so that a marker can be shown in its place
+    if not omitted:
+        return output
+
+    output_type = _OmittedBytes if isinstance(output, bytes) else _OmittedText
+    output = output_type(output)
+    output.omitted = omitted
+    output.omitted_offset = offset
+    return output
+
+
+def omitted(output):
+    """Return the number of bytes, or characters if the output was decoded,
+    omitted from captured output.
+    """
+    return getattr(output, "omitted", 0)
+
+
+def with_omitted_marker(output):
+    """Return captured output with a marker such as
+    "[... 1024 bytes omitted ...]" in place of any omitted output.
+    """
+    if not omitted(output):
+        return output
+
+    empty = output[:0]
+    marker = "[... {0} {1} omitted ...]".format(output.omitted, _unit_name(empty))
+    if isinstance(empty, bytes):
+        marker = marker.encode("ascii")
+    offset = output.omitted_offset
+    return empty.join([output[:offset], marker, output[offset:]])
+
+
+def _unit_name(empty):
+    return "bytes" if isinstance(empty, bytes) else "characters"
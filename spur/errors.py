@@ -24,3 +24,13 @@ class CouldNotChangeDirectoryError(OSError):
         )
         super(type(self), self).__init__(message)
         self.directory = directory
+
+
+class CommandTimeoutError(Exception):
+    def __init__(self, command, timeout, output=None, stderr_output=None):
+        message = "Command did not finish within {0} seconds: {1}".format(timeout, command)
+        super(type(self), self).__init__(message)
+        self.command = command
+        self.timeout = timeout
+        self.output = output
+        self.stderr_output = stderr_output
@@ -0,0 +1,128 @@
+from __future__ import absolute_import
+
+import errno
+import os
+import shutil
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+
+# From linux/fs.h
+_FICLONE = 0x40049409
+_MAX_COPY_SIZE = 1024 * 1024 * 1024
+_BUFFER_SIZE = 1024 * 1024
+
+_UNSUPPORTED_ERRNOS = set([
+    errno.ENOSYS,
+    errno.EXDEV,
+    errno.EINVAL,
+    errno.ENOTTY,
+    errno.EBADF,
+    errno.EOPNOTSUPP,
+    getattr(errno, "ENOTSUP", errno.EOPNOTSUPP),
+])
+
+
+def copyfile(source, destination):
+    """Copy the contents of source to destination without reading the
+    contents into Python where possible, using (in order of preference) a
+    reflink, copy_file_range or sendfile.
+    """
+    # As with shutil.copyfile, opening the destination would otherwise
+    # truncate the source
+    if _is_same_file(source, destination):
+        raise shutil.SameFileError("{0!r} and {1!r} are the same file".format(source, destination))
+
+    with open(source, "rb") as source_file:
+        with open(destination, "wb") as destination_file:
+            _copy_contents(source_file.fileno(), destination_file.fileno())
+    return destination
+
+
+def copy2(source, destination, follow_symlinks=True):
+    if not follow_symlinks and os.path.islink(source):
+        return shutil.copy2(source, destination, follow_symlinks=False)
+
+    if os.path.isdir(destination):
+        destination = os.path.join(destination, os.path.basename(source))
+    copyfile(source, destination)
+    shutil.copystat(source, destination)
+    return destination
+
+
+def _is_same_file(source, destination):
+    try:
+        return os.path.samefile(source, destination)
+    except OSError:
+        return False
+
+
+def _copy_contents(source_fd, destination_fd):
+    # Files such as those in /proc report a size of zero, but have contents
+    # that can only be read using read()
+    if os.fstat(source_fd).st_size > 0:
+        for copy in _copy_methods:
+            if copy(source_fd, destination_fd):
+                return
+    _copy_by_reading(source_fd, destination_fd)
+
+
+def _reflink(source_fd, destination_fd):
+    if fcntl is None:
+        return False
+    try:
+        fcntl.ioctl(destination_fd, _FICLONE, source_fd)
+        return True
+    except (IOError, OSError) as error:
+        if error.errno in _UNSUPPORTED_ERRNOS or error.errno == errno.EPERM:
+            return False
+        else:
+            raise
+
+
+def _copy_file_range(source_fd, destination_fd):
+    if not hasattr(os, "copy_file_range"):
+        return False
+    return _copy_in_calls(lambda: os.copy_file_range(source_fd, destination_fd, _MAX_COPY_SIZE))
+
+
+def _sendfile(source_fd, destination_fd):
+    if not hasattr(os, "sendfile"):
+        return False
+    return _copy_in_calls(lambda: os.sendfile(destination_fd, source_fd, None, _MAX_COPY_SIZE))
+
+
+def _copy_in_calls(copy):
+    # Only called for non-empty files. Falling back to another method is
+    # only safe if nothing has been copied yet.
+    copied = 0
+    while True:
+        try:
+            length = copy()
+        except OSError as error:
+            if copied == 0 and error.errno in _UNSUPPORTED_ERRNOS:
+                return False
+            else:
+                raise
+        if length == 0:
+            # Some file systems report that nothing can be copied, rather
+            # than raising an error
+            return copied > 0
+        copied += length
+
+
+def _copy_by_reading(source_fd, destination_fd):
+    while True:
+        data = os.read(source_fd, _BUFFER_SIZE)
+        if not data:
+            return
+        view = memoryview(data)
+        while view:
+            written = os.write(destination_fd, view)
+            view = view[written:]
+
+
+_copy_methods = [_reflink, _copy_file_range, _sendfile]
@@ -0,0 +1,71 @@
+from __future__ import absolute_import
+
+import concurrent.futures
+
+
+_DEFAULT_MAX_CONCURRENCY = 32
+
+
+def run_many(shells, command, **kwargs):
+    max_concurrency = kwargs.pop("max_concurrency", None)
+    return ShellGroup(shells, max_concurrency=max_concurrency).run(command, **kwargs)
+
+
+class ShellGroup(object):
+    def __init__(self, shells, max_concurrency=None):
+        if max_concurrency is None:
+            max_concurrency = _DEFAULT_MAX_CONCURRENCY
+
+        self._shells = list(shells)
+        self._max_concurrency = max_concurrency
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        for shell in self._shells:
+            shell.close()
+
+    def run(self, command, *args, **kwargs):
+        timeout = kwargs.pop("timeout", None)
+        fail_fast = kwargs.pop("fail_fast", False)
+
+        executor = concurrent.futures.ThreadPoolExecutor(max_workers=self._max_concurrency)
+        futures = dict(
+            (executor.submit(_run, shell, command, args, kwargs, timeout), shell)
+            for shell in self._shells
+        )
+        return self._results(executor, futures, fail_fast)
+
+    def _results(self, executor, futures, fail_fast):
+        try:
+            for future in concurrent.futures.as_completed(futures):
+                shell = futures[future]
+                error = future.exception()
+                if error is not None and fail_fast:
+                    raise error
+                elif error is None:
+                    yield GroupResult(shell, future.result(), None)
+                else:
+                    yield GroupResult(shell, None, error)
+        finally:
+            for future in futures:
+                future.cancel()
+            executor.shutdown(wait=False)
+
+
+class GroupResult(object):
+    def __init__(self, shell, result, error):
+        self.shell = shell
+        self.result = result
+        self.error = error
+
+
+def _run(shell, command, args, kwargs, timeout):
+    if timeout is None:
+        return shell.run(command, *args, **kwargs)
+    else:
+        return shell.run(command, *args, timeout=timeout, **kwargs)
@@ -1,85 +1,443 @@
 from __future__ import unicode_literals
 
+import os
+import errno
 import threading
 import codecs
+import selectors
+import time
+
+from . import capture as capture_policies
+
+
+DEFAULT_CHUNK_SIZE = 64 * 1024
 
 
 class IoHandler(object):
-    def __init__(self, channels, encoding):
+    def __init__(self, channels, encoding, chunk_size=None, hub=None, capture=None):
+        if chunk_size is None:
+            chunk_size = DEFAULT_CHUNK_SIZE
+
+        if capture is None:
+            capture = capture_policies.everything()
+
         self._handlers = [
-            _output_handler(channel, encoding)
+            _output_handler(channel, encoding, chunk_size, hub, capture)
             for channel in channels
         ]
-        
+
     def wait(self):
         return [handler.wait() for handler in self._handlers]
 
+    def join(self, timeout=None):
+        """Wait until all output has been read, returning False if the
+        timeout expires first. Output is read in the background from then
+        on, so that the output read so far is available from
+        partial_output.
+        """
+        deadline = None if timeout is None else time.time() + timeout
+        for handler in self._handlers:
+            handler.start()
+        for handler in self._handlers:
+            if not handler.join(_remaining(deadline)):
+                return False
+        return True
+
+    def partial_output(self):
+        return [handler.partial_output() for handler in self._handlers]
+
+    def iter_chunks(self):
+        # Only the output of the first channel is iterated over, but the
+        # other channels still need reading so that the process doesn't
+        # block on a full pipe
+        first_handler = self._handlers[0]
+        chunks = first_handler.iter_chunks()
+        for handler in self._handlers[1:]:
+            handler.start()
+        return chunks
+
+    def iter_lines(self):
+        line_buffer = LineBuffer()
+        for chunk in self.iter_chunks():
+            for line in line_buffer.feed(chunk):
+                yield line
+
+        for line in line_buffer.flush():
+            yield line
+
+
+def _remaining(deadline):
+    if deadline is None:
+        return None
+    else:
+        return max(0, deadline - time.time())
+
 
 class Channel(object):
-    def __init__(self, file_in, file_out, is_pty=False):
+    def __init__(self, file_in, file_out, is_pty=False, on_read=None):
         self.file_in = file_in
         self.file_out = file_out
         self.is_pty = is_pty
+        # Called with each chunk read, including the empty chunk at EOF
+        self.on_read = on_read
 
 
-def _output_handler(channel, encoding):
-    if encoding is None:
-        file_in = channel.file_in
-        empty = b""
+def read_chunk(file_in, chunk_size):
+    # Unlike read(), read1() returns as soon as any data is available on
+    # buffered files. Unbuffered files already behave this way when
+    # calling read().
+    read1 = getattr(file_in, "read1", None)
+    if read1 is None:
+        return file_in.read(chunk_size)
     else:
-        file_in = codecs.getreader(encoding)(channel.file_in)
-        empty = ""
-    
-    if channel.file_out is None and not channel.is_pty:
-        return _ReadOutputAtEnd(file_in)
+        return read1(chunk_size)
+
+
+def _output_handler(channel, encoding, chunk_size, hub, capture):
+    if channel.file_in is None:
+        return _NoOutput(encoding)
+    elif channel.file_out is None and not channel.is_pty:
+        return _ReadOutputAtEnd(channel, encoding, chunk_size, hub, capture)
     else:
+        return _start_continuous_reader(channel, encoding, chunk_size, hub, capture)
+
+
+def _start_continuous_reader(channel, encoding, chunk_size, hub, capture):
+    if hub is None:
         return _ContinuousReader(
-            file_in=file_in,
+            file_in=channel.file_in,
             file_out=channel.file_out,
             is_pty=channel.is_pty,
-            empty=empty,
+            on_read=channel.on_read,
+            encoding=encoding,
+            chunk_size=chunk_size,
+            capture=capture,
         )
+    else:
+        return _HubReader(hub, channel, encoding, capture)
+
+
+def create_decoder(encoding):
+    if encoding is None:
+        return _BytesDecoder()
+    else:
+        return codecs.getincrementaldecoder(encoding)()
+
+
+class _BytesDecoder(object):
+    def decode(self, data, final=False):
+        return data
+
+
+class LineBuffer(object):
+    def __init__(self):
+        self._pending = None
+
+    def feed(self, output):
+        if self._pending is not None:
+            output = self._pending + output
+        newline = "\n" if isinstance(output, type("")) else b"\n"
+        lines = output.split(newline)
+        self._pending = lines.pop()
+        return [line + newline for line in lines]
+
+    def flush(self):
+        pending = self._pending
+        self._pending = None
+        return [pending] if pending else []
+
+
+class _NoOutput(object):
+    def __init__(self, encoding):
+        self._output = b"" if encoding is None else ""
+
+    def start(self):
+        pass
+
+    def wait(self):
+        return self._output
+
+    def join(self, timeout):
+        return True
+
+    def partial_output(self):
+        return self._output
+
+    def iter_chunks(self):
+        return iter([])
 
 
 class _ReadOutputAtEnd(object):
-    def __init__(self, file_in):
-        self._file_in = file_in
-    
+    def __init__(self, channel, encoding, chunk_size, hub, capture):
+        self._channel = channel
+        self._encoding = encoding
+        self._decoder = create_decoder(encoding)
+        self._chunk_size = chunk_size
+        self._hub = hub
+        self._capture = capture
+        self._reader = None
+
+    def start(self):
+        if self._reader is None:
+            self._reader = _start_continuous_reader(
+                self._channel,
+                self._encoding,
+                self._chunk_size,
+                self._hub,
+                self._capture,
+            )
+
     def wait(self):
-        return self._file_in.read()
-    
+        if self._reader is None and self._hub is None:
+            output_buffer = self._capture.create_buffer(self._encoding)
+            for output in self._iter_chunks():
+                output_buffer.append(output)
+            return output_buffer.value()
+        else:
+            self.start()
+            return self._reader.wait()
+
+    def join(self, timeout):
+        self.start()
+        return self._reader.join(timeout)
+
+    def partial_output(self):
+        if self._reader is None:
+            return self._capture.create_buffer(self._encoding).value()
+        else:
+            return self._reader.partial_output()
+
+    def iter_chunks(self):
+        if self._reader is not None:
+            raise already_capturing_error()
+        return self._iter_chunks()
+
+    def _iter_chunks(self):
+        while True:
+            chunk = read_chunk(self._channel.file_in, self._chunk_size)
+            if self._channel.on_read is not None:
+                self._channel.on_read(chunk)
+            output = self._decoder.decode(chunk, final=not chunk)
+            if output:
+                yield output
+            if not chunk:
+                return
+
+
+def already_capturing_error():
+    return RuntimeError("Cannot iterate over output that is already being captured")
+
 
 class _ContinuousReader(object):
-    def __init__(self, file_in, file_out, is_pty, empty):
+    def __init__(self, file_in, file_out, is_pty, on_read, encoding, chunk_size, capture):
         self._file_in = file_in
         self._file_out = file_out
         self._is_pty = is_pty
-        self._empty = empty
-        
-        self._output = empty
-        
+        self._on_read = on_read
+        self._decoder = create_decoder(encoding)
+        self._chunk_size = chunk_size
+        self._output_buffer = capture.create_buffer(encoding)
+
+        self._output = b"" if encoding is None else ""
+
         self._thread = threading.Thread(target=self._capture_output)
         self._thread.daemon = True
         self._thread.start()
 
+    def start(self):
+        pass
+
     def wait(self):
         self._thread.join()
         return self._output
-    
+
+    def join(self, timeout):
+        self._thread.join(timeout)
+        return not self._thread.is_alive()
+
+    def partial_output(self):
+        return self._output_buffer.value()
+
+    def iter_chunks(self):
+        raise already_capturing_error()
+
     def _capture_output(self):
-        output_buffer = []
         while True:
             try:
-                output = self._file_in.read(1)
+                chunk = read_chunk(self._file_in, self._chunk_size)
             except IOError:
                 if self._is_pty:
-                    output = self._empty
+                    chunk = b""
                 else:
                     raise
+            if self._on_read is not None:
+                self._on_read(chunk)
+            output = self._decoder.decode(chunk, final=not chunk)
             if output:
                 if self._file_out is not None:
                     self._file_out.write(output)
-                output_buffer.append(output)
+                self._output_buffer.append(output)
+            if not chunk:
+                self._output = self._output_buffer.value()
+                return
+
+
+class SelectorIoHub(object):
+    """Read the output of many processes using a single thread.
+
+    The thread is started when the first file is registered, and runs until
+    the hub is closed. Reading from any files still registered when the hub
+    is closed fails with RuntimeError.
+    """
+    def __init__(self, chunk_size=None):
+        if chunk_size is None:
+            chunk_size = DEFAULT_CHUNK_SIZE
+
+        self._chunk_size = chunk_size
+        self._selector = selectors.DefaultSelector()
+        self._lock = threading.Lock()
+        self._pending = []
+        self._thread = None
+        self._closed = False
+
+        self._wake_read, self._wake_write = os.pipe()
+        self._selector.register(self._wake_read, selectors.EVENT_READ)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    @property
+    def closed(self):
+        return self._closed
+
+    def register(self, file_in, reader):
+        """Call reader.feed(chunk) with each chunk read from file_in.
+
+        EOF is signalled by feeding an empty chunk. If reading fails,
+        reader.fail(error) is called instead. In either case, file_in is
+        then unregistered.
+        """
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("I/O hub is closed")
+            self._pending.append((file_in, reader))
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run)
+                self._thread.daemon = True
+                self._thread.start()
+        self._wake()
+
+    def close(self):
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            thread = self._thread
+
+        self._wake()
+        if thread is not None:
+            thread.join()
+        self._selector.close()
+        os.close(self._wake_read)
+        os.close(self._wake_write)
+
+    def _wake(self):
+        os.write(self._wake_write, b"\0")
+
+    def _run(self):
+        while True:
+            for key, events in self._selector.select():
+                if key.fileobj == self._wake_read:
+                    os.read(self._wake_read, 4096)
+                    if not self._register_pending():
+                        self._fail_registered()
+                        return
+                else:
+                    self._read(key.fileobj, key.data)
+
+    def _register_pending(self):
+        with self._lock:
+            pending = self._pending
+            self._pending = []
+            closed = self._closed
+
+        for file_in, reader in pending:
+            self._selector.register(file_in, selectors.EVENT_READ, reader)
+
+        return not closed
+
+    def _fail_registered(self):
+        for key in list(self._selector.get_map().values()):
+            if key.fileobj != self._wake_read:
+                self._selector.unregister(key.fileobj)
+                key.data.fail(RuntimeError("I/O hub was closed before reading all output"))
+
+    def _read(self, file_in, reader):
+        try:
+            chunk = os.read(file_in.fileno(), self._chunk_size)
+        except OSError as error:
+            # Reading from the master end of a pty raises EIO once the
+            # slave end has been closed
+            if error.errno == errno.EIO:
+                chunk = b""
             else:
-                self._output = self._empty.join(output_buffer)
+                self._selector.unregister(file_in)
+                reader.fail(error)
                 return
+
+        if not chunk:
+            self._selector.unregister(file_in)
+        reader.feed(chunk)
+
+
+class _HubReader(object):
+    def __init__(self, hub, channel, encoding, capture):
+        self._file_out = channel.file_out
+        self._on_read = channel.on_read
+        self._decoder = create_decoder(encoding)
+        self._output_buffer = capture.create_buffer(encoding)
+        self._error = None
+        self._done = threading.Event()
+
+        hub.register(channel.file_in, self)
+
+    def start(self):
+        pass
+
+    def wait(self):
+        self._done.wait()
+        if self._error is not None:
+            raise self._error
+        return self._output_buffer.value()
+
+    def join(self, timeout):
+        return self._done.wait(timeout)
+
+    def partial_output(self):
+        return self._output_buffer.value()
+
+    def iter_chunks(self):
+        raise already_capturing_error()
+
+    def feed(self, chunk):
+        try:
+            if self._error is None:
+                if self._on_read is not None:
+                    self._on_read(chunk)
+                output = self._decoder.decode(chunk, final=not chunk)
+                if output:
+                    if self._file_out is not None:
+                        self._file_out.write(output)
+                    self._output_buffer.append(output)
+        except Exception as error:
+            self._error = error
+
+        if not chunk:
+            self._done.set()
+
+    def fail(self, error):
+        self._error = error
+        self._done.set()
@@ -4,23 +4,27 @@ import os
 import sys
 import subprocess
 import shutil
-import io
-import threading
 import errno
-
-try:
-    import pty
-except ImportError:
-    pty = None
+import signal
 
 from .tempdir import create_temporary_dir
 from .files import FileOperations
 from . import results
+from . import sync
+from . import fastcopy
+from . import stdin as stdin_sources
 from .io import IoHandler, Channel
+from .terminal import Pty
+from .timeouts import Deadline
+from .timings import Timings, report_timings
 from .errors import NoSuchCommandError, CouldNotChangeDirectoryError
 
 
 class LocalShell(object):
+    def __init__(self, io_hub=None, timings_hook=None):
+        self._io_hub = io_hub
+        self._timings_hook = timings_hook
+
     def __enter__(self):
         return self
 
@@ -30,36 +34,116 @@ class LocalShell(object):
     def close(self):
         pass
 
-    def upload_dir(self, source, dest, ignore=None):
-        shutil.copytree(source, dest, ignore=shutil.ignore_patterns(*ignore))
+    def upload_dir(self, source, dest, ignore=None, stream=False, compression=None):
+        # Files are copied directly, so streaming and compression don't
+        # apply, but compression is checked in the same way as SshShell
+        sync.find_compressor(compression)
+        timings = Timings("upload_dir", dest)
+        shutil.copytree(source, dest, ignore=shutil.ignore_patterns(*ignore), copy_function=fastcopy.copy2)
+        report_timings(timings, self._timings_hook)
+
+    def sync_dir(self, source, dest, ignore=None, checksum=False, delete=True, compression=None):
+        sync.find_compressor(compression)
+        source_manifest = sync.local_manifest(source, ignore)
+        dest_manifest = sync.local_manifest(dest, ignore)
+        to_copy, to_delete, to_hash = sync.compare(source_manifest, dest_manifest, checksum=checksum, delete=delete)
+        to_copy = sorted(to_copy + [
+            path
+            for path in to_hash
+            if sync.hash_file(os.path.join(source, path)) != sync.hash_file(os.path.join(dest, path))
+        ])
+
+        for path in to_delete:
+            dest_path = os.path.join(dest, path)
+            if dest_manifest[path].type == "d":
+                shutil.rmtree(dest_path)
+            else:
+                os.remove(dest_path)
+
+        for path in to_copy:
+            source_path = os.path.join(source, path)
+            dest_path = os.path.join(dest, path)
+            file_type = source_manifest[path].type
+            if file_type == "d":
+                if not os.path.isdir(dest_path):
+                    os.makedirs(dest_path)
+            else:
+                dest_parent = os.path.dirname(dest_path)
+                if not os.path.isdir(dest_parent):
+                    os.makedirs(dest_parent)
+                if file_type == "l" and os.path.lexists(dest_path):
+                    os.remove(dest_path)
+                fastcopy.copy2(source_path, dest_path, follow_symlinks=False)
+
+        return sync.SyncResult(copied=to_copy, deleted=to_delete)
 
     def upload_file(self, source, dest):
-        shutil.copyfile(source, dest)
+        fastcopy.copyfile(source, dest)
+
+    def upload_files(self, paths, concurrency=None, chunk_size=None, progress=None):
+        # Both the source and destination are local, so copying files one at
+        # a time is as fast as copying them concurrently
+        for source, dest in paths:
+            dest_dir = os.path.dirname(dest)
+            if dest_dir and not os.path.isdir(dest_dir):
+                os.makedirs(dest_dir)
+            fastcopy.copyfile(source, dest)
+            if progress is not None:
+                size = os.path.getsize(dest)
+                progress(source, size, size)
+
+    download_files = upload_files
 
     def open(self, name, mode="r"):
-        return open(name, mode)
+        timings = Timings("open", name)
+        file = open(name, mode)
+        report_timings(timings, self._timings_hook)
+        return file
 
     def write_file(self, remote_path, contents):
-        subprocess.check_call(["mkdir", "-p", os.path.dirname(remote_path)])
-        open(remote_path, "w").write(contents)
+        self.files.write_file(remote_path, contents)
+
+    def run_batch(self, commands, *args, **kwargs):
+        allow_error = kwargs.pop("allow_error", False)
+        return results.batch_results([
+            self.run(command, *args, allow_error=True, **kwargs)
+            for command in commands
+        ], allow_error)
 
     def spawn(self, command, *args, **kwargs):
+        stdin = kwargs.pop("stdin", None)
         stdout = kwargs.pop("stdout", None)
         stderr = kwargs.pop("stderr", None)
         allow_error = kwargs.pop("allow_error", False)
         store_pid = kwargs.pop("store_pid", False)
         use_pty = kwargs.pop("use_pty", False)
+        pty_size = kwargs.pop("pty_size", None)
         encoding = kwargs.pop("encoding", None)
+        capture = kwargs.pop("capture", None)
+        timeout = kwargs.pop("timeout", None)
         cwd = kwargs.get("cwd")
+        new_process_group = kwargs.get("new_process_group", False)
+        timings = Timings("spawn", command)
+        if self._io_hub is not None and self._io_hub.closed:
+            raise RuntimeError("I/O hub is closed")
+
+        stdin_file = None
+        stdin_writer = None
+        if stdin is not None:
+            if stdin_sources.is_path(stdin) and not use_pty:
+                # The process reads the file directly
+                stdin_file = open(stdin, "rb")
+            else:
+                stdin_writer = stdin_sources.StdinWriter(stdin)
+
         if use_pty:
-            if pty is None:
-                raise ValueError("use_pty is not supported when the pty module cannot be imported")
-            master, slave = pty.openpty()
-            stdin_arg = slave
-            stdout_arg = slave
+            terminal = Pty(size=pty_size)
+            stdin_arg = terminal.slave
+            stdout_arg = terminal.slave
             stderr_arg = subprocess.STDOUT
         else:
-            stdin_arg = subprocess.PIPE
+            terminal = None
+            stdin_arg = subprocess.PIPE if stdin_file is None else stdin_file
             stdout_arg = subprocess.PIPE
             stderr_arg = subprocess.PIPE
 
@@ -71,51 +155,67 @@ class LocalShell(object):
                 bufsize=0,
                 **self._subprocess_args(command, *args, **kwargs)
             )
-        except FileNotFoundError as error:
-            if cwd is not None and error.filename == cwd:
-                raise CouldNotChangeDirectoryError(cwd, error)
-            elif error.filename == command[0]:
-                raise NoSuchCommandError(command[0])
-            else:
-                raise
         except OSError as error:
-            if cwd is not None and self._is_cannot_change_directory_oserror(error, cwd):
-                raise CouldNotChangeDirectoryError(cwd, error)
-            elif self._is_no_such_command_oserror(error, command[0]):
-                raise NoSuchCommandError(command[0])
-            else:
-                raise
-
+            if stdin_writer is not None:
+                stdin_writer.close()
+            if terminal is not None:
+                terminal.close()
+            raise self._spawn_error(error, command, cwd)
+        finally:
+            if stdin_file is not None:
+                stdin_file.close()
+        timings.mark("initialized")
+
+        stdout_counter = timings.counter("stdout_bytes")
         if use_pty:
-            # TODO: Should close master ourselves rather than relying on
-            # garbage collection
-            process_stdin = os.fdopen(os.dup(master), "wb", 0)
-            process_stdout = os.fdopen(master, "rb", 0)
-            process_stderr = io.BytesIO()
-
-            def close_slave_on_exit():
-                process.wait()
-                # TODO: ensure the IO handler has finished before closing
-                os.close(slave)
-
-            thread = threading.Thread(target=close_slave_on_exit)
-            thread.daemon = True
-            thread.start()
-
+            # The subprocess has its own copy of the slave, so reading from
+            # the master reaches EOF once the subprocess closes it. The
+            # master is then closed by the reader.
+            terminal.close_slave()
+            process_stdin = terminal
+            process_stdout = terminal
+            process_stderr = None
+            on_stdout_read = _chain(stdout_counter, terminal.on_read)
         else:
             process_stdin = process.stdin
             process_stdout = process.stdout
             process_stderr = process.stderr
+            on_stdout_read = stdout_counter
+
+        try:
+            io_handler = IoHandler([
+                Channel(process_stdout, stdout, is_pty=use_pty, on_read=on_stdout_read),
+                Channel(
+                    process_stderr,
+                    stderr,
+                    is_pty=use_pty,
+                    on_read=None if process_stderr is None else timings.counter("stderr_bytes"),
+                ),
+            ], encoding=encoding, hub=self._io_hub, capture=capture)
+        except:
+            # Such as when the I/O hub has been closed. The process has
+            # already been started, so kill it rather than leaving it running.
+            _kill(process, new_process_group)
+            process.wait()
+            for process_file in [process.stdin, process.stdout, process.stderr, terminal, stdin_writer]:
+                if process_file is not None:
+                    process_file.close()
+            raise
 
         spur_process = LocalProcess(
             process,
             allow_error=allow_error,
             process_stdin=process_stdin,
-            io_handler=IoHandler([
-                Channel(process_stdout, stdout, is_pty=use_pty),
-                Channel(process_stderr, stderr, is_pty=use_pty),
-            ], encoding=encoding)
+            io_handler=io_handler,
+            deadline=Deadline(command, lambda: _kill(process, new_process_group)),
+            timings=timings,
+            timings_hook=self._timings_hook,
+            stdin_writer=stdin_writer,
+            terminal=terminal,
         )
+        spur_process._deadline.start(timeout)
+        if stdin_writer is not None:
+            stdin_writer.start(spur_process, pipe_fd=None if use_pty else process_stdin.fileno())
         if store_pid:
             spur_process.pid = process.pid
         return spur_process
@@ -128,7 +228,7 @@ class LocalShell(object):
 
     @property
     def files(self):
-        return FileOperations(self)
+        return LocalFileOperations(self)
 
     def _subprocess_args(self, command, cwd=None, update_env=None, new_process_group=False):
         kwargs = {
@@ -136,13 +236,29 @@ class LocalShell(object):
             "cwd": cwd,
         }
         if update_env is not None:
-            new_env = os.environ.copy()
-            new_env.update(update_env)
-            kwargs["env"] = new_env
+            kwargs["env"] = dict(os.environ, **update_env)
         if new_process_group:
-            kwargs["preexec_fn"] = os.setpgrp
+            # Unlike preexec_fn, process_group allows the subprocess to be
+            # started using vfork, which is much quicker than fork when this
+            # process is using a lot of memory
+            if sys.version_info >= (3, 11):
+                kwargs["process_group"] = 0
+            else:
+                kwargs["preexec_fn"] = os.setpgrp
         return kwargs
 
+    def _spawn_error(self, error, command, cwd):
+        if isinstance(error, FileNotFoundError):
+            if cwd is not None and error.filename == cwd:
+                return CouldNotChangeDirectoryError(cwd, error)
+            elif error.filename == command[0]:
+                return NoSuchCommandError(command[0])
+        elif cwd is not None and self._is_cannot_change_directory_oserror(error, cwd):
+            return CouldNotChangeDirectoryError(cwd, error)
+        elif self._is_no_such_command_oserror(error, command[0]):
+            return NoSuchCommandError(command[0])
+        return error
+
     def _is_no_such_command_oserror(self, error, command):
         if error.errno != errno.ENOENT:
             return False
@@ -169,11 +285,63 @@ class LocalShell(object):
             )
 
 
+class LocalFileOperations(FileOperations):
+    def copy_file(self, source, destination=None, dir=None):
+        if destination is None and dir is None:
+            raise TypeError("Destination required for copy")
+
+        if destination is None:
+            destination = os.path.join(dir, os.path.basename(source))
+        fastcopy.copyfile(source, destination)
+        shutil.copymode(source, destination)
+
+    def exists(self, path):
+        return os.path.exists(path)
+
+    def stat(self, path):
+        return os.stat(path)
+
+    def listdir(self, path):
+        return os.listdir(path)
+
+    def walk(self, top):
+        return os.walk(top)
+
+    def makedirs(self, path):
+        os.makedirs(path, exist_ok=True)
+
+    def remove(self, path):
+        os.remove(path)
+
+    def rename(self, source, destination):
+        os.rename(source, destination)
+
+    def read_bytes(self, path):
+        with open(path, "rb") as f:
+            return f.read()
+
+    def write_bytes(self, path, contents):
+        with open(path, "wb") as f:
+            f.write(contents)
+
+    def write_file(self, path, contents):
+        dir_path = os.path.dirname(path)
+        if dir_path:
+            self.makedirs(dir_path)
+        with open(path, "w") as f:
+            f.write(contents)
+
+
 class LocalProcess(object):
-    def __init__(self, subprocess, allow_error, process_stdin, io_handler):
+    def __init__(self, subprocess, allow_error, process_stdin, io_handler, deadline, timings, timings_hook, stdin_writer=None, terminal=None):
         self._subprocess = subprocess
         self._allow_error = allow_error
         self._process_stdin = process_stdin
+        self._stdin_writer = stdin_writer
+        self._terminal = terminal
+        self._deadline = deadline
+        self._timings = timings
+        self._timings_hook = timings_hook
         self._result = None
 
         self._io = io_handler
@@ -182,25 +350,74 @@ class LocalProcess(object):
         return self._subprocess.poll() is None
 
     def stdin_write(self, value):
+        if self._process_stdin is None:
+            raise ValueError("Cannot write to stdin when spawn is passed a path as stdin")
         self._process_stdin.write(value)
 
+    def stdin_close(self):
+        if self._terminal is not None:
+            self._terminal.send_eof()
+        elif self._process_stdin is not None:
+            self._process_stdin.close()
+
+    def resize_pty(self, width, height):
+        if self._terminal is None:
+            raise ValueError("Process was not spawned with use_pty=True")
+        self._terminal.set_window_size(width, height)
+
     def send_signal(self, signal):
         self._subprocess.send_signal(signal)
 
-    def wait_for_result(self):
+    def iter_chunks(self):
+        return self._io.iter_chunks()
+
+    def iter_lines(self):
+        return self._io.iter_lines()
+
+    def wait_for_result(self, timeout=None):
         if self._result is None:
-            self._result = self._generate_result()
+            self._result = self._generate_result(timeout)
 
         return self._result
 
-    def _generate_result(self):
-        output, stderr_output = self._io.wait()
-        return_code = self._subprocess.wait()
+    def _generate_result(self, timeout):
+        self._deadline.set(timeout)
+        try:
+            output, stderr_output = self._deadline.wait_for_output(self._io)
+            try:
+                return_code = self._subprocess.wait(self._deadline.remaining())
+                self._timings.mark("exited")
+            except subprocess.TimeoutExpired:
+                self._deadline.expire()
+            if self._deadline.expired:
+                raise self._deadline.error(output, stderr_output)
+        finally:
+            self._deadline.finish()
+            report_timings(self._timings, self._timings_hook)
+        if self._stdin_writer is not None and self._stdin_writer.error is not None:
+            raise self._stdin_writer.error
 
         return results.result(
             return_code,
             self._allow_error,
             output,
-            stderr_output
+            stderr_output,
+            self._timings,
         )
 
+
+def _chain(first, second):
+    def call_both(*args):
+        first(*args)
+        second(*args)
+
+    return call_both
+
+
+def _kill(process, new_process_group):
+    if new_process_group:
+        try:
+            os.killpg(process.pid, signal.SIGKILL)
+        except OSError:
+            pass
+    process.kill()
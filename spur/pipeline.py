@@ -0,0 +1,157 @@
+from __future__ import absolute_import
+
+import threading
+import time
+
+from .timeouts import _KILL_GRACE_PERIOD
+
+
+def pipe(*processes):
+    """Connect the standard output of each process to the standard input of
+    the next process, returning a Pipeline.
+
+    Output is copied a chunk at a time: output is only read from a process
+    once the previous chunk has been written to the next process, so at
+    most one chunk per pair of processes is held in memory.
+    """
+    return Pipeline(processes)
+
+
+class Pipeline(object):
+    def __init__(self, processes):
+        if len(processes) < 2:
+            raise ValueError("A pipeline requires at least two processes")
+
+        self.processes = list(processes)
+        # Iterating over output raises an error straight away if the output
+        # can't be iterated over, so do so before starting any threads
+        self._pumps = [
+            _Pump(source.iter_chunks(), destination)
+            for source, destination in zip(self.processes, self.processes[1:])
+        ]
+        for pump in self._pumps:
+            pump.start()
+        self._result = None
+
+    def is_running(self):
+        return any(process.is_running() for process in self.processes)
+
+    def wait_for_result(self, timeout=None):
+        if self._result is None:
+            self._result = self._generate_result(timeout)
+
+        return self._result
+
+    def _generate_result(self, timeout):
+        deadline = None if timeout is None else time.time() + timeout
+        results = [None] * len(self.processes)
+        errors = [None] * len(self.processes)
+
+        # The last process is waited for first so that its output is read
+        # while the earlier processes are still running. The output of the
+        # other processes can only be waited for once it has all been piped.
+        for index in reversed(range(len(self.processes))):
+            if index < len(self._pumps):
+                pump = self._pumps[index]
+                if not pump.join(_remaining(deadline)):
+                    self._kill()
+                    if not pump.join(_KILL_GRACE_PERIOD):
+                        # Processes started by the killed process may still
+                        # have its output open
+                        errors[index] = self.processes[index]._deadline.error(None, None)
+                        continue
+                errors[index] = pump.error
+            try:
+                results[index] = self.processes[index].wait_for_result(_remaining(deadline))
+            except Exception as error:
+                errors[index] = error
+
+        # An error from an earlier process is likely to be the cause of
+        # errors from later processes, such as a truncated input
+        for error in errors:
+            if error is not None:
+                raise error
+
+        return PipelineResult(results, [pump.bytes_piped for pump in self._pumps])
+
+    def _kill(self):
+        for process in self.processes:
+            process._deadline.expire()
+
+
+class PipelineResult(object):
+    def __init__(self, results, bytes_piped):
+        self.results = results
+        self.bytes_piped = bytes_piped
+
+    @property
+    def return_code(self):
+        # As with pipefail in bash, the return code of the last process to
+        # fail is used
+        for result in reversed(self.results):
+            if result.return_code != 0:
+                return result.return_code
+        return 0
+
+    @property
+    def output(self):
+        return self.results[-1].output
+
+    @property
+    def stderr_output(self):
+        return self.results[-1].stderr_output
+
+
+def _remaining(deadline):
+    if deadline is None:
+        return None
+    else:
+        return max(0, deadline - time.time())
+
+
+class _Pump(object):
+    def __init__(self, chunks, destination):
+        self._chunks = chunks
+        self._destination = destination
+        self._destination_open = True
+        self.bytes_piped = 0
+        self.error = None
+        self._thread = threading.Thread(target=self._pump)
+        self._thread.daemon = True
+
+    def start(self):
+        self._thread.start()
+
+    def join(self, timeout=None):
+        self._thread.join(timeout)
+        return not self._thread.is_alive()
+
+    def _pump(self):
+        try:
+            for chunk in self._chunks:
+                if self._destination_open:
+                    self._write(chunk)
+        except Exception as error:
+            self.error = error
+        finally:
+            if self._destination_open:
+                self._close_destination()
+
+    def _write(self, chunk):
+        try:
+            self._destination.stdin_write(chunk)
+            self.bytes_piped += len(chunk)
+        except (EnvironmentError, EOFError):
+            # The destination has stopped reading its input, such as by
+            # exiting. The rest of the output is still read and discarded so
+            # that the source doesn't block on a full pipe.
+            self._destination_open = False
+        except Exception as error:
+            self.error = error
+            self._destination_open = False
+
+    def _close_destination(self):
+        try:
+            self._destination.stdin_close()
+        except (EnvironmentError, EOFError):
+            pass
@@ -0,0 +1,174 @@
+from __future__ import absolute_import
+
+import collections
+import socket
+import threading
+import time
+
+
+_FIVE_MINUTES = 5 * 60
+
+
+class ConnectionPool(object):
+    """Reuse SSH connections between instances of SshShell.
+
+    A connection is leased to one shell at a time, and returned to the pool
+    when the shell is closed. Connections that have been idle for longer
+    than idle_timeout seconds are closed.
+    """
+    def __init__(self, max_connections_per_host=None, idle_timeout=None):
+        if idle_timeout is None:
+            idle_timeout = _FIVE_MINUTES
+
+        self._max_connections_per_host = max_connections_per_host
+        self._idle_timeout = idle_timeout
+        self._condition = threading.Condition()
+        self._idle = collections.defaultdict(list)
+        self._connection_counts = collections.defaultdict(int)
+        self._statistics = PoolStatistics()
+        self._closed = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def acquire(self, key, connect, wait=True, timeout=None):
+        # If wait is False, None is returned rather than waiting for a
+        # connection to the host to be released. If timeout is set,
+        # socket.timeout is raised if no connection is released in time.
+        host = key[:2]
+        deadline = None if timeout is None else time.time() + timeout
+        with self._condition:
+            while True:
+                if self._closed:
+                    raise RuntimeError("Connection pool is closed")
+                self._evict_idle()
+                client = self._pop_healthy_idle(key)
+                if client is not None:
+                    self._statistics.hits += 1
+                    return client
+                elif self._has_capacity(host) or self._evict_idle_for_host(host):
+                    self._statistics.misses += 1
+                    self._connection_counts[host] += 1
+                    break
+                elif wait:
+                    self._wait(host, deadline)
+                else:
+                    return None
+
+        start = time.time()
+        client = None
+        try:
+            client = connect()
+            return client
+        finally:
+            with self._condition:
+                if client is None:
+                    self._remove_connection(host)
+                else:
+                    self._statistics.handshake_time += time.time() - start
+
+    def release(self, key, client):
+        with self._condition:
+            if self._closed or not _is_healthy(client):
+                self._discard(key[:2], client)
+            else:
+                self._idle[key].append((client, time.time()))
+            self._condition.notify_all()
+
+    def statistics(self):
+        with self._condition:
+            statistics = PoolStatistics()
+            statistics.__dict__.update(self._statistics.__dict__)
+            statistics.connections = sum(self._connection_counts.values())
+            statistics.idle_connections = sum(len(idle) for idle in self._idle.values())
+            return statistics
+
+    def close(self):
+        with self._condition:
+            self._closed = True
+            for key, idle in list(self._idle.items()):
+                for client, released in idle:
+                    self._discard(key[:2], client)
+            self._idle.clear()
+            self._condition.notify_all()
+
+    def _wait(self, host, deadline):
+        if deadline is None:
+            self._condition.wait()
+        else:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                raise socket.timeout(
+                    "Timed out waiting for a connection to {0}:{1} to be returned to the pool".format(*host)
+                )
+            self._condition.wait(remaining)
+
+    def _pop_healthy_idle(self, key):
+        idle = self._idle[key]
+        while idle:
+            client, released = idle.pop()
+            if _is_healthy(client):
+                return client
+            else:
+                self._statistics.unhealthy += 1
+                self._discard(key[:2], client)
+        return None
+
+    def _has_capacity(self, host):
+        return (
+            self._max_connections_per_host is None or
+            self._connection_counts[host] < self._max_connections_per_host
+        )
+
+    def _evict_idle(self):
+        now = time.time()
+        for key, idle in self._idle.items():
+            while idle and now - idle[0][1] > self._idle_timeout:
+                client, released = idle.pop(0)
+                self._statistics.evictions += 1
+                self._discard(key[:2], client)
+
+    def _evict_idle_for_host(self, host):
+        # Make room for a connection with different credentials to the
+        # same host by closing the least recently used idle connection
+        candidates = [
+            key
+            for key, idle in self._idle.items()
+            if key[:2] == host and idle
+        ]
+        if not candidates:
+            return False
+
+        key = min(candidates, key=lambda key: self._idle[key][0][1])
+        client, released = self._idle[key].pop(0)
+        self._statistics.evictions += 1
+        self._discard(host, client)
+        return True
+
+    def _discard(self, host, client):
+        client.close()
+        self._remove_connection(host)
+
+    def _remove_connection(self, host):
+        self._connection_counts[host] -= 1
+        self._condition.notify_all()
+
+
+class PoolStatistics(object):
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.unhealthy = 0
+        self.handshake_time = 0.0
+        self.connections = 0
+        self.idle_connections = 0
+
+
+def _is_healthy(client):
+    transport = client.get_transport()
+    return transport is not None and transport.is_active()
+
@@ -2,21 +2,34 @@ from __future__ import unicode_literals
 
 import sys
 
+from .capture import SpilledOutput, omitted, with_omitted_marker
 
-def result(return_code, allow_error, output, stderr_output):
-    result = ExecutionResult(return_code, output, stderr_output)
+
+def result(return_code, allow_error, output, stderr_output, timings=None):
+    result = ExecutionResult(return_code, output, stderr_output, timings)
     if return_code == 0 or allow_error:
         return result
     else:
         raise result.to_error()
         
 
+def batch_results(batch_results, allow_error):
+    if not allow_error:
+        for result in batch_results:
+            if result.return_code != 0:
+                raise result.to_error()
+    return batch_results
+
+
 class ExecutionResult(object):
-    def __init__(self, return_code, output, stderr_output):
+    def __init__(self, return_code, output, stderr_output, timings=None):
         self.return_code = return_code
         self.output = output
         self.stderr_output = stderr_output
-        
+        self.output_omitted = omitted(output)
+        self.stderr_output_omitted = omitted(stderr_output)
+        self.timings = timings
+
     def to_error(self):
         return RunProcessError(
             self.return_code,
@@ -33,10 +46,15 @@ class RunProcessError(RuntimeError):
         self.return_code = return_code
         self.output = output
         self.stderr_output = stderr_output
+        self.output_omitted = omitted(output)
+        self.stderr_output_omitted = omitted(stderr_output)
 
 
 def _render_output(output):
-    if isinstance(output, unicode):
+    output = with_omitted_marker(output)
+    if isinstance(output, SpilledOutput):
+        return " " + repr(output)
+    elif isinstance(output, unicode):
         return "\n" + output
     else:
         result =  repr(output)
@@ -2,27 +2,48 @@ from __future__ import unicode_literals
 from __future__ import absolute_import
 
 import subprocess
+import collections
 import os
 import os.path
 import shutil
 import contextlib
+import functools
 import uuid
 import socket
 import traceback
 import sys
 import io
+import errno
+import stat
+import posixpath
+import time
+import threading
+import tarfile
+import concurrent.futures
 
 import paramiko
 
 from .tempdir import create_temporary_dir
 from .files import FileOperations
 from . import results
-from .io import IoHandler, Channel
+from . import sync
+from . import stdin as stdin_sources
+from .io import IoHandler, Channel, DEFAULT_CHUNK_SIZE, LineBuffer
+from .timeouts import Deadline
+from .timings import Timings, report_timings
 from .errors import NoSuchCommandError, CommandInitializationError, CouldNotChangeDirectoryError
 
 
 _ONE_MINUTE = 60
 
+# The reasons servers give for refusing to open a channel because too many
+# channels are already open on the connection, such as when OpenSSH's
+# MaxSessions is reached
+_SESSION_LIMIT_CODES = set([
+    paramiko.common.OPEN_FAILED_ADMINISTRATIVELY_PROHIBITED,
+    paramiko.common.OPEN_FAILED_RESOURCE_SHORTAGE,
+])
+
 
 class ConnectionError(Exception):
     pass
@@ -46,6 +67,8 @@ class MissingHostKey(object):
 
 class MinimalShellType(object):
     supports_which = False
+    supports_store_pid = False
+    persistent = False
 
     def generate_run_command(self, command_args, store_pid,
             cwd=None, update_env={}, new_process_group=False):
@@ -71,9 +94,12 @@ class MinimalShellType(object):
 
 class ShShellType(object):
     supports_which = True
+    supports_store_pid = True
+    persistent = False
 
     def generate_run_command(self, command_args, store_pid,
-            cwd=None, update_env={}, new_process_group=False):
+            cwd=None, update_env={}, new_process_group=False,
+            command_path=None, print_command_path=False):
         commands = []
 
         if store_pid:
@@ -88,9 +114,15 @@ class ShShellType(object):
             for key, value in _iteritems(update_env)
         ]
         commands += update_env_commands
-        which_commands = " || ".join(self._generate_which_commands(command_args[0]))
-        which_commands = "{ { " + which_commands + "; } && echo 0; } || { echo $?; exit 1; }"
-        commands.append(which_commands)
+        if command_path is None:
+            # If print_command_path is set, the path is printed on the line
+            # before the return code
+            redirect = " 2>/dev/null" if print_command_path else " > /dev/null 2>&1"
+            which_commands = " || ".join(self._generate_which_commands(command_args[0]))
+            which_commands = "{ { " + which_commands + "; }" + redirect + " && echo 0; } || { echo $?; exit 1; }"
+            commands.append(which_commands)
+        else:
+            command_args = [command_path] + list(command_args[1:])
 
         command = " ".join(map(escape_sh, command_args))
         command = "exec {0}".format(command)
@@ -107,12 +139,101 @@ class ShShellType(object):
         )
 
     def _generate_which_command(self, which, command):
-        return which.format(escape_sh(command)) + " > /dev/null 2>&1"
+        return which.format(escape_sh(command))
+
+
+class PersistentShShellType(ShShellType):
+    # Commands are run by a long-lived sh process on a single channel,
+    # rather than opening a new channel for each command
+    persistent = True
 
 
 class ShellTypes(object):
     minimal = MinimalShellType()
     sh = ShShellType()
+    persistent_sh = PersistentShShellType()
+
+
+class PerformanceProfile(object):
+    """Settings for the SSH transport. Settings left as None use paramiko's
+    defaults.
+
+    ciphers, macs and kex are lists of algorithms in order of preference.
+    Algorithms that paramiko doesn't support are ignored, and the algorithms
+    that aren't listed are still used if the server supports none of the
+    listed algorithms.
+    """
+    def __init__(self,
+            compression=False,
+            ciphers=None,
+            macs=None,
+            kex=None,
+            window_size=None,
+            max_packet_size=None):
+        self.compression = compression
+        self.ciphers = ciphers
+        self.macs = macs
+        self.kex = kex
+        self.window_size = window_size
+        self.max_packet_size = max_packet_size
+
+    def _key(self):
+        return (
+            self.compression,
+            _tuple_or_none(self.ciphers),
+            _tuple_or_none(self.macs),
+            _tuple_or_none(self.kex),
+            self.window_size,
+            self.max_packet_size,
+        )
+
+    def _requires_transport_factory(self):
+        return any(value is not None for value in [
+            self.ciphers, self.macs, self.kex, self.window_size, self.max_packet_size
+        ])
+
+    def _create_transport(self, sock, **kwargs):
+        if self.window_size is not None:
+            kwargs["default_window_size"] = self.window_size
+        if self.max_packet_size is not None:
+            kwargs["default_max_packet_size"] = self.max_packet_size
+        transport = paramiko.Transport(sock, **kwargs)
+
+        security_options = transport.get_security_options()
+        # paramiko calls MACs digests
+        for name, option_name in [("ciphers", "ciphers"), ("macs", "digests"), ("kex", "kex")]:
+            preferred = getattr(self, name)
+            if preferred is not None:
+                supported = getattr(security_options, option_name)
+                setattr(security_options, option_name, tuple(
+                    [algorithm for algorithm in preferred if algorithm in supported] +
+                    [algorithm for algorithm in supported if algorithm not in preferred]
+                ))
+        return transport
+
+
+def _tuple_or_none(value):
+    return None if value is None else tuple(value)
+
+
+class PerformanceProfiles(object):
+    default = PerformanceProfile()
+    # For transferring large amounts of data over fast networks. AES-GCM
+    # doesn't need a separate MAC, and is usually the fastest cipher with
+    # hardware AES support. A larger window allows more data to be in flight
+    # on high latency networks.
+    bulk = PerformanceProfile(
+        ciphers=["aes128-gcm@openssh.com", "aes256-gcm@openssh.com", "aes128-ctr"],
+        macs=["hmac-sha2-256-etm@openssh.com", "hmac-sha2-256"],
+        window_size=16 * 1024 * 1024,
+        max_packet_size=64 * 1024,
+    )
+    # For slow networks, where compressing data takes less time than sending
+    # it uncompressed
+    slow_network = PerformanceProfile(
+        compression=True,
+        window_size=16 * 1024 * 1024,
+    )
 
 
 class SshShell(object):
@@ -127,7 +248,12 @@ class SshShell(object):
             shell_type=None,
             look_for_private_keys=True,
             load_system_host_keys=True,
-            sock=None):
+            sock=None,
+            connection_pool=None,
+            command_path_cache_ttl=None,
+            timings_hook=None,
+            max_connections=None,
+            performance_profile=None):
 
         if connect_timeout is None:
             connect_timeout = _ONE_MINUTE
@@ -138,17 +264,40 @@ class SshShell(object):
         if shell_type is None:
             shell_type = ShellTypes.sh
 
+        if max_connections is None or sock is not None:
+            max_connections = 1
+
+        if performance_profile is None:
+            performance_profile = PerformanceProfiles.default
+
         self._hostname = hostname
         self._port = port
         self._username = username
         self._password = password
         self._private_key_file = private_key_file
-        self._client = None
+        self._clients = []
+        # The number of open channels at which each connection refused to
+        # open another channel
+        self._channel_limits = {}
+        # The number of connections being made, which are made without
+        # holding the lock
+        self._connecting = 0
+        self._clients_condition = threading.Condition()
+        self._max_connections = max_connections
+        self._performance_profile = performance_profile
         self._connect_timeout = connect_timeout
         self._look_for_private_keys = look_for_private_keys
         self._load_system_host_keys = load_system_host_keys
         self._closed = False
         self._sock = sock
+        # Connections using a socket passed by the caller can't be shared
+        self._connection_pool = connection_pool if sock is None else None
+        self._sftp_sessions = _SftpSessions(self._open_sftp_client)
+        self._persistent_sessions = _PersistentSessions(self._open_persistent_session)
+        if command_path_cache_ttl is None:
+            self._command_paths = None
+        else:
+            self._command_paths = _CommandPathCache(command_path_cache_ttl)
 
         if missing_host_key is None:
             self._missing_host_key = MissingHostKey.raise_error
@@ -156,6 +305,7 @@ class SshShell(object):
             self._missing_host_key = missing_host_key
 
         self._shell_type = shell_type
+        self._timings_hook = timings_hook
 
     def __enter__(self):
         return self
@@ -165,33 +315,283 @@ class SshShell(object):
 
     def close(self):
         self._closed = True
-        if self._client is not None:
-            self._client.close()
+        self._sftp_sessions.close()
+        self._persistent_sessions.close()
+        with self._clients_condition:
+            clients = self._clients
+            self._clients = []
+        for client in clients:
+            self._release_client(client)
+
+    def _release_client(self, client):
+        self._channel_limits.pop(client, None)
+        if self._connection_pool is None:
+            client.close()
+        else:
+            self._connection_pool.release(self._pool_key(), client)
 
     def run(self, *args, **kwargs):
         return self.spawn(*args, **kwargs).wait_for_result()
 
+    def run_batch(self, commands, *args, **kwargs):
+        # All of the commands are run by a single sh process, so only one
+        # channel is opened. After each command, a line containing a unique
+        # marker and the return code is written to stdout, and a line
+        # containing the marker is written to stderr. If a command doesn't
+        # exist, the return code is replaced by a dash and no more commands
+        # are run.
+        if not commands:
+            return []
+
+        allow_error = kwargs.pop("allow_error", False)
+        encoding = kwargs.pop("encoding", None)
+        marker = "spur-batch-{0}".format(uuid.uuid4().hex)
+        generate_which_commands = getattr(
+            self._shell_type,
+            "_generate_which_commands",
+            ShellTypes.sh._generate_which_commands,
+        )
+        script = "\n".join(
+            "if {{ {0}; }} >/dev/null 2>&1; then {1} </dev/null; printf '\\n%s %s\\n' {2} \"$?\"; printf '\\n%s\\n' {2} >&2; "
+            "else printf '\\n%s -\\n' {2}; printf '\\n%s\\n' {2} >&2; exit; fi".format(
+                " || ".join(generate_which_commands(command[0])),
+                " ".join(map(escape_sh, command)),
+                marker,
+            )
+            for command in commands
+        )
+        batch_result = self.run(["sh", "-c", script], *args, allow_error=True, **kwargs)
+
+        outputs = _split_batch_output(batch_result.output, marker)
+        stderr_outputs = _split_batch_output(batch_result.stderr_output, marker)
+        for command, (output, return_code) in zip(commands, outputs):
+            if return_code == b"-":
+                raise NoSuchCommandError(command[0])
+        if len(outputs) != len(commands) or len(stderr_outputs) != len(commands):
+            # The shell running the batch was stopped before all of the
+            # commands had been run
+            raise batch_result.to_error()
+
+        return results.batch_results([
+            results.ExecutionResult(
+                int(return_code),
+                _decode(output, encoding),
+                _decode(stderr_output, encoding),
+            )
+            for (output, return_code), (stderr_output, _) in zip(outputs, stderr_outputs)
+        ], allow_error)
+
     def spawn(self, command, *args, **kwargs):
+        persistent = getattr(self._shell_type, "persistent", False)
+        return self._spawn(command, *args, persistent=persistent, **kwargs)
+
+    def _spawn_on_channel(self, command, *args, **kwargs):
+        # Used to run commands that are fed their stdin, which persistent
+        # sessions don't support, whatever the shell type
+        return self._spawn(command, *args, persistent=False, **kwargs)
+
+    def _spawn(self, command, *args, **kwargs):
+        persistent = kwargs.pop("persistent")
+        stdin = kwargs.pop("stdin", None)
         stdout = kwargs.pop("stdout", None)
         stderr = kwargs.pop("stderr", None)
         allow_error = kwargs.pop("allow_error", False)
+        encoding = kwargs.pop("encoding", None)
+        capture = kwargs.pop("capture", None)
+        timeout = kwargs.pop("timeout", None)
+        store_pid = kwargs.get("store_pid", False)
+        timings = Timings("spawn", command)
+        if timeout is not None and getattr(self._shell_type, "supports_store_pid", False):
+            # The process ID is needed to kill the process if it times out
+            kwargs["store_pid"] = True
+        if persistent:
+            if stdin is not None:
+                raise UnsupportedArgumentError("'stdin' is not supported when using a persistent session")
+            process = self._spawn_in_persistent_session(
+                command, *args,
+                allow_error=allow_error,
+                stdout=stdout,
+                stderr=stderr,
+                encoding=encoding,
+                capture=capture,
+                timings=timings,
+                **kwargs
+            )
+        else:
+            stdin_writer = None if stdin is None else stdin_sources.StdinWriter(stdin)
+            try:
+                channel, process_stdout, pid = self._exec_command(command, *args, timings=timings, **kwargs)
+            except:
+                if stdin_writer is not None:
+                    stdin_writer.close()
+                raise
+
+            process = SshProcess(
+                channel,
+                allow_error=allow_error,
+                process_stdout=process_stdout,
+                stdout=stdout,
+                stderr=stderr,
+                encoding=encoding,
+                capture=capture,
+                shell=self,
+                deadline=self._deadline(command, channel, pid, kwargs.get("new_process_group", False)),
+                timings=timings,
+                stdin_writer=stdin_writer,
+            )
+            process._pid = pid
+            if stdin_writer is not None:
+                stdin_writer.start(process)
+
+        process._deadline.start(timeout)
+        if store_pid:
+            process.pid = process._pid
+
+        return process
+
+    def _exec_command(self, command, *args, **kwargs):
         store_pid = kwargs.pop("store_pid", False)
         use_pty = kwargs.pop("use_pty", False)
-        encoding = kwargs.pop("encoding", None)
+        pty_size = kwargs.pop("pty_size", None)
+        timings = kwargs.pop("timings", None)
+        if timings is None:
+            timings = Timings("spawn", command)
         cwd = kwargs.get('cwd')
+        command_path_options = self._command_path_options(command, kwargs.get("update_env"))
+        kwargs.update(command_path_options)
         command_in_cwd = self._shell_type.generate_run_command(command, *args, store_pid=store_pid, **kwargs)
-        try:
-            channel = self._get_ssh_transport().open_session()
-        except EOFError as error:
-            raise self._connection_error(error)
+        channel = self._open_channel(lambda transport: transport.open_session(), timings)
+        timings.mark("channel_opened")
         if use_pty:
-            channel.get_pty()
+            if pty_size is None:
+                channel.get_pty()
+            else:
+                width, height = pty_size
+                channel.get_pty(width=width, height=height)
         channel.exec_command(command_in_cwd)
 
-        process_stdout = channel.makefile('rb')
+        process_stdout = _ChannelReader(channel.recv)
+        pid = self._read_initialization(process_stdout, command, store_pid, cwd, command_path_options)
+        timings.mark("initialized")
+        return channel, process_stdout, pid
+
+    def _spawn_in_persistent_session(self, command, *args, **kwargs):
+        allow_error = kwargs.pop("allow_error")
+        stdout = kwargs.pop("stdout")
+        stderr = kwargs.pop("stderr")
+        encoding = kwargs.pop("encoding")
+        capture = kwargs.pop("capture")
+        timings = kwargs.pop("timings")
+        store_pid = kwargs.pop("store_pid", False)
+        if kwargs.pop("use_pty", False) or kwargs.pop("pty_size", None) is not None:
+            raise UnsupportedArgumentError("'use_pty' is not supported when using a persistent session")
+        cwd = kwargs.get("cwd")
+        command_path_options = self._command_path_options(command, kwargs.get("update_env"))
+        kwargs.update(command_path_options)
+
+        # The command is run by its own sh process so that changes to the
+        # directory and environment don't affect later commands. Its stdout
+        # and stderr are each followed by a unique marker so that the end of
+        # the output can be found, with the return code on stdout.
+        marker = "spur-end-{0}".format(uuid.uuid4().hex)
+        command_in_cwd = self._shell_type.generate_run_command(command, *args, store_pid=store_pid, **kwargs)
+        script = "sh -c {0} </dev/null; printf '%s %s\\n' {1} \"$?\"; printf '%s\\n' {1} >&2\n".format(
+            escape_sh(command_in_cwd),
+            marker,
+        )
+
+        # Connect first so that the time taken to connect is recorded
+        self._get_ssh_transport(timings)
+        session = self._persistent_sessions.acquire()
+        timings.mark("channel_opened")
+        try:
+            session.channel.sendall(script.encode("utf8"))
+        except:
+            self._persistent_sessions.release(session)
+            raise
+
+        process = PersistentSshProcess(
+            session,
+            marker,
+            allow_error=allow_error,
+            stdout=stdout,
+            stderr=stderr,
+            encoding=encoding,
+            capture=capture,
+            shell=self,
+            timings=timings,
+        )
+        try:
+            pid = self._read_initialization(process._stdout, command, store_pid, cwd, command_path_options)
+        except (NoSuchCommandError, CouldNotChangeDirectoryError, CommandInitializationError):
+            process._discard_output()
+            raise
+        timings.mark("initialized")
+
+        process._start_io()
+        process._pid = pid
+        process._deadline = self._deadline(command, session.channel, pid, kwargs.get("new_process_group", False))
+        return process
 
+    def _deadline(self, command, channel, pid, new_process_group):
+        def kill():
+            if pid is not None:
+                # Kill the process in case closing the channel doesn't
+                targets = [str(pid)]
+                if new_process_group:
+                    targets.append("-{0}".format(pid))
+                try:
+                    self.run(["kill", "-KILL", "--"] + targets, allow_error=True)
+                except (OSError, EOFError, paramiko.SSHException, ConnectionError):
+                    pass
+            channel.close()
+
+        return Deadline(command, kill)
+
+    def _open_persistent_session(self):
+        try:
+            channel = self._open_channel(lambda transport: transport.open_session())
+        except paramiko.SSHException as error:
+            raise self._connection_error(error)
+        channel.exec_command("sh")
+        return _PersistentSession(channel)
+
+    def resolve_commands(self, commands):
+        # Look up every command using a single process. Commands that
+        # aren't found, or that are shell builtins, are mapped to None.
+        result = self.run(
+            ["sh", "-c", 'for command; do command -v "$command" 2>/dev/null || echo; done', "sh"] + list(commands),
+            encoding="utf8",
+        )
+        paths = {}
+        for command, line in zip(commands, result.output.split("\n")):
+            path = line if line.startswith("/") else None
+            paths[command] = path
+            if path is not None and self._command_paths is not None:
+                self._command_paths.set(command, path)
+        return paths
+
+    def _command_path_options(self, command, update_env):
+        if (
+            self._command_paths is None or
+            not self._shell_type.supports_which or
+            "/" in command[0] or
+            # Changing PATH may change the path the command resolves to
+            "PATH" in (update_env or {})
+        ):
+            return {}
+
+        command_path = self._command_paths.get(command[0])
+        if command_path is None:
+            return {"print_command_path": True}
+        else:
+            return {"command_path": command_path}
+
+    def _read_initialization(self, process_stdout, command, store_pid, cwd, command_path_options):
         if store_pid:
             pid = _read_int_initialization_line(process_stdout)
+        else:
+            pid = None
 
         if cwd is not None:
             cd_output = []
@@ -205,25 +605,19 @@ class SshShell(object):
                 else:
                     cd_output.append(line)
 
-        if self._shell_type.supports_which:
+        if command_path_options.get("print_command_path"):
+            which_return_code, command_path = _read_which_output(process_stdout)
+            if which_return_code == 0 and command_path.startswith(b"/"):
+                self._command_paths.set(command[0], command_path.decode("utf8"))
+        elif self._shell_type.supports_which and "command_path" not in command_path_options:
             which_return_code = _read_int_initialization_line(process_stdout)
+        else:
+            which_return_code = 0
 
-            if which_return_code != 0:
-                raise NoSuchCommandError(command[0])
-
-        process = SshProcess(
-            channel,
-            allow_error=allow_error,
-            process_stdout=process_stdout,
-            stdout=stdout,
-            stderr=stderr,
-            encoding=encoding,
-            shell=self,
-        )
-        if store_pid:
-            process.pid = pid
+        if which_return_code != 0:
+            raise NoSuchCommandError(command[0])
 
-        return process
+        return pid
 
     @contextlib.contextmanager
     def temporary_dir(self):
@@ -234,7 +628,18 @@ class SshShell(object):
         finally:
             self.run(["rm", "-rf", temp_dir])
 
-    def upload_dir(self, local_dir, remote_dir, ignore):
+    def upload_dir(self, local_dir, remote_dir, ignore, stream=False, compression="gzip"):
+        sync.find_compressor(compression)
+        timings = Timings("upload_dir", remote_dir)
+        self._get_ssh_transport(timings)
+        if stream:
+            paths = list(sync.walk(local_dir, ignore))
+            timings.bytes_sent = self._stream_paths(local_dir, paths, remote_dir, compression)
+        else:
+            timings.bytes_sent = self._upload_tarball(local_dir, remote_dir, ignore)
+        report_timings(timings, self._timings_hook)
+
+    def _upload_tarball(self, local_dir, remote_dir, ignore):
         with create_temporary_dir() as temp_dir:
             content_tarball_path = os.path.join(temp_dir, "content.tar.gz")
             content_path = os.path.join(temp_dir, "content")
@@ -243,7 +648,7 @@ class SshShell(object):
                 ["tar", "czf", content_tarball_path, "content"],
                 cwd=temp_dir
             )
-            with self._connect_sftp() as sftp:
+            with self._sftp_sessions.session() as sftp:
                 remote_tarball_path = "/tmp/{0}.tar.gz".format(uuid.uuid4())
                 sftp.put(content_tarball_path, remote_tarball_path)
                 self.run(["mkdir", "-p", remote_dir])
@@ -253,34 +658,277 @@ class SshShell(object):
                 ])
 
                 sftp.remove(remote_tarball_path)
+            return os.path.getsize(content_tarball_path)
+
+    def sync_dir(self, local_dir, remote_dir, ignore=None, checksum=False, delete=True, compression="gzip"):
+        # Check compression before anything is deleted
+        sync.find_compressor(compression)
+        source = sync.local_manifest(local_dir, ignore)
+        destination = sync.parse_find_manifest(self.run([
+            "sh", "-c", 'if [ -d "$1" ]; then find "$1" -mindepth 1 -printf "%y %s %T@ %P\\0"; fi',
+            "sh", remote_dir,
+        ]).output, ignore)
+        to_copy, to_delete, to_hash = sync.compare(source, destination, checksum=checksum, delete=delete)
+
+        if to_hash:
+            remote_hashes = self._remote_hashes(remote_dir, to_hash)
+            to_copy = sorted(to_copy + [
+                path
+                for path, remote_hash in zip(to_hash, remote_hashes)
+                if remote_hash != sync.hash_file(os.path.join(local_dir, path))
+            ])
+
+        if to_delete:
+            self._run_with_input(
+                ["sh", "-c", 'cd "$1" && xargs -0 rm -rf --', "sh", remote_dir],
+                _null_separated(to_delete),
+            )
+        if to_copy:
+            self._stream_paths(local_dir, to_copy, remote_dir, compression)
+
+        return sync.SyncResult(copied=to_copy, deleted=to_delete)
+
+    def _remote_hashes(self, remote_dir, paths):
+        # Hashes are printed in the same order as the paths are given.
+        # sha256sum prefixes the line with a backslash if the path is escaped.
+        result = self._run_with_input(
+            ["sh", "-c", 'cd "$1" && xargs -0 sha256sum --', "sh", remote_dir],
+            _null_separated(paths),
+        )
+        return [
+            line.lstrip(b"\\")[:64].decode("ascii")
+            for line in result.output.splitlines()
+        ]
+
+    def _run_with_input(self, command, data):
+        # Write stdin from another thread so that a full stdout can't stop
+        # the process from reading its stdin
+        process = self._spawn_on_channel(command)
+
+        def write_stdin():
+            writer = _ProcessStdinWriter(process)
+            writer.write(data)
+            writer.close()
+
+        writer_thread = threading.Thread(target=write_stdin)
+        writer_thread.daemon = True
+        writer_thread.start()
+        result = process.wait_for_result()
+        writer_thread.join()
+        return result
+
+    def _stream_paths(self, local_dir, paths, remote_dir, compression):
+        # The archive is written straight to the stdin of the remote tar
+        # process, so the remote end extracts files while later files are
+        # still being read and compressed
+        create_compressor, tar_option = sync.find_compressor(compression)
+        process = self._spawn_on_channel([
+            "sh", "-c", 'mkdir -p "$1" && exec tar -x {0} -f - -C "$1"'.format(tar_option),
+            "sh", remote_dir,
+        ])
+        try:
+            writer = _ProcessStdinWriter(process)
+            compressor = create_compressor(writer)
+            with tarfile.open(fileobj=compressor, mode="w|") as archive:
+                for path in paths:
+                    archive.add(os.path.join(local_dir, path), path, recursive=False)
+            compressor.close()
+            writer.close()
+        except:
+            process._channel.close()
+            raise
+        process.wait_for_result()
+        return writer.bytes_written
+
+    def upload_files(self, paths, concurrency=None, chunk_size=None, progress=None):
+        # Remember which directories exist so that they're only checked once
+        upload_file = functools.partial(_upload_file, set())
+        _transfer_files(self._sftp_sessions, upload_file, paths, concurrency, chunk_size, progress)
+
+    def download_files(self, paths, concurrency=None, chunk_size=None, progress=None):
+        _transfer_files(self._sftp_sessions, _download_file, paths, concurrency, chunk_size, progress)
 
     def open(self, name, mode="r"):
-        sftp = self._open_sftp_client()
-        sftp_file = SftpFile(sftp, sftp.open(name, mode), mode)
+        timings = Timings("open", name)
+        self._get_ssh_transport(timings)
+        sftp = self._sftp_sessions.acquire()
+        timings.mark("channel_opened")
+        try:
+            file = sftp.open(name, mode)
+        except:
+            self._sftp_sessions.release(sftp)
+            raise
+        sftp_file = SftpFile(file, mode, lambda: self._sftp_sessions.release(sftp))
 
         if "b" not in mode:
             sftp_file = io.TextIOWrapper(sftp_file)
 
+        report_timings(timings, self._timings_hook)
         return sftp_file
 
     @property
     def files(self):
-        return FileOperations(self)
+        return SftpFileOperations(self)
 
-    def _get_ssh_transport(self):
+    def _get_ssh_transport(self, timings=None):
         try:
-            return self._connect_ssh().get_transport()
+            return self._connect_ssh(timings).get_transport()
         except (socket.error, paramiko.SSHException, EOFError) as error:
             raise self._connection_error(error)
 
-    def _connect_ssh(self):
-        if self._client is None:
-            if self._closed:
-                raise RuntimeError("Shell is closed")
-            client = paramiko.SSHClient()
-            if self._load_system_host_keys:
-                client.load_system_host_keys()
-            client.set_missing_host_key_policy(self._missing_host_key)
+    def _connect_ssh(self, timings=None):
+        with self._clients_condition:
+            while True:
+                self._remove_inactive_clients()
+                if self._clients:
+                    return self._clients[0]
+                elif self._connecting == 0:
+                    self._connecting += 1
+                    break
+                else:
+                    self._clients_condition.wait()
+        return self._add_client(timings, fallback=None)
+
+    def _open_channel(self, open_channel, timings=None):
+        # Channels are opened on the connection with the fewest open
+        # channels. Until there are max_connections connections, a new
+        # connection is made rather than adding a channel to a busy one.
+        while True:
+            try:
+                client = self._choose_client(timings)
+                transport = client.get_transport()
+                return open_channel(transport)
+            except paramiko.ChannelException as error:
+                if error.code not in _SESSION_LIMIT_CODES:
+                    raise
+                with self._clients_condition:
+                    self._channel_limits[client] = _channel_count(transport)
+                    if not self._has_capacity():
+                        raise
+            except (socket.error, paramiko.SSHException, EOFError) as error:
+                raise self._connection_error(error)
+
+    def _choose_client(self, timings):
+        with self._clients_condition:
+            while True:
+                self._remove_inactive_clients()
+                available = [client for client in self._clients if not self._is_full(client)]
+                if available:
+                    client = _least_loaded(available)
+                    if _channel_load(client.get_transport()) == 0:
+                        return client
+                elif self._clients:
+                    # Every connection has refused to open a channel, but
+                    # channels may have been closed since
+                    client = _least_loaded(self._clients)
+                else:
+                    client = None
+                if len(self._clients) + self._connecting < self._max_connections:
+                    self._connecting += 1
+                    break
+                elif client is not None:
+                    return client
+                else:
+                    # The first connection is still being made
+                    self._clients_condition.wait()
+
+        return self._add_client(timings, fallback=client)
+
+    def _add_client(self, timings, fallback):
+        # Called once self._connecting has been incremented. If there's a
+        # fallback, it's used rather than waiting for the connection pool to
+        # have capacity, since connections leased by this shell are only
+        # returned to the pool when the shell is closed.
+        try:
+            client = self._acquire_client(timings, wait=fallback is None)
+        except:
+            with self._clients_condition:
+                self._connecting -= 1
+                self._clients_condition.notify_all()
+            raise
+
+        with self._clients_condition:
+            self._connecting -= 1
+            self._clients_condition.notify_all()
+            if client is None:
+                return fallback
+            elif not self._closed:
+                self._clients.append(client)
+                return client
+
+        self._release_client(client)
+        raise RuntimeError("Shell is closed")
+
+    def _has_capacity(self):
+        return (
+            len(self._clients) < self._max_connections or
+            any(not self._is_full(client) for client in self._clients)
+        )
+
+    def _is_full(self, client):
+        limit = self._channel_limits.get(client)
+        return limit is not None and _channel_count(client.get_transport()) >= limit
+
+    def _remove_inactive_clients(self):
+        # Reconnect if a connection has been lost since it was last used
+        for client in list(self._clients):
+            transport = client.get_transport()
+            if transport is None or not transport.is_active():
+                self._clients.remove(client)
+                self._release_client(client)
+
+    def _acquire_client(self, timings, wait=True):
+        if self._closed:
+            raise RuntimeError("Shell is closed")
+        create_client = lambda: self._create_client(timings)
+        if self._connection_pool is None:
+            return create_client()
+        else:
+            return self._connection_pool.acquire(
+                self._pool_key(),
+                create_client,
+                wait=wait,
+                timeout=self._connect_timeout,
+            )
+
+    def _pool_key(self):
+        # The pool expects the first two elements to identify the host. The
+        # remaining elements are every option used to connect and
+        # authenticate, so that a connection is only reused by shells that
+        # would have made the same connection.
+        return (
+            self._hostname,
+            self._port,
+            self._username,
+            self._password,
+            self._private_key_file,
+            self._look_for_private_keys,
+            self._load_system_host_keys,
+            self._missing_host_key,
+            self._connect_timeout,
+            self._performance_profile._key(),
+        )
+
+    def _create_client(self, timings=None):
+        client = paramiko.SSHClient()
+        if self._load_system_host_keys:
+            client.load_system_host_keys()
+        client.set_missing_host_key_policy(self._missing_host_key)
+        sock = self._sock
+        if sock is None:
+            # Open the socket ourselves so that the time taken to connect
+            # can be told apart from the time taken to authenticate
+            sock = socket.create_connection((self._hostname, self._port), timeout=self._connect_timeout)
+            # paramiko writes each SSH packet in full, so waiting to coalesce
+            # small writes only delays them. Without this, a request sent as
+            # more than one write waits for the server's delayed ACK.
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            if timings is not None:
+                timings.mark("connected")
+        connect_kwargs = {}
+        if self._performance_profile._requires_transport_factory():
+            connect_kwargs["transport_factory"] = self._performance_profile._create_transport
+        try:
             client.connect(
                 hostname=self._hostname,
                 port=self._port,
@@ -289,21 +937,21 @@ class SshShell(object):
                 key_filename=self._private_key_file,
                 look_for_keys=self._look_for_private_keys,
                 timeout=self._connect_timeout,
-                sock=self._sock
+                sock=sock,
+                compress=self._performance_profile.compression,
+                **connect_kwargs
             )
-            self._client = client
-        return self._client
-
-    @contextlib.contextmanager
-    def _connect_sftp(self):
-        sftp = self._open_sftp_client()
-        try:
-            yield sftp
-        finally:
-            sftp.close()
+        except:
+            client.close()
+            if sock is not self._sock:
+                sock.close()
+            raise
+        if timings is not None:
+            timings.mark("authenticated")
+        return client
 
     def _open_sftp_client(self):
-        return self._get_ssh_transport().open_sftp_client()
+        return self._open_channel(lambda transport: transport.open_sftp_client())
 
     def _connection_error(self, error):
         connection_error = ConnectionError(
@@ -315,6 +963,24 @@ class SshShell(object):
         return connection_error
 
 
+def _channel_count(transport):
+    # paramiko doesn't expose the number of open channels publicly
+    return len(transport._channels)
+
+
+def _least_loaded(clients):
+    return min(clients, key=lambda client: _channel_load(client.get_transport()))
+
+
+def _channel_load(transport):
+    # Channels for commands that have exited may not have been closed yet
+    return sum(
+        1
+        for channel in transport._channels.values()
+        if not channel.exit_status_ready()
+    )
+
+
 def _read_int_initialization_line(output_file):
     while True:
         line = output_file.readline().strip()
@@ -325,20 +991,511 @@ def _read_int_initialization_line(output_file):
                 raise CommandInitializationError(line)
 
 
+def _read_which_output(output_file):
+    # Returns the return code and the last line printed before it
+    command_path = b""
+    while True:
+        line = output_file.readline()
+        if not line:
+            raise CommandInitializationError(command_path)
+        line = line.strip()
+        if line:
+            try:
+                return int(line), command_path
+            except ValueError:
+                command_path = line
+
+
+class _CommandPathCache(object):
+    def __init__(self, ttl):
+        self._ttl = ttl
+        self._lock = threading.Lock()
+        self._paths = {}
+
+    def get(self, command):
+        with self._lock:
+            path, expires = self._paths.get(command, (None, None))
+            if path is not None and time.time() >= expires:
+                del self._paths[command]
+                return None
+            return path
+
+    def set(self, command, path):
+        with self._lock:
+            self._paths[command] = (path, time.time() + self._ttl)
+
+
+class _ChannelReader(object):
+    # paramiko's channel files block in read(size) until size bytes have
+    # arrived, so read directly from the channel instead, keeping any data
+    # left over from reading the initialization lines
+    def __init__(self, recv):
+        self._recv = recv
+        self._line_buffer = LineBuffer()
+        self._lines = collections.deque()
+        self._buffer = b""
+
+    def readline(self):
+        if self._buffer:
+            self._lines.extend(self._line_buffer.feed(self.read_buffered()))
+        while not self._lines:
+            data = self._recv(DEFAULT_CHUNK_SIZE)
+            if data:
+                self._lines.extend(self._line_buffer.feed(data))
+            else:
+                self._lines.extend(self._line_buffer.flush())
+                if not self._lines:
+                    return b""
+        return self._lines.popleft()
+
+    def read1(self, size):
+        if not self._buffer:
+            self._buffer = self.read_buffered()
+        if self._buffer:
+            data = self._buffer[:size]
+            self._buffer = self._buffer[size:]
+            return data
+        else:
+            return self._recv(size)
+
+    def read_buffered(self):
+        data = self._buffer + b"".join(self._lines) + b"".join(self._line_buffer.flush())
+        self._buffer = b""
+        self._lines.clear()
+        return data
+
+    def read(self):
+        chunks = []
+        while True:
+            chunk = self.read1(DEFAULT_CHUNK_SIZE)
+            if chunk:
+                chunks.append(chunk)
+            else:
+                return b"".join(chunks)
+
+
+class _PersistentSessions(object):
+    def __init__(self, open_session):
+        self._open_session = open_session
+        self._lock = threading.Lock()
+        self._idle = []
+        self._sessions = set()
+        self._closed = False
+
+    def acquire(self):
+        with self._lock:
+            while self._idle:
+                session = self._idle.pop()
+                if session.is_alive():
+                    return session
+                else:
+                    self._sessions.discard(session)
+                    session.close()
+
+        session = self._open_session()
+        with self._lock:
+            self._sessions.add(session)
+        return session
+
+    def release(self, session):
+        with self._lock:
+            if self._closed or not session.is_alive():
+                self._sessions.discard(session)
+                session.close()
+            else:
+                self._idle.append(session)
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+            sessions = list(self._sessions)
+            self._sessions.clear()
+            self._idle = []
+        for session in sessions:
+            session.close()
+
+
+class _PersistentSession(object):
+    def __init__(self, channel):
+        self.channel = channel
+
+    def is_alive(self):
+        return not (
+            self.channel.closed or
+            self.channel.eof_received or
+            self.channel.exit_status_ready()
+        )
+
+    def close(self):
+        self.channel.close()
+
+
+class _FramedReader(object):
+    # Reads output up to a marker, followed by the rest of the line the
+    # marker is on. Any data that might be the start of the marker is held
+    # back until enough data has been received to tell.
+    def __init__(self, recv, recv_ready, marker):
+        self._recv = recv
+        self._recv_ready = recv_ready
+        self._marker = marker.encode("ascii")
+        self._lock = threading.Lock()
+        self._buffer = b""
+        self._search_start = 0
+        self._eof = False
+        self.trailer = None
+
+    def read1(self, size):
+        with self._lock:
+            while True:
+                available = self._available()
+                if available:
+                    data = self._buffer[:min(size, available)]
+                    self._buffer = self._buffer[len(data):]
+                    self._search_start = max(0, self._search_start - len(data))
+                    return data
+                elif self.trailer is not None or self._eof:
+                    return b""
+                else:
+                    self._receive(self._recv(DEFAULT_CHUNK_SIZE))
+
+    def poll(self):
+        # Read any data that's already been received without blocking. If
+        # another thread is reading, then it will find the marker instead.
+        if self._lock.acquire(False):
+            try:
+                while self.trailer is None and not self._eof and self._recv_ready():
+                    self._receive(self._recv(DEFAULT_CHUNK_SIZE))
+            finally:
+                self._lock.release()
+        return self.at_end()
+
+    def at_end(self):
+        return self.trailer is not None or self._eof
+
+    def ended_before_marker(self):
+        return self._eof and self.trailer is None
+
+    def _receive(self, data):
+        if not data:
+            self._eof = True
+            return
+
+        self._buffer += data
+        index = self._buffer.find(self._marker, self._search_start)
+        if index == -1:
+            self._search_start = max(0, len(self._buffer) - len(self._marker))
+        else:
+            self._search_start = index
+            line_end = self._buffer.find(b"\n", index + len(self._marker))
+            if line_end != -1:
+                self.trailer = self._buffer[index + len(self._marker):line_end].strip()
+                self._buffer = self._buffer[:index]
+
+    def _available(self):
+        if self.trailer is not None or self._eof:
+            return len(self._buffer)
+        index = self._buffer.find(self._marker, self._search_start)
+        if index != -1:
+            return index
+        for length in range(min(len(self._marker) - 1, len(self._buffer)), 0, -1):
+            if self._buffer.endswith(self._marker[:length]):
+                return len(self._buffer) - length
+        return len(self._buffer)
+
+
+def _split_batch_output(output, marker):
+    marker = b"\n" + marker.encode("ascii")
+    frames = []
+    while True:
+        index = output.find(marker)
+        if index == -1:
+            return frames
+        frame_output = output[:index]
+        line_end = output.index(b"\n", index + len(marker))
+        frames.append((frame_output, output[index + len(marker):line_end].strip()))
+        output = output[line_end + 1:]
+
+
+def _decode(output, encoding):
+    if encoding is None:
+        return output
+    else:
+        return output.decode(encoding)
+
+
+def _null_separated(paths):
+    return b"".join(os.fsencode(path) + b"\0" for path in paths)
+
+
+class _ProcessStdinWriter(object):
+    def __init__(self, process):
+        self._process = process
+        self._buffer = []
+        self._buffer_length = 0
+        self.bytes_written = 0
+
+    def write(self, data):
+        self._buffer.append(bytes(data))
+        self._buffer_length += len(data)
+        self.bytes_written += len(data)
+        if self._buffer_length >= DEFAULT_CHUNK_SIZE:
+            self.flush()
+        return len(data)
+
+    def flush(self):
+        if self._buffer:
+            self._process.stdin_write(b"".join(self._buffer))
+            self._buffer = []
+            self._buffer_length = 0
+
+    def close(self):
+        self.flush()
+        self._process.stdin_close()
+
+
+class _SftpSessions(object):
+    # Opening an SFTP session requires a new channel and a round trip, so
+    # sessions are kept open and reused until the shell is closed. A
+    # session is only used by one caller at a time, since paramiko's
+    # SFTPClient can't wait for responses to requests from several threads.
+    def __init__(self, open_client):
+        self._open_client = open_client
+        self._lock = threading.Lock()
+        self._idle = []
+        self._closed = False
+
+    def acquire(self):
+        with self._lock:
+            while self._idle:
+                sftp = self._idle.pop()
+                if sftp.get_channel().closed:
+                    sftp.close()
+                else:
+                    return sftp
+        return self._open_client()
+
+    def release(self, sftp):
+        with self._lock:
+            if self._closed:
+                sftp.close()
+            else:
+                self._idle.append(sftp)
+
+    @contextlib.contextmanager
+    def session(self):
+        sftp = self.acquire()
+        try:
+            yield sftp
+        finally:
+            self.release(sftp)
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+            idle = self._idle
+            self._idle = []
+        for sftp in idle:
+            sftp.close()
+
+
+class SftpFileOperations(FileOperations):
+    def write_file(self, path, contents):
+        with self._sftp() as sftp:
+            _sftp_makedirs(sftp, os.path.dirname(path))
+            with sftp.open(path, "w") as file:
+                file.set_pipelined(True)
+                file.write(contents)
+
+    def exists(self, path):
+        with self._sftp() as sftp:
+            return _sftp_exists(sftp, path)
+
+    def stat(self, path):
+        with self._sftp() as sftp:
+            return sftp.stat(path)
+
+    def listdir(self, path):
+        with self._sftp() as sftp:
+            return sftp.listdir(path)
+
+    def walk(self, top):
+        dir_names = []
+        file_names = []
+        # Like os.walk, symlinks to directories are listed as directories,
+        # but aren't followed
+        symlinks = set()
+        with self._sftp() as sftp:
+            for entry in sftp.listdir_attr(top):
+                if stat.S_ISDIR(entry.st_mode):
+                    dir_names.append(entry.filename)
+                elif stat.S_ISLNK(entry.st_mode) and _sftp_is_dir(sftp, posixpath.join(top, entry.filename)):
+                    dir_names.append(entry.filename)
+                    symlinks.add(entry.filename)
+                else:
+                    file_names.append(entry.filename)
+
+        yield top, dir_names, file_names
+
+        for dir_name in dir_names:
+            if dir_name not in symlinks:
+                for result in self.walk(posixpath.join(top, dir_name)):
+                    yield result
+
+    def makedirs(self, path):
+        with self._sftp() as sftp:
+            _sftp_makedirs(sftp, path)
+
+    def remove(self, path):
+        with self._sftp() as sftp:
+            sftp.remove(path)
+
+    def rename(self, source, destination):
+        with self._sftp() as sftp:
+            # Unlike rename, posix_rename replaces any existing destination
+            sftp.posix_rename(source, destination)
+
+    def read_bytes(self, path):
+        with self._sftp() as sftp:
+            with sftp.open(path, "rb") as file:
+                file.prefetch()
+                return file.read()
+
+    def write_bytes(self, path, contents):
+        with self._sftp() as sftp:
+            with sftp.open(path, "wb") as file:
+                file.set_pipelined(True)
+                file.write(contents)
+
+    def _sftp(self):
+        return self._shell._sftp_sessions.session()
+
+
+_DEFAULT_TRANSFER_CONCURRENCY = 4
+# paramiko splits reads and writes into requests of at most 32 KiB
+_DEFAULT_TRANSFER_CHUNK_SIZE = 32 * 1024
+
+
+def _transfer_files(sftp_sessions, transfer_file, paths, concurrency, chunk_size, progress):
+    # Each thread uses its own SFTP session, so files are transferred over
+    # several channels on the same transport at once
+    if concurrency is None:
+        concurrency = _DEFAULT_TRANSFER_CONCURRENCY
+    if chunk_size is None:
+        chunk_size = _DEFAULT_TRANSFER_CHUNK_SIZE
+
+    def transfer(source, destination):
+        with sftp_sessions.session() as sftp:
+            transfer_file(sftp, source, destination, chunk_size, progress)
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=concurrency) as executor:
+        futures = [
+            executor.submit(transfer, source, destination)
+            for source, destination in paths
+        ]
+        try:
+            for future in concurrent.futures.as_completed(futures):
+                future.result()
+        except:
+            for future in futures:
+                future.cancel()
+            raise
+
+
+def _upload_file(existing_dirs, sftp, local_path, remote_path, chunk_size, progress):
+    remote_dir = posixpath.dirname(remote_path)
+    if remote_dir not in existing_dirs:
+        _sftp_makedirs(sftp, remote_dir)
+        existing_dirs.add(remote_dir)
+    total = os.path.getsize(local_path)
+    with open(local_path, "rb") as local_file:
+        with sftp.open(remote_path, "wb") as remote_file:
+            remote_file.set_pipelined(True)
+            _copy_chunks(local_file, remote_file, local_path, total, chunk_size, progress)
+
+
+def _download_file(sftp, remote_path, local_path, chunk_size, progress):
+    local_dir = os.path.dirname(local_path)
+    if local_dir and not os.path.isdir(local_dir):
+        try:
+            os.makedirs(local_dir)
+        except OSError:
+            # Another thread may have created the directory in the meantime
+            if not os.path.isdir(local_dir):
+                raise
+
+    with sftp.open(remote_path, "rb") as remote_file:
+        total = remote_file.stat().st_size
+        remote_file.prefetch(total)
+        with open(local_path, "wb") as local_file:
+            _copy_chunks(remote_file, local_file, remote_path, total, chunk_size, progress)
+
+
+def _copy_chunks(source, destination, path, total, chunk_size, progress):
+    transferred = 0
+    while True:
+        chunk = source.read(chunk_size)
+        if not chunk:
+            if transferred == 0 and progress is not None:
+                progress(path, 0, total)
+            return
+        destination.write(chunk)
+        transferred += len(chunk)
+        if progress is not None:
+            progress(path, transferred, total)
+
+
+def _sftp_makedirs(sftp, path):
+    if not path or _sftp_exists(sftp, path):
+        return
+
+    _sftp_makedirs(sftp, os.path.dirname(path.rstrip("/")))
+    try:
+        sftp.mkdir(path)
+    except IOError:
+        # Another process may have created the directory in the meantime
+        if not _sftp_exists(sftp, path):
+            raise
+
+
+def _sftp_exists(sftp, path):
+    try:
+        sftp.stat(path)
+        return True
+    except IOError as error:
+        if error.errno == errno.ENOENT:
+            return False
+        else:
+            raise
+
+
+def _sftp_is_dir(sftp, path):
+    # Follows symlinks. As with os.walk, a symlink that can't be followed
+    # is treated as a file.
+    try:
+        return stat.S_ISDIR(sftp.stat(path).st_mode)
+    except IOError:
+        return False
+
+
 class SftpFile(object):
-    def __init__(self, sftp, file, mode):
-        self._sftp = sftp
+    def __init__(self, file, mode, on_close):
         self._file = file
         self._mode = mode
+        self._on_close = on_close
 
     def __getattr__(self, key):
         return getattr(self._file, key)
 
     def close(self):
+        if self._on_close is None:
+            return
+
+        on_close = self._on_close
+        self._on_close = None
         try:
             self._file.close()
         finally:
-            self._sftp.close()
+            on_close()
 
     def readable(self):
         return "r" in self._mode or "+" in self._mode
@@ -362,19 +1519,22 @@ def escape_sh(value):
 
 
 class SshProcess(object):
-    def __init__(self, channel, allow_error, process_stdout, stdout, stderr, encoding, shell):
+    def __init__(self, channel, allow_error, process_stdout, stdout, stderr, encoding, capture, shell, deadline, timings, stdin_writer=None):
         self._channel = channel
         self._allow_error = allow_error
+        self._stdin_writer = stdin_writer
+        self._deadline = deadline
+        self._timings = timings
         self._stdin = channel.makefile('wb')
         self._stdout = process_stdout
-        self._stderr = channel.makefile_stderr('rb')
+        self._stderr = _ChannelReader(channel.recv_stderr)
         self._shell = shell
         self._result = None
 
         self._io = IoHandler([
-            Channel(self._stdout, stdout),
-            Channel(self._stderr, stderr),
-        ], encoding=encoding)
+            Channel(self._stdout, stdout, on_read=timings.counter("stdout_bytes")),
+            Channel(self._stderr, stderr, on_read=timings.counter("stderr_bytes")),
+        ], encoding=encoding, capture=capture)
 
     def is_running(self):
         return not self._channel.exit_status_ready()
@@ -382,27 +1542,139 @@ class SshProcess(object):
     def stdin_write(self, value):
         self._channel.sendall(value)
 
+    def stdin_close(self):
+        self._channel.shutdown_write()
+
+    def resize_pty(self, width, height):
+        self._channel.resize_pty(width=width, height=height)
+
     def send_signal(self, signal):
         self._shell.run(["kill", "-{0}".format(signal), str(self.pid)])
 
-    def wait_for_result(self):
+    def iter_chunks(self):
+        return self._io.iter_chunks()
+
+    def iter_lines(self):
+        return self._io.iter_lines()
+
+    def wait_for_result(self, timeout=None):
         if self._result is None:
-            self._result = self._generate_result()
+            self._result = self._generate_result(timeout)
 
         return self._result
 
-    def _generate_result(self):
-        output, stderr_output = self._io.wait()
+    def _generate_result(self, timeout):
+        self._deadline.set(timeout)
+        try:
+            output, stderr_output = self._deadline.wait_for_output(self._io)
+            if self._channel.status_event.wait(self._deadline.remaining()):
+                self._timings.mark("exited")
+            else:
+                self._deadline.expire()
+            if self._deadline.expired:
+                raise self._deadline.error(output, stderr_output)
+        finally:
+            self._deadline.finish()
+            report_timings(self._timings, self._shell._timings_hook)
         return_code = self._channel.recv_exit_status()
+        # The output has been read and the process has exited, so close the
+        # channel rather than leaving it to count towards the load on its
+        # connection
+        self._channel.close()
+        if self._stdin_writer is not None and self._stdin_writer.error is not None:
+            raise self._stdin_writer.error
 
         return results.result(
             return_code,
             self._allow_error,
             output,
-            stderr_output
+            stderr_output,
+            self._timings,
         )
 
 
+class PersistentSshProcess(object):
+    def __init__(self, session, marker, allow_error, stdout, stderr, encoding, capture, shell, timings):
+        channel = session.channel
+        self._session = session
+        self._allow_error = allow_error
+        self._timings = timings
+        self._stdout_frame = _FramedReader(channel.recv, channel.recv_ready, marker)
+        self._stderr_frame = _FramedReader(channel.recv_stderr, channel.recv_stderr_ready, marker)
+        self._stdout = _ChannelReader(self._stdout_frame.read1)
+        self._stderr = _ChannelReader(self._stderr_frame.read1)
+        self._shell = shell
+        self._result = None
+        self._io_args = ([
+            Channel(self._stdout, stdout, on_read=timings.counter("stdout_bytes")),
+            Channel(self._stderr, stderr, on_read=timings.counter("stderr_bytes")),
+        ], encoding, capture)
+        self._io = None
+
+    def is_running(self):
+        return not self._stdout_frame.poll()
+
+    def stdin_write(self, value):
+        raise UnsupportedArgumentError("stdin is not supported when using a persistent session")
+
+    def stdin_close(self):
+        raise UnsupportedArgumentError("stdin is not supported when using a persistent session")
+
+    def resize_pty(self, width, height):
+        raise UnsupportedArgumentError("'use_pty' is not supported when using a persistent session")
+
+    def send_signal(self, signal):
+        self._shell.run(["kill", "-{0}".format(signal), str(self.pid)])
+
+    def iter_chunks(self):
+        return self._io.iter_chunks()
+
+    def iter_lines(self):
+        return self._io.iter_lines()
+
+    def wait_for_result(self, timeout=None):
+        if self._result is None:
+            self._result = self._generate_result(timeout)
+
+        return self._result
+
+    def _start_io(self):
+        # Output is only handled once the initialization lines have been
+        # read, since writing output to stdout starts reading immediately
+        channels, encoding, capture = self._io_args
+        self._io = IoHandler(channels, encoding=encoding, capture=capture)
+
+    def _generate_result(self, timeout):
+        self._deadline.set(timeout)
+        try:
+            output, stderr_output = self._deadline.wait_for_output(self._io)
+            # The return code is printed after the command's output
+            self._timings.exited = self._timings.drained
+        finally:
+            self._deadline.finish()
+            # Sessions closed because the command timed out are discarded
+            self._shell._persistent_sessions.release(self._session)
+            report_timings(self._timings, self._shell._timings_hook)
+
+        if self._stdout_frame.ended_before_marker() or self._stderr_frame.ended_before_marker():
+            raise ConnectionError("Persistent session ended before command finished")
+
+        return results.result(
+            int(self._stdout_frame.trailer),
+            self._allow_error,
+            output,
+            stderr_output,
+            self._timings,
+        )
+
+    def _discard_output(self):
+        try:
+            self._stdout.read()
+            self._stderr.read()
+        finally:
+            self._shell._persistent_sessions.release(self._session)
+
+
 if sys.version_info[0] < 3:
     _iteritems = lambda d: d.iteritems()
 else:
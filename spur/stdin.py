@@ -0,0 +1,128 @@
+from __future__ import absolute_import
+
+import errno
+import io
+import os
+import threading
+
+
+# Larger than the chunk size used for reading output, since writing each
+# chunk to an SSH channel or pipe has a fixed overhead
+_CHUNK_SIZE = 1024 * 1024
+
+
+def is_path(source):
+    return isinstance(source, (str, os.PathLike))
+
+
+class StdinWriter(object):
+    """Write a source to the standard input of a process in a background
+    thread, and then close its standard input.
+
+    The source may be a path, a file object, bytes, or an iterable of bytes.
+    Paths are opened straight away, so that errors are raised before the
+    process is started.
+    """
+    def __init__(self, source):
+        if is_path(source):
+            self._file = open(source, "rb")
+            source = self._file
+        else:
+            self._file = None
+        self._source = source
+        self._process = None
+        self._pipe_fd = None
+        self.bytes_written = 0
+        self.error = None
+        self._thread = threading.Thread(target=self._write_all)
+        self._thread.daemon = True
+
+    def start(self, process, pipe_fd=None):
+        # If pipe_fd is the file descriptor of a pipe to the process, files
+        # are copied to it using sendfile when possible
+        self._process = process
+        self._pipe_fd = pipe_fd
+        self._thread.start()
+
+    def close(self):
+        # Only needed if the writer is never started
+        if self._file is not None:
+            self._file.close()
+
+    def _write_all(self):
+        try:
+            fileno = self._source_fileno()
+            if fileno is None or not self._send_file(fileno):
+                for chunk in self._chunks():
+                    self._write(chunk)
+        except _InputClosed:
+            return
+        except Exception as error:
+            # As when the process writing to a pipe fails, the process still
+            # sees the end of its input
+            self.error = error
+        finally:
+            if self._file is not None:
+                self._file.close()
+
+        try:
+            self._process.stdin_close()
+        except (EnvironmentError, EOFError):
+            pass
+
+    def _source_fileno(self):
+        if self._pipe_fd is None or not hasattr(os, "sendfile"):
+            return None
+        try:
+            if self._source.seekable():
+                return self._source.fileno()
+        except (AttributeError, io.UnsupportedOperation, EnvironmentError):
+            pass
+        return None
+
+    def _send_file(self, fileno):
+        # Returns False without writing anything if the source can't be
+        # copied using sendfile
+        start = offset = self._source.tell()
+        try:
+            while True:
+                try:
+                    sent = os.sendfile(self._pipe_fd, fileno, offset, _CHUNK_SIZE)
+                except OSError as error:
+                    if error.errno == errno.EPIPE:
+                        raise _InputClosed()
+                    elif error.errno in (errno.EINVAL, errno.ENOSYS) and offset == start:
+                        return False
+                    else:
+                        raise
+                if sent == 0:
+                    return True
+                offset += sent
+                self.bytes_written += sent
+        finally:
+            self._source.seek(offset)
+
+    def _chunks(self):
+        if isinstance(self._source, (bytes, bytearray)):
+            yield self._source
+        elif hasattr(self._source, "read"):
+            while True:
+                chunk = self._source.read(_CHUNK_SIZE)
+                if not chunk:
+                    return
+                yield chunk
+        else:
+            for chunk in self._source:
+                yield chunk
+
+    def _write(self, chunk):
+        try:
+            self._process.stdin_write(chunk)
+        except (EnvironmentError, EOFError):
+            raise _InputClosed()
+        self.bytes_written += len(chunk)
+
+
+class _InputClosed(Exception):
+    # The process has stopped reading its input, such as by exiting
+    pass
@@ -0,0 +1,181 @@
+from __future__ import absolute_import
+
+import collections
+import fnmatch
+import gzip
+import hashlib
+import os
+import shutil
+import stat
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+ManifestEntry = collections.namedtuple("ManifestEntry", ["type", "size", "mtime"])
+
+
+class SyncResult(object):
+    def __init__(self, copied, deleted):
+        self.copied = copied
+        self.deleted = deleted
+
+
+def walk(root, ignore):
+    """Yield the path, relative to root, of every file and directory under
+    root that isn't ignored. Directories are yielded before their contents.
+    """
+    ignore_patterns = shutil.ignore_patterns(*(ignore or []))
+    for dir_path, dir_names, file_names in os.walk(root):
+        ignored = ignore_patterns(dir_path, dir_names + file_names)
+        # Pruning dir_names in place stops os.walk descending into them
+        dir_names[:] = sorted(name for name in dir_names if name not in ignored)
+        for name in sorted(dir_names + file_names):
+            if name not in ignored:
+                yield os.path.relpath(os.path.join(dir_path, name), root)
+
+
+def local_manifest(root, ignore):
+    manifest = {}
+    for path in walk(root, ignore):
+        stat_result = os.lstat(os.path.join(root, path))
+        manifest[path] = ManifestEntry(
+            _file_type(stat_result.st_mode),
+            stat_result.st_size,
+            int(stat_result.st_mtime),
+        )
+    return manifest
+
+
+def parse_find_manifest(output, ignore):
+    # Parses the output of find -printf '%y %s %T@ %P\0'
+    manifest = {}
+    for record in output.split(b"\0"):
+        if record:
+            file_type, size, mtime, path = record.split(b" ", 3)
+            path = os.fsdecode(path)
+            if not is_ignored(path, ignore):
+                manifest[path] = ManifestEntry(
+                    file_type.decode("ascii"),
+                    int(size),
+                    int(float(mtime)),
+                )
+    return manifest
+
+
+def is_ignored(path, ignore):
+    return any(
+        fnmatch.fnmatch(name, pattern)
+        for name in path.split(os.sep)
+        for pattern in (ignore or [])
+    )
+
+
+def compare(source, destination, checksum, delete):
+    """Compare the manifests of the source and destination.
+
+    Returns the paths to copy, the paths to delete from the destination, and
+    the paths that have the same size and type in both, but which need their
+    content hashes comparing to decide whether they should be copied. The
+    last list is empty unless checksum is set, in which case modification
+    times are ignored. Unless delete is set, paths are only deleted from the
+    destination to replace them with a different type of file.
+    """
+    to_copy = []
+    to_hash = []
+    for path, entry in sorted(source.items()):
+        existing = destination.get(path)
+        if existing is None or existing.type != entry.type:
+            to_copy.append(path)
+        elif entry.type == "d":
+            pass
+        elif existing.size != entry.size:
+            to_copy.append(path)
+        elif checksum and entry.type == "f":
+            to_hash.append(path)
+        elif existing.mtime != entry.mtime:
+            to_copy.append(path)
+
+    to_delete = []
+    deleted = set()
+    for path, entry in sorted(destination.items()):
+        source_entry = source.get(path)
+        if source_entry is None and not delete:
+            continue
+        elif source_entry is None or source_entry.type != entry.type:
+            # Deleting a directory deletes its contents too
+            if not any(parent in deleted for parent in _parents(path)):
+                to_delete.append(path)
+                deleted.add(path)
+
+    return to_copy, to_delete, to_hash
+
+
+def hash_file(path):
+    sha256 = hashlib.sha256()
+    with open(path, "rb") as f:
+        while True:
+            chunk = f.read(64 * 1024)
+            if not chunk:
+                return sha256.hexdigest()
+            sha256.update(chunk)
+
+
+def _no_compression(fileobj):
+    return _Uncompressed(fileobj)
+
+
+def _gzip_compression(fileobj):
+    return gzip.GzipFile(fileobj=fileobj, mode="wb", compresslevel=6)
+
+
+def _zstd_compression(fileobj):
+    return zstandard.ZstdCompressor().stream_writer(fileobj, closefd=False)
+
+
+_compressors = {
+    None: (_no_compression, ""),
+    "none": (_no_compression, ""),
+    "gzip": (_gzip_compression, "-z"),
+    "zstd": (_zstd_compression, "--zstd"),
+}
+
+
+def find_compressor(compression):
+    """Return a function that wraps a file object so that anything written
+    to it is compressed, and the tar option that decompresses it.
+    """
+    if compression not in _compressors:
+        raise ValueError("Unsupported compression: {0!r}".format(compression))
+    if compression == "zstd" and zstandard is None:
+        raise ValueError("zstd compression requires the zstandard package")
+    return _compressors[compression]
+
+
+class _Uncompressed(object):
+    def __init__(self, fileobj):
+        self.write = fileobj.write
+
+    def close(self):
+        pass
+
+
+def _parents(path):
+    while True:
+        path = os.path.dirname(path)
+        if not path:
+            return
+        yield path
+
+
+def _file_type(mode):
+    if stat.S_ISDIR(mode):
+        return "d"
+    elif stat.S_ISLNK(mode):
+        return "l"
+    elif stat.S_ISREG(mode):
+        return "f"
+    else:
+        return "?"
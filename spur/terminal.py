@@ -0,0 +1,92 @@
+from __future__ import absolute_import
+
+import errno
+import os
+import struct
+import threading
+
+try:
+    import fcntl
+    import pty
+    import termios
+except ImportError:
+    pty = None
+
+
+_DEFAULT_EOF_CHARACTER = b"\x04"
+
+
+class Pty(object):
+    """The master end of a pseudo-terminal used as the stdin, stdout and
+    stderr of a local process.
+
+    The slave end is closed by close_slave() once the process has been
+    started, so that reading from the master reaches EOF when the process
+    and any processes it started have closed the terminal. The master is
+    closed once EOF has been read, or by close().
+    """
+    def __init__(self, size=None):
+        if pty is None:
+            raise ValueError("use_pty is not supported when the pty module cannot be imported")
+        self._master, self.slave = pty.openpty()
+        self._lock = threading.Lock()
+        self._closed = False
+        if size is not None:
+            self.set_window_size(*size)
+
+    def fileno(self):
+        return self._master
+
+    def read(self, size):
+        try:
+            return os.read(self._master, size)
+        except OSError as error:
+            # Reading from the master raises EIO once the slave end has
+            # been closed by every process
+            if error.errno == errno.EIO:
+                return b""
+            raise
+
+    def write(self, data):
+        data = memoryview(data)
+        with self._lock:
+            self._check_open()
+            while data:
+                written = os.write(self._master, data)
+                data = data[written:]
+
+    def send_eof(self):
+        # Closing the master would also close the output, so end the input
+        # in the same way as typing the EOF character at a terminal
+        with self._lock:
+            self._check_open()
+            try:
+                eof = termios.tcgetattr(self._master)[6][termios.VEOF]
+            except termios.error:
+                eof = _DEFAULT_EOF_CHARACTER
+            os.write(self._master, eof)
+
+    def set_window_size(self, width, height):
+        with self._lock:
+            self._check_open()
+            fcntl.ioctl(self._master, termios.TIOCSWINSZ, struct.pack("HHHH", height, width, 0, 0))
+
+    def on_read(self, chunk):
+        if not chunk:
+            self.close()
+
+    def close_slave(self):
+        if self.slave is not None:
+            os.close(self.slave)
+            self.slave = None
+
+    def close(self):
+        self.close_slave()
+        with self._lock:
+            if not self._closed:
+                self._closed = True
+                os.close(self._master)
+
+    def _check_open(self):
+        if self._closed:
+            raise IOError(errno.EIO, "Terminal is closed")
@@ -0,0 +1,77 @@
+from __future__ import absolute_import
+
+import threading
+import time
+
+from .errors import CommandTimeoutError
+
+
+# After a process has been killed, how long to wait for the rest of its
+# output. A process that has started processes of its own may not be the
+# only process with the other end of its output open.
+_KILL_GRACE_PERIOD = 1
+
+
+class Deadline(object):
+    """Kill a process that's still running when the deadline passes.
+
+    The deadline is set by passing a timeout to spawn, in which case the
+    process is killed even if its result is never waited for, or to
+    wait_for_result. The earliest deadline is used.
+    """
+    def __init__(self, command, kill):
+        self._command = command
+        self._kill = kill
+        self._lock = threading.Lock()
+        self._deadline = None
+        self._timeout = None
+        self._timer = None
+        self._finished = False
+        self.expired = False
+
+    def start(self, timeout):
+        if timeout is not None:
+            self.set(timeout)
+            self._timer = threading.Timer(timeout, self.expire)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def set(self, timeout):
+        if timeout is not None:
+            deadline = time.time() + timeout
+            if self._deadline is None or deadline < self._deadline:
+                self._deadline = deadline
+                self._timeout = timeout
+
+    def remaining(self):
+        if self._deadline is None:
+            return None
+        else:
+            return max(0, self._deadline - time.time())
+
+    def expire(self):
+        with self._lock:
+            if self._finished or self.expired:
+                return
+            self.expired = True
+        self._kill()
+
+    def finish(self):
+        with self._lock:
+            self._finished = True
+        if self._timer is not None:
+            self._timer.cancel()
+
+    def wait_for_output(self, io):
+        remaining = self.remaining()
+        if remaining is None:
+            return io.wait()
+        elif io.join(remaining) and not self.expired:
+            return io.wait()
+        else:
+            self.expire()
+            io.join(_KILL_GRACE_PERIOD)
+            raise self.error(*io.partial_output())
+
+    def error(self, output, stderr_output):
+        return CommandTimeoutError(self._command, self._timeout, output, stderr_output)
@@ -0,0 +1,78 @@
+from __future__ import absolute_import
+
+import threading
+import time
+
+
+_STAGES = [
+    "started",
+    "connected",
+    "authenticated",
+    "channel_opened",
+    "initialized",
+    "first_byte",
+    "exited",
+    "drained",
+    "finished",
+]
+
+
+class Timings(object):
+    """The times, as returned by time.time(), at which each stage of an
+    operation happened. Stages that didn't happen are None: for instance,
+    connected and authenticated are only set if a new SSH connection was
+    made for the operation.
+    """
+    def __init__(self, operation, target):
+        self.operation = operation
+        self.target = target
+        for stage in _STAGES:
+            setattr(self, stage, None)
+        self.stdout_bytes = 0
+        self.stderr_bytes = 0
+        self.bytes_sent = None
+        self._open_streams = 0
+        self._lock = threading.Lock()
+        self.mark("started")
+
+    def mark(self, stage):
+        setattr(self, stage, time.time())
+
+    def durations(self):
+        """Return a dict mapping each stage that happened to the number of
+        seconds between the start of the operation and that stage.
+        """
+        return dict(
+            (stage, getattr(self, stage) - self.started)
+            for stage in _STAGES[1:]
+            if getattr(self, stage) is not None
+        )
+
+    def counter(self, attribute):
+        # Returns a function that counts the bytes in each chunk read from a
+        # stream. Once every stream has reached EOF, the output is drained.
+        self._open_streams += 1
+
+        def on_read(chunk):
+            if chunk:
+                if self.first_byte is None:
+                    self.mark("first_byte")
+                setattr(self, attribute, getattr(self, attribute) + len(chunk))
+            else:
+                with self._lock:
+                    self._open_streams -= 1
+                    if self._open_streams == 0:
+                        self.mark("drained")
+
+        return on_read
+
+    def __repr__(self):
+        return "<Timings {0} {1!r}: {2}>".format(self.operation, self.target, self.durations())
+
+
+def report_timings(timings, hook):
+    # Waiting again for a process that timed out doesn't report it again
+    if timings.finished is None:
+        timings.mark("finished")
+        if hook is not None:
+            hook(timings)
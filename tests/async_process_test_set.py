@@ -0,0 +1,177 @@
+# coding=utf8
+
+import asyncio
+import io
+import functools
+import signal
+import time
+
+import spur
+from .assertions import assert_equal
+
+
+__all__ = ["AsyncProcessTestSet"]
+
+
+def with_async_shell(test_func):
+    @functools.wraps(test_func)
+    def run_test(self, *args, **kwargs):
+        async def run_with_shell():
+            async with self.create_async_shell() as shell:
+                await test_func(shell)
+
+        loop = asyncio.new_event_loop()
+        try:
+            loop.run_until_complete(run_with_shell())
+        finally:
+            loop.close()
+
+    return run_test
+
+
+class AsyncProcessTestSet(object):
+    @with_async_shell
+    async def test_output_of_run_is_stored(shell):
+        result = await shell.run(["echo", "hello"])
+        assert_equal(b"hello\n", result.output)
+
+    @with_async_shell
+    async def test_stderr_output_of_run_is_stored(shell):
+        result = await shell.run(["sh", "-c", "echo hello 1>&2"])
+        assert_equal(b"hello\n", result.stderr_output)
+
+    @with_async_shell
+    async def test_output_bytes_are_decoded_if_encoding_is_set(shell):
+        result = await shell.run(["bash", "-c", r'echo -e "☃"'], encoding="utf8")
+        assert_equal("☃\n", result.output)
+
+    @with_async_shell
+    async def test_cwd_of_run_can_be_set(shell):
+        result = await shell.run(["pwd"], cwd="/")
+        assert_equal(b"/\n", result.output)
+
+    @with_async_shell
+    async def test_environment_variables_can_be_added_for_run(shell):
+        result = await shell.run(["sh", "-c", "echo $NAME"], update_env={"NAME": "Bob"})
+        assert_equal(b"Bob\n", result.output)
+
+    @with_async_shell
+    async def test_exception_is_raised_if_return_code_is_not_zero(shell):
+        try:
+            await shell.run(["sh", "-c", "echo Hello world!; exit 3"])
+            assert False
+        except spur.RunProcessError as error:
+            assert_equal(3, error.return_code)
+            assert_equal(b"Hello world!\n", error.output)
+
+    @with_async_shell
+    async def test_return_code_stored_if_errors_allowed(shell):
+        result = await shell.run(["sh", "-c", "exit 14"], allow_error=True)
+        assert_equal(14, result.return_code)
+
+    @with_async_shell
+    async def test_can_write_to_stdin_of_spawned_processes(shell):
+        process = await shell.spawn(["sh", "-c", "read value; echo $value"])
+        await process.stdin_write(b"hello\n")
+        result = await process.wait_for_result()
+        assert_equal(b"hello\n", result.output)
+
+    @with_async_shell
+    async def test_closing_stdin_of_spawned_process_sends_eof(shell):
+        process = await shell.spawn(["cat"])
+        await process.stdin_write(b"hello\n")
+        await process.stdin_close()
+        result = await process.wait_for_result()
+        assert_equal(b"hello\n", result.output)
+
+    @with_async_shell
+    async def test_can_tell_if_spawned_process_is_running(shell):
+        process = await shell.spawn(["sh", "-c", "read dont_care"])
+        assert_equal(True, process.is_running())
+        await process.stdin_write(b"\n")
+        await process.wait_for_result()
+        assert_equal(False, process.is_running())
+
+    @with_async_shell
+    async def test_can_write_stdout_to_file_object_while_process_is_executing(shell):
+        output_file = io.BytesIO()
+        process = await shell.spawn(
+            ["sh", "-c", "echo hello; read dont_care;"],
+            stdout=output_file
+        )
+        await _wait_for_assertion(lambda: assert_equal(b"hello\n", output_file.getvalue()))
+        assert process.is_running()
+        await process.stdin_write(b"\n")
+        assert_equal(b"hello\n", (await process.wait_for_result()).output)
+
+    @with_async_shell
+    async def test_can_iterate_over_lines_of_output(shell):
+        process = await shell.spawn(["sh", "-c", "echo one; echo two 1>&2; printf 'three\\nfour'"])
+        lines = [line async for line in process.iter_lines()]
+        assert_equal([b"one\n", b"three\n", b"four"], lines)
+        assert_equal(b"two\n", (await process.wait_for_result()).stderr_output)
+
+    @with_async_shell
+    async def test_can_iterate_over_decoded_chunks_of_output(shell):
+        process = await shell.spawn(["echo", "hello"], encoding="ascii")
+        chunks = [chunk async for chunk in process.iter_chunks()]
+        assert_equal("hello\n", "".join(chunks))
+
+    @with_async_shell
+    async def test_reading_idle_stream_does_not_spin_while_other_stream_has_unread_output(shell):
+        process = await shell.spawn(["sh", "-c", "sleep 0.1; echo hello; sleep 1"], stderr=io.BytesIO())
+        await asyncio.sleep(0.2)
+        start = time.process_time()
+        await asyncio.sleep(0.5)
+        cpu_time = time.process_time() - start
+        assert cpu_time < 0.1, cpu_time
+        assert_equal(b"hello\n", (await process.wait_for_result()).output)
+
+    @with_async_shell
+    async def test_can_send_signal_to_process_if_store_pid_is_set(shell):
+        process = await shell.spawn(["cat"], store_pid=True)
+        assert process.is_running()
+        await process.send_signal(signal.SIGTERM)
+        await _wait_for_assertion(lambda: assert_equal(False, process.is_running()))
+
+    @with_async_shell
+    async def test_spawning_non_existent_command_raises_specific_no_such_command_exception(shell):
+        try:
+            await shell.spawn(["bin/i-am-not-a-command"])
+            assert False
+        except spur.NoSuchCommandError as error:
+            assert_equal("bin/i-am-not-a-command", error.command)
+
+    @with_async_shell
+    async def test_using_non_existent_cwd_raises_could_not_change_directory_error(shell):
+        try:
+            await shell.spawn(["echo", "1"], cwd="/some/silly/path")
+            assert False
+        except spur.CouldNotChangeDirectoryError as error:
+            assert_equal("/some/silly/path", error.directory)
+
+    @with_async_shell
+    async def test_many_commands_can_run_concurrently(shell):
+        results = await asyncio.gather(*[
+            shell.run(["sh", "-c", "sleep 0.2; echo {0}".format(index)])
+            for index in range(20)
+        ])
+        assert_equal(
+            ["{0}\n".format(index).encode("ascii") for index in range(20)],
+            [result.output for result in results],
+        )
+
+
+async def _wait_for_assertion(assertion):
+    timeout = 1
+    period = 0.01
+    loop = asyncio.get_event_loop()
+    start = loop.time()
+    while True:
+        try:
+            assertion()
+            return
+        except AssertionError:
+            if loop.time() - start > timeout:
+                raise
+            await asyncio.sleep(period)
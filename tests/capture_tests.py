@@ -0,0 +1,72 @@
+from __future__ import unicode_literals
+
+from spur import capture
+from .assertions import assert_equal
+
+
+def test_everything_keeps_all_output():
+    assert_equal(b"onetwo", _capture(capture.everything(), [b"one", b"two"]))
+
+
+def test_discard_keeps_no_output():
+    assert_equal(b"", _capture(capture.discard(), [b"one", b"two"]))
+
+
+def test_tail_keeps_output_unchanged_if_under_size():
+    assert_equal(b"onetwo", _capture(capture.tail(6), [b"one", b"two"]))
+
+
+def test_tail_keeps_end_of_output():
+    output = _capture(capture.tail(7), [b"one", b"two", b"three"])
+    assert_equal(b"wothree", output)
+    assert_equal(4, capture.omitted(output))
+    assert_equal(b"[... 4 bytes omitted ...]wothree", capture.with_omitted_marker(output))
+
+
+def test_tail_counts_characters_when_output_is_decoded():
+    output = _capture(capture.tail(1), ["one"], encoding="utf8")
+    assert_equal("e", output)
+    assert_equal(2, capture.omitted(output))
+    assert_equal("[... 2 characters omitted ...]e", capture.with_omitted_marker(output))
+
+
+def test_head_and_tail_keeps_start_and_end_of_output():
+    output = _capture(capture.head_and_tail(2, 2), [b"one", b"two", b"three"])
+    assert_equal(b"onee", output)
+    assert_equal(7, capture.omitted(output))
+    assert_equal(b"on[... 7 bytes omitted ...]ee", capture.with_omitted_marker(output))
+
+
+def test_nothing_is_omitted_if_output_is_under_size():
+    output = _capture(capture.head_and_tail(2, 2), [b"one"])
+    assert_equal(0, capture.omitted(output))
+    assert_equal(b"one", capture.with_omitted_marker(output))
+
+
+def test_spill_to_file_keeps_output_in_memory_if_under_size():
+    assert_equal(b"onetwo", _capture(capture.spill_to_file(6), [b"one", b"two"]))
+
+
+def test_spill_to_file_writes_output_to_file_if_over_size():
+    output = _capture(capture.spill_to_file(4), [b"one", b"two", b"three"])
+    try:
+        assert_equal(11, output.size)
+        assert_equal(b"onetwothree", output.read())
+        assert_equal("<spilled output: 11 bytes>", repr(output))
+    finally:
+        output.close()
+
+
+def test_spill_to_file_supports_decoded_output():
+    output = _capture(capture.spill_to_file(1), ["☃\r\n"], encoding="utf8")
+    try:
+        assert_equal("☃\r\n", output.read())
+    finally:
+        output.close()
+
+
+def _capture(policy, chunks, encoding=None):
+    output_buffer = policy.create_buffer(encoding)
+    for chunk in chunks:
+        output_buffer.append(chunk)
+    return output_buffer.value()
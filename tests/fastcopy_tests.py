@@ -0,0 +1,67 @@
+import os
+import shutil
+
+from spur import fastcopy
+from spur.tempdir import create_temporary_dir
+from .assertions import assert_equal, assert_raises
+
+
+def test_contents_of_file_are_copied():
+    contents = os.urandom(3 * 1024 * 1024 + 7)
+    with create_temporary_dir() as temp_dir:
+        source = _write_file(temp_dir, "source", contents)
+        destination = os.path.join(temp_dir, "destination")
+        fastcopy.copyfile(source, destination)
+        assert_equal(contents, _read_file(destination))
+
+
+def test_empty_file_is_copied():
+    with create_temporary_dir() as temp_dir:
+        source = _write_file(temp_dir, "source", b"")
+        destination = os.path.join(temp_dir, "destination")
+        fastcopy.copyfile(source, destination)
+        assert_equal(b"", _read_file(destination))
+
+
+def test_copying_file_to_itself_raises_error_without_changing_file():
+    with create_temporary_dir() as temp_dir:
+        path = _write_file(temp_dir, "source", b"hello")
+        assert_raises(shutil.SameFileError, lambda: fastcopy.copyfile(path, path))
+        assert_raises(shutil.SameFileError, lambda: fastcopy.copy2(path, temp_dir))
+        assert_equal(b"hello", _read_file(path))
+
+
+def test_files_reporting_a_size_of_zero_are_copied_by_reading():
+    with create_temporary_dir() as temp_dir:
+        destination = os.path.join(temp_dir, "destination")
+        fastcopy.copyfile("/proc/self/status", destination)
+        assert b"Name:" in _read_file(destination)
+
+
+def test_contents_are_copied_by_reading_if_no_other_method_is_supported():
+    original_copy_methods = fastcopy._copy_methods
+    fastcopy._copy_methods = [lambda source_fd, destination_fd: False]
+    try:
+        test_contents_of_file_are_copied()
+    finally:
+        fastcopy._copy_methods = original_copy_methods
+
+
+def test_copy2_copies_modification_time():
+    with create_temporary_dir() as temp_dir:
+        source = _write_file(temp_dir, "source", b"hello")
+        os.utime(source, (1000000000, 1000000000))
+        destination = fastcopy.copy2(source, os.path.join(temp_dir, "destination"))
+        assert_equal(1000000000, int(os.path.getmtime(destination)))
+
+
+def _write_file(dir_path, name, contents):
+    path = os.path.join(dir_path, name)
+    with open(path, "wb") as f:
+        f.write(contents)
+    return path
+
+
+def _read_file(path):
+    with open(path, "rb") as f:
+        return f.read()
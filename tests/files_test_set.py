@@ -0,0 +1,121 @@
+from __future__ import unicode_literals
+
+import contextlib
+import errno
+import stat
+import uuid
+
+from .assertions import assert_equal
+
+
+__all__ = ["FilesTestSet"]
+
+
+class FilesTestSet(object):
+    def test_write_bytes_and_read_bytes(self):
+        with self._create_dir() as (shell, root):
+            shell.files.write_bytes(root + "/file", b"hello\0")
+            assert_equal(b"hello\0", shell.files.read_bytes(root + "/file"))
+
+    def test_exists_is_true_for_files_and_directories_and_false_otherwise(self):
+        with self._create_dir() as (shell, root):
+            shell.files.write_bytes(root + "/file", b"")
+            assert_equal(True, shell.files.exists(root + "/file"))
+            assert_equal(True, shell.files.exists(root))
+            assert_equal(False, shell.files.exists(root + "/missing"))
+
+    def test_stat_returns_size_and_mode(self):
+        with self._create_dir() as (shell, root):
+            shell.files.write_bytes(root + "/file", b"hello")
+            result = shell.files.stat(root + "/file")
+            assert_equal(5, result.st_size)
+            assert stat.S_ISREG(result.st_mode)
+            assert stat.S_ISDIR(shell.files.stat(root).st_mode)
+
+    def test_stat_of_missing_file_raises_error_with_errno(self):
+        with self._create_dir() as (shell, root):
+            try:
+                shell.files.stat(root + "/missing")
+                assert False, "Expected error"
+            except (IOError, OSError) as error:
+                assert_equal(errno.ENOENT, error.errno)
+
+    def test_makedirs_creates_missing_parents_and_ignores_existing_directories(self):
+        with self._create_dir() as (shell, root):
+            shell.files.makedirs(root + "/one/two")
+            shell.files.makedirs(root + "/one/two")
+            assert_equal(["two"], shell.files.listdir(root + "/one"))
+
+    def test_walk_yields_each_directory_with_its_subdirectories_and_files(self):
+        with self._create_dir() as (shell, root):
+            shell.files.makedirs(root + "/one/two")
+            shell.files.write_bytes(root + "/a", b"")
+            shell.files.write_bytes(root + "/one/b", b"")
+
+            walked = sorted(
+                (dir_path, sorted(dir_names), sorted(file_names))
+                for dir_path, dir_names, file_names in shell.files.walk(root)
+            )
+            assert_equal([
+                (root, ["one"], ["a"]),
+                (root + "/one", ["two"], ["b"]),
+                (root + "/one/two", [], []),
+            ], walked)
+
+    def test_walk_lists_symlinks_to_directories_as_directories_without_following_them(self):
+        with self._create_dir() as (shell, root):
+            shell.files.makedirs(root + "/one")
+            shell.files.write_bytes(root + "/one/a", b"")
+            shell.run(["ln", "-s", root + "/one", root + "/link"])
+            shell.run(["ln", "-s", root + "/missing", root + "/broken"])
+
+            walked = sorted(
+                (dir_path, sorted(dir_names), sorted(file_names))
+                for dir_path, dir_names, file_names in shell.files.walk(root)
+            )
+            assert_equal([
+                (root, ["link", "one"], ["broken"]),
+                (root + "/one", [], ["a"]),
+            ], walked)
+
+    def test_write_file_creates_missing_parent_directories(self):
+        with self._create_dir() as (shell, root):
+            shell.files.write_file(root + "/one/two/file", "hello")
+            assert_equal(b"hello", shell.files.read_bytes(root + "/one/two/file"))
+
+    def test_rename_replaces_destination(self):
+        with self._create_dir() as (shell, root):
+            shell.files.write_bytes(root + "/a", b"a")
+            shell.files.write_bytes(root + "/b", b"b")
+            shell.files.rename(root + "/a", root + "/b")
+            assert_equal(["b"], shell.files.listdir(root))
+            assert_equal(b"a", shell.files.read_bytes(root + "/b"))
+
+    def test_remove_deletes_file(self):
+        with self._create_dir() as (shell, root):
+            shell.files.write_bytes(root + "/a", b"a")
+            shell.files.remove(root + "/a")
+            assert_equal([], shell.files.listdir(root))
+
+    def test_copy_file_copies_to_destination(self):
+        with self._create_dir() as (shell, root):
+            shell.files.write_bytes(root + "/a", b"hello")
+            shell.files.copy_file(root + "/a", root + "/b")
+            assert_equal(b"hello", shell.files.read_bytes(root + "/b"))
+
+    def test_copy_file_copies_into_dir(self):
+        with self._create_dir() as (shell, root):
+            shell.files.write_bytes(root + "/a", b"hello")
+            shell.files.makedirs(root + "/dir")
+            shell.files.copy_file(root + "/a", dir=root + "/dir")
+            assert_equal(b"hello", shell.files.read_bytes(root + "/dir/a"))
+
+    @contextlib.contextmanager
+    def _create_dir(self):
+        with self.create_shell() as shell:
+            root = "/tmp/{0}".format(uuid.uuid4())
+            shell.files.makedirs(root)
+            try:
+                yield shell, root
+            finally:
+                shell.run(["rm", "-rf", root])
@@ -0,0 +1,84 @@
+import threading
+import time
+
+import spur
+from .assertions import assert_equal
+
+
+def test_command_is_run_on_every_shell():
+    group = spur.ShellGroup([spur.LocalShell(), spur.LocalShell()])
+    results = list(group.run(["echo", "hello"]))
+    assert_equal([b"hello\n", b"hello\n"], [result.result.output for result in results])
+    assert_equal([None, None], [result.error for result in results])
+
+
+def test_results_are_returned_in_order_of_completion():
+    slow_shell = _DelayedShell(spur.LocalShell(), 0.3)
+    fast_shell = spur.LocalShell()
+    results = list(spur.run_many([slow_shell, fast_shell], ["true"]))
+    assert_equal([fast_shell, slow_shell], [result.shell for result in results])
+
+
+def test_errors_are_collected_by_default():
+    results = list(spur.run_many([spur.LocalShell()], ["false"]))
+    assert_equal(None, results[0].result)
+    assert isinstance(results[0].error, spur.RunProcessError)
+
+
+def test_first_error_is_raised_if_fail_fast_is_true():
+    results = spur.run_many([spur.LocalShell()], ["false"], fail_fast=True)
+    try:
+        list(results)
+        assert False, "Expected error"
+    except spur.RunProcessError as error:
+        assert_equal(1, error.return_code)
+
+
+def test_arguments_are_passed_to_run():
+    results = list(spur.run_many([spur.LocalShell()], ["pwd"], cwd="/"))
+    assert_equal(b"/\n", results[0].result.output)
+
+
+def test_commands_that_exceed_timeout_are_killed():
+    shell = spur.LocalShell()
+    start = time.time()
+    result, = spur.run_many([shell], ["sleep", "10"], timeout=0.2)
+    assert time.time() - start < 5
+    assert isinstance(result.error, spur.CommandTimeoutError)
+    assert_equal(0.2, result.error.timeout)
+
+
+def test_number_of_concurrent_commands_is_limited_by_max_concurrency():
+    counter = _ConcurrencyCounter()
+    shells = [_DelayedShell(spur.LocalShell(), 0.05, counter) for i in range(6)]
+    results = list(spur.run_many(shells, ["true"], max_concurrency=2))
+    assert_equal(6, len(results))
+    assert_equal(2, counter.max_concurrent)
+
+
+class _ConcurrencyCounter(object):
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._concurrent = 0
+        self.max_concurrent = 0
+
+    def __enter__(self):
+        with self._lock:
+            self._concurrent += 1
+            self.max_concurrent = max(self.max_concurrent, self._concurrent)
+
+    def __exit__(self, *args):
+        with self._lock:
+            self._concurrent -= 1
+
+
+class _DelayedShell(object):
+    def __init__(self, shell, delay, counter=None):
+        self._shell = shell
+        self._delay = delay
+        self._counter = counter or _ConcurrencyCounter()
+
+    def run(self, *args, **kwargs):
+        with self._counter:
+            time.sleep(self._delay)
+            return self._shell.run(*args, **kwargs)
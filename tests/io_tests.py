@@ -0,0 +1,67 @@
+# coding=utf8
+
+from __future__ import unicode_literals
+
+import io
+import os
+
+from spur.io import IoHandler, Channel, SelectorIoHub
+from .assertions import assert_equal, assert_raises
+
+
+def test_output_is_read_in_chunks_of_at_most_chunk_size():
+    reads = []
+    file_in = _RecordingFile(io.BytesIO(b"abcdefg"), reads)
+    file_out = io.BytesIO()
+
+    output, = IoHandler([Channel(file_in, file_out)], encoding=None, chunk_size=3).wait()
+
+    assert_equal(b"abcdefg", output)
+    assert_equal(b"abcdefg", file_out.getvalue())
+    assert_equal([3, 3, 3, 3], reads)
+
+
+def test_multi_byte_characters_split_across_chunks_are_decoded():
+    file_in = io.BytesIO("☃☃".encode("utf8"))
+    file_out = io.StringIO()
+
+    output, = IoHandler([Channel(file_in, file_out)], encoding="utf8", chunk_size=1).wait()
+
+    assert_equal("☃☃", output)
+    assert_equal("☃☃", file_out.getvalue())
+
+
+class _RecordingFile(object):
+    def __init__(self, file, reads):
+        self._file = file
+        self._reads = reads
+
+    def read1(self, size):
+        self._reads.append(size)
+        return self._file.read1(size)
+
+
+def test_selector_io_hub_reads_output_of_many_files():
+    with SelectorIoHub(chunk_size=2) as hub:
+        pipes = [os.pipe() for i in range(3)]
+        handlers = [
+            IoHandler([Channel(os.fdopen(read_fd, "rb", 0), None)], encoding=None, hub=hub)
+            for read_fd, write_fd in pipes
+        ]
+        for index, (read_fd, write_fd) in enumerate(pipes):
+            os.write(write_fd, "hello {0}".format(index).encode("ascii"))
+            os.close(write_fd)
+
+        assert_equal(
+            [[b"hello 0"], [b"hello 1"], [b"hello 2"]],
+            [handler.wait() for handler in handlers],
+        )
+
+
+def test_selector_io_hub_cannot_be_used_after_closing():
+    hub = SelectorIoHub()
+    hub.close()
+    read_fd, write_fd = os.pipe()
+    with os.fdopen(read_fd, "rb", 0) as file_in:
+        assert_raises(RuntimeError, lambda: hub.register(file_in, None))
+    os.close(write_fd)
@@ -1,7 +1,20 @@
+import io
+import os
+import time
+import shutil
+
 import spur
+import spur.io
+from spur.tempdir import create_temporary_dir
+from .assertions import assert_equal, assert_raises
 
 from .process_test_set import ProcessTestSet
 from .open_test_set import OpenTestSet
+from .async_process_test_set import AsyncProcessTestSet
+from .sync_dir_test_set import SyncDirTestSet
+from .files_test_set import FilesTestSet
+from .transfer_test_set import TransferTestSet
+from .pipeline_test_set import PipelineTestSet
 
 
 class LocalTestMixin(object):
@@ -15,3 +28,198 @@ class LocalOpenTests(OpenTestSet, LocalTestMixin):
 
 class LocalProcessTests(ProcessTestSet, LocalTestMixin):
     pass
+
+
+class LocalSyncDirTests(SyncDirTestSet, LocalTestMixin):
+    pass
+
+
+class LocalFilesTests(FilesTestSet, LocalTestMixin):
+    pass
+
+
+class LocalTransferTests(TransferTestSet, LocalTestMixin):
+    pass
+
+
+class LocalPipelineTests(PipelineTestSet, LocalTestMixin):
+    pass
+
+
+class AsyncLocalProcessTests(AsyncProcessTestSet):
+    def create_async_shell(self):
+        return spur.AsyncLocalShell()
+
+
+_io_hub = spur.io.SelectorIoHub()
+
+
+def teardown_module():
+    _io_hub.close()
+
+
+class LocalSelectorIoHubTestMixin(object):
+    def create_shell(self):
+        return spur.LocalShell(io_hub=_io_hub)
+
+
+class LocalSelectorIoHubProcessTests(ProcessTestSet, LocalSelectorIoHubTestMixin):
+    pass
+
+
+def test_timings_hook_is_called_with_timings_of_each_command():
+    recorded = []
+    shell = spur.LocalShell(timings_hook=recorded.append)
+    result = shell.run(["echo", "hello"])
+    assert_equal([result.timings], recorded)
+    assert_equal(["echo", "hello"], recorded[0].target)
+    assert_equal(None, recorded[0].connected)
+
+
+def test_timings_hook_is_called_when_command_fails():
+    recorded = []
+    shell = spur.LocalShell(timings_hook=recorded.append)
+    assert_raises(spur.RunProcessError, lambda: shell.run(["false"]))
+    assert_equal(["spawn"], [timings.operation for timings in recorded])
+    assert recorded[0].exited is not None
+
+
+def test_timings_hook_is_called_when_opening_file():
+    recorded = []
+    shell = spur.LocalShell(timings_hook=recorded.append)
+    with shell.open(__file__) as f:
+        pass
+    assert_equal([("open", __file__)], [(timings.operation, timings.target) for timings in recorded])
+
+
+def test_closing_stdin_of_process_using_pty_sends_eof():
+    shell = spur.LocalShell()
+    process = shell.spawn(["cat"], use_pty=True)
+    process.stdin_close()
+    result = process.wait_for_result()
+    assert_equal(b"", result.output)
+
+
+def test_resizing_pty_of_process_not_using_pty_raises_error():
+    shell = spur.LocalShell()
+    process = shell.spawn(["true"])
+    assert_raises(ValueError, lambda: process.resize_pty(80, 24))
+    process.wait_for_result()
+
+
+def test_pty_file_descriptors_are_closed_once_process_exits():
+    _assert_pty_file_descriptors_are_closed(spur.LocalShell())
+
+
+def test_pty_file_descriptors_are_closed_once_process_exits_when_using_io_hub():
+    _assert_pty_file_descriptors_are_closed(spur.LocalShell(io_hub=_io_hub))
+
+
+def _assert_pty_file_descriptors_are_closed(shell):
+    shell.run(["true"], use_pty=True)
+    fd_count = len(os.listdir("/proc/self/fd"))
+    for index in range(20):
+        shell.run(["echo", "hello"], use_pty=True)
+    assert_equal(fd_count, len(os.listdir("/proc/self/fd")))
+
+
+def test_process_is_run_in_new_process_group_if_new_process_group_is_set():
+    shell = spur.LocalShell()
+    process = shell.spawn(["sh", "-c", "ps -o pgid= -p $$"], store_pid=True, new_process_group=True)
+    assert_equal(process.pid, int(process.wait_for_result().output))
+
+
+def test_changes_to_environment_are_used_when_update_env_is_repeated():
+    shell = spur.LocalShell()
+    command = ["sh", "-c", "echo $SPUR_TEST_NAME $SPUR_TEST_GREETING"]
+    update_env = {"SPUR_TEST_GREETING": "hello"}
+    os.environ["SPUR_TEST_NAME"] = "Bob"
+    try:
+        assert_equal(b"Bob hello\n", shell.run(command, update_env=update_env).output)
+        os.environ["SPUR_TEST_NAME"] = "Alice"
+        assert_equal(b"Alice hello\n", shell.run(command, update_env=update_env).output)
+    finally:
+        del os.environ["SPUR_TEST_NAME"]
+    assert_equal(b"hello\n", shell.run(command, update_env=update_env).output)
+
+
+def test_copying_file_to_itself_raises_error_without_changing_file():
+    shell = spur.LocalShell()
+    with create_temporary_dir() as temp_dir:
+        path = os.path.join(temp_dir, "file")
+        with open(path, "wb") as f:
+            f.write(b"hello")
+        assert_raises(shutil.SameFileError, lambda: shell.files.copy_file(path, dir=temp_dir))
+        assert_raises(shutil.SameFileError, lambda: shell.upload_file(path, path))
+        with open(path, "rb") as f:
+            assert_equal(b"hello", f.read())
+
+
+def test_writing_file_does_not_spawn_processes():
+    shell = spur.LocalShell()
+    with create_temporary_dir() as temp_dir:
+        # Any command run to create the parent directories can't be found
+        path = os.environ["PATH"]
+        os.environ["PATH"] = ""
+        try:
+            shell.files.write_file(os.path.join(temp_dir, "one", "file"), "hello")
+            shell.write_file(os.path.join(temp_dir, "two", "file"), "hello")
+        finally:
+            os.environ["PATH"] = path
+        with open(os.path.join(temp_dir, "two", "file")) as f:
+            assert_equal("hello", f.read())
+
+
+def test_upload_dir_accepts_stream_and_compression_arguments():
+    shell = spur.LocalShell()
+    with create_temporary_dir() as source:
+        with open(os.path.join(source, "file"), "w") as f:
+            f.write("hello")
+        with create_temporary_dir() as temp_dir:
+            dest = os.path.join(temp_dir, "dest")
+            shell.upload_dir(source, dest, ignore=[], stream=True, compression="gzip")
+            with open(os.path.join(dest, "file")) as f:
+                assert_equal("hello", f.read())
+
+
+def test_upload_dir_raises_error_for_unsupported_compression():
+    shell = spur.LocalShell()
+    with create_temporary_dir() as source:
+        with create_temporary_dir() as temp_dir:
+            dest = os.path.join(temp_dir, "dest")
+            assert_raises(ValueError, lambda: shell.upload_dir(source, dest, ignore=[], compression="lzma"))
+            assert not os.path.exists(dest)
+
+
+def test_waiting_for_process_raises_error_if_io_hub_is_closed_before_output_is_read():
+    with spur.io.SelectorIoHub() as hub:
+        shell = spur.LocalShell(io_hub=hub)
+        process = shell.spawn(["sh", "-c", "sleep 1; echo hello"], stdout=io.BytesIO(), stderr=io.BytesIO())
+        hub.close()
+        assert_raises(RuntimeError, lambda: process.wait_for_result(timeout=5))
+
+
+def test_spawning_raises_error_if_io_hub_is_closed():
+    with spur.io.SelectorIoHub() as hub:
+        hub.close()
+        shell = spur.LocalShell(io_hub=hub)
+        assert_raises(RuntimeError, lambda: shell.spawn(["true"]))
+
+
+def test_process_is_killed_if_output_cannot_be_read_by_io_hub():
+    class FailingHub(spur.io.SelectorIoHub):
+        def register(self, file_in, reader):
+            raise RuntimeError("I/O hub is closed")
+
+    with FailingHub() as hub:
+        shell = spur.LocalShell(io_hub=hub)
+        with create_temporary_dir() as temp_dir:
+            path = os.path.join(temp_dir, "ran")
+            fd_count = len(os.listdir("/proc/self/fd"))
+            assert_raises(RuntimeError, lambda: shell.spawn(
+                ["sh", "-c", 'sleep 0.2; touch "$1"', "sh", path],
+                stdout=io.BytesIO(),
+            ))
+            assert_equal(fd_count, len(os.listdir("/proc/self/fd")))
+            time.sleep(0.5)
+            assert not os.path.exists(path)
@@ -1,5 +1,6 @@
 from __future__ import unicode_literals
 
+import threading
 import uuid
 import functools
 
@@ -55,3 +56,34 @@ class OpenTestSet(object):
         shell.run(["sh", "-c", "echo hello > '{0}'".format(path)])
         with shell.open(path, "rb") as f:
             assert_equal(b"hello\n", f.read())
+
+    @with_shell
+    def test_files_can_be_opened_concurrently_from_many_threads(shell):
+        paths = ["/tmp/{0}".format(uuid.uuid4()) for index in range(8)]
+
+        def write(path):
+            with shell.open(path, "w") as f:
+                f.write(path)
+
+        try:
+            threads = [threading.Thread(target=write, args=(path, )) for path in paths]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+            for path in paths:
+                with shell.open(path) as f:
+                    assert_equal(path, f.read())
+        finally:
+            shell.run(["rm", "-f"] + paths)
+
+    @with_shell
+    def test_write_file_creates_parent_directories(shell):
+        temp_dir = "/tmp/{0}".format(uuid.uuid4())
+        path = "{0}/one/two/file.txt".format(temp_dir)
+        try:
+            shell.files.write_file(path, "hello")
+            assert_equal(b"hello", shell.run(["cat", path]).output)
+        finally:
+            shell.run(["rm", "-rf", temp_dir])
@@ -0,0 +1,93 @@
+import spur
+from .assertions import assert_equal, assert_raises
+
+
+__all__ = ["PipelineTestSet"]
+
+
+class PipelineTestSet(object):
+    def test_output_of_one_process_is_piped_to_the_next(self):
+        with self.create_shell() as shell:
+            pipeline = spur.pipe(
+                shell.spawn(["printf", "one\\ntwo\\nthree\\n"]),
+                shell.spawn(["grep", "t"]),
+                shell.spawn(["tr", "a-z", "A-Z"]),
+            )
+            result = pipeline.wait_for_result()
+
+            assert_equal(b"TWO\nTHREE\n", result.output)
+            assert_equal(0, result.return_code)
+            assert_equal([14, 10], result.bytes_piped)
+
+    def test_large_output_is_piped_in_full(self):
+        with self.create_shell() as shell:
+            pipeline = spur.pipe(
+                shell.spawn(["head", "-c", "3000000", "/dev/zero"]),
+                shell.spawn(["wc", "-c"]),
+            )
+            assert_equal(b"3000000", pipeline.wait_for_result().output.strip())
+
+    def test_results_of_each_process_are_available_on_result(self):
+        with self.create_shell() as shell:
+            pipeline = spur.pipe(
+                shell.spawn(["sh", "-c", "echo hello; echo first >&2"]),
+                shell.spawn(["sh", "-c", "cat; echo second >&2"]),
+            )
+            result = pipeline.wait_for_result()
+
+            assert_equal([b"first\n", b"second\n"], [result.stderr_output for result in result.results])
+            assert_equal(b"second\n", result.stderr_output)
+
+    def test_return_code_is_return_code_of_last_process_to_fail(self):
+        with self.create_shell() as shell:
+            pipeline = spur.pipe(
+                shell.spawn(["sh", "-c", "echo hello; exit 3"], allow_error=True),
+                shell.spawn(["sh", "-c", "cat; exit 4"], allow_error=True),
+                shell.spawn(["cat"]),
+            )
+            assert_equal(4, pipeline.wait_for_result().return_code)
+
+    def test_error_from_first_failing_process_is_raised(self):
+        with self.create_shell() as shell:
+            pipeline = spur.pipe(
+                shell.spawn(["sh", "-c", "echo hello; exit 3"]),
+                shell.spawn(["sh", "-c", "cat; exit 4"]),
+            )
+            try:
+                pipeline.wait_for_result()
+                assert False
+            except spur.RunProcessError as error:
+                assert_equal(3, error.return_code)
+
+    def test_output_is_discarded_once_next_process_exits(self):
+        with self.create_shell() as shell:
+            pipeline = spur.pipe(
+                shell.spawn(["head", "-c", "3000000", "/dev/zero"]),
+                shell.spawn(["head", "-c", "10"]),
+            )
+            result = pipeline.wait_for_result()
+
+            assert_equal(10, len(result.output))
+
+    def test_processes_are_killed_if_pipeline_does_not_finish_within_timeout(self):
+        with self.create_shell() as shell:
+            pipeline = spur.pipe(
+                shell.spawn(["sh", "-c", "echo hello; exec sleep 10"]),
+                shell.spawn(["cat"]),
+            )
+            assert_raises(spur.CommandTimeoutError, lambda: pipeline.wait_for_result(timeout=0.5))
+            assert not pipeline.is_running()
+
+    def test_cannot_pipe_output_that_is_written_to_stdout_argument(self):
+        with self.create_shell() as shell:
+            source = shell.spawn(["echo", "hello"], stdout=_NullFile())
+            destination = shell.spawn(["cat"])
+            assert_raises(RuntimeError, lambda: spur.pipe(source, destination))
+            source.wait_for_result()
+            destination.stdin_close()
+            destination.wait_for_result()
+
+
+class _NullFile(object):
+    def write(self, data):
+        pass
@@ -0,0 +1,122 @@
+import socket
+import threading
+import time
+
+from spur.pool import ConnectionPool
+from .assertions import assert_equal, assert_raises
+
+
+_KEY = ("example.com", 22, "bob", None, None)
+
+
+def test_new_connection_is_made_if_pool_is_empty():
+    pool = ConnectionPool()
+    client = pool.acquire(_KEY, _FakeClient)
+    assert isinstance(client, _FakeClient)
+    assert_equal(1, pool.statistics().misses)
+
+
+def test_released_connection_is_reused_for_same_key():
+    pool = ConnectionPool()
+    client = pool.acquire(_KEY, _FakeClient)
+    pool.release(_KEY, client)
+    assert client is pool.acquire(_KEY, _FakeClient)
+    assert_equal(1, pool.statistics().hits)
+
+
+def test_released_connection_is_not_reused_for_different_key():
+    pool = ConnectionPool()
+    client = pool.acquire(_KEY, _FakeClient)
+    pool.release(_KEY, client)
+    other_key = ("example.com", 22, "alice", None, None)
+    assert client is not pool.acquire(other_key, _FakeClient)
+
+
+def test_unhealthy_connections_are_closed_instead_of_reused():
+    pool = ConnectionPool()
+    client = pool.acquire(_KEY, _FakeClient)
+    pool.release(_KEY, client)
+    client.active = False
+    assert client is not pool.acquire(_KEY, _FakeClient)
+    assert client.closed
+    assert_equal(1, pool.statistics().unhealthy)
+
+
+def test_idle_connections_are_closed_after_idle_timeout():
+    pool = ConnectionPool(idle_timeout=0.01)
+    client = pool.acquire(_KEY, _FakeClient)
+    pool.release(_KEY, client)
+    time.sleep(0.02)
+    assert client is not pool.acquire(_KEY, _FakeClient)
+    assert client.closed
+    assert_equal(1, pool.statistics().evictions)
+
+
+def test_idle_connection_with_other_key_is_closed_when_host_is_at_max_connections():
+    pool = ConnectionPool(max_connections_per_host=1)
+    client = pool.acquire(_KEY, _FakeClient)
+    pool.release(_KEY, client)
+    pool.acquire(("example.com", 22, "alice", None, None), _FakeClient)
+    assert client.closed
+
+
+def test_acquire_waits_for_release_when_host_is_at_max_connections():
+    pool = ConnectionPool(max_connections_per_host=1)
+    client = pool.acquire(_KEY, _FakeClient)
+    acquired = []
+    thread = threading.Thread(target=lambda: acquired.append(pool.acquire(_KEY, _FakeClient)))
+    thread.start()
+    time.sleep(0.05)
+    assert_equal([], acquired)
+    pool.release(_KEY, client)
+    thread.join()
+    assert_equal([client], acquired)
+
+
+def test_acquire_without_waiting_returns_none_when_host_is_at_max_connections():
+    pool = ConnectionPool(max_connections_per_host=1)
+    pool.acquire(_KEY, _FakeClient)
+    assert_equal(None, pool.acquire(_KEY, _FakeClient, wait=False))
+
+
+def test_acquire_raises_timeout_if_host_is_still_at_max_connections_after_timeout():
+    pool = ConnectionPool(max_connections_per_host=1)
+    pool.acquire(_KEY, _FakeClient)
+    start = time.time()
+    assert_raises(socket.timeout, lambda: pool.acquire(_KEY, _FakeClient, timeout=0.05))
+    assert time.time() - start >= 0.05
+
+
+def test_failed_connection_does_not_count_towards_max_connections():
+    pool = ConnectionPool(max_connections_per_host=1)
+
+    def fail():
+        raise IOError("Connection refused")
+
+    assert_raises(IOError, lambda: pool.acquire(_KEY, fail))
+    pool.acquire(_KEY, _FakeClient)
+    assert_equal(1, pool.statistics().connections)
+
+
+def test_closing_pool_closes_idle_connections():
+    pool = ConnectionPool()
+    client = pool.acquire(_KEY, _FakeClient)
+    pool.release(_KEY, client)
+    pool.close()
+    assert client.closed
+    assert_raises(RuntimeError, lambda: pool.acquire(_KEY, _FakeClient))
+
+
+class _FakeClient(object):
+    def __init__(self):
+        self.active = True
+        self.closed = False
+
+    def get_transport(self):
+        return self
+
+    def is_active(self):
+        return self.active and not self.closed
+
+    def close(self):
+        self.closed = True
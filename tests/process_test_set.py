@@ -2,12 +2,14 @@
 
 import errno
 import io
+import os
 import time
 import signal
 import functools
 import posixpath
 
 import spur
+from spur.tempdir import create_temporary_dir
 from .assertions import assert_equal, assert_not_equal, assert_raises
 
 
@@ -112,6 +114,91 @@ class ProcessTestSet(object):
                 error.args[0]
             )
 
+    @with_shell
+    def test_only_end_of_output_is_stored_when_capturing_tail(shell):
+        result = shell.run(["sh", "-c", "echo hello; echo world"], capture=spur.capture.tail(6))
+        assert_equal(b"world\n", result.output)
+        assert_equal(6, result.output_omitted)
+        assert_equal(0, result.stderr_output_omitted)
+
+    @with_shell
+    def test_exception_message_marks_where_output_was_omitted(shell):
+        try:
+            shell.run(["sh", "-c", "echo hello; echo world; exit 1"], capture=spur.capture.tail(6))
+            assert_true(False)
+        except spur.RunProcessError as error:
+            assert_equal(b"world\n", error.output)
+            assert_equal(6, error.output_omitted)
+            assert_equal(
+                """return code: 1\noutput: b'[... 6 bytes omitted ...]world\\n'\nstderr output: b''""",
+                error.args[0]
+            )
+
+    @with_shell
+    def test_exception_message_contains_captured_output(shell):
+        try:
+            shell.run(["sh", "-c", "echo starting; echo failed! 1>&2; exit 1"], capture=spur.capture.discard())
+            assert_true(False)
+        except spur.RunProcessError as error:
+            assert_equal(
+                """return code: 1\noutput: b''\nstderr output: b''""",
+                error.args[0]
+            )
+
+    @with_shell
+    def test_output_can_be_spilled_to_file(shell):
+        result = shell.run(["head", "-c", "100000", "/dev/zero"], capture=spur.capture.spill_to_file(1000))
+        try:
+            assert_equal(100000, result.output.size)
+            assert_equal(b"\0" * 100000, result.output.read())
+        finally:
+            result.output.close()
+
+    @with_shell
+    def test_run_batch_returns_result_of_each_command(shell):
+        results = shell.run_batch([
+            ["echo", "one"],
+            ["sh", "-c", "printf two; printf error 1>&2"],
+            ["true"],
+        ])
+        assert_equal([b"one\n", b"two", b""], [result.output for result in results])
+        assert_equal([b"", b"error", b""], [result.stderr_output for result in results])
+        assert_equal([0, 0, 0], [result.return_code for result in results])
+
+    @with_shell
+    def test_run_batch_output_is_decoded_if_encoding_is_set(shell):
+        results = shell.run_batch([["echo", "one"]], encoding="ascii")
+        assert_equal(["one\n"], [result.output for result in results])
+
+    @with_shell
+    def test_run_batch_raises_error_for_first_failed_command(shell):
+        try:
+            shell.run_batch([["true"], ["sh", "-c", "echo one; exit 3"], ["sh", "-c", "exit 4"]])
+            assert False
+        except spur.RunProcessError as error:
+            assert_equal(3, error.return_code)
+            assert_equal(b"one\n", error.output)
+
+    @with_shell
+    def test_run_batch_stores_return_codes_if_errors_allowed(shell):
+        results = shell.run_batch([["sh", "-c", "exit 3"], ["true"]], allow_error=True)
+        assert_equal([3, 0], [result.return_code for result in results])
+
+    @with_shell
+    def test_run_batch_raises_no_such_command_error_without_running_later_commands(shell):
+        with shell.temporary_dir() as temp_dir:
+            path = posixpath.join(temp_dir, "ran")
+            try:
+                shell.run_batch([["true"], ["i-am-not-a-command"], ["touch", path]], allow_error=True)
+                assert False
+            except spur.NoSuchCommandError as error:
+                assert_equal("i-am-not-a-command", error.command)
+            assert_equal(1, shell.run(["test", "-e", path], allow_error=True).return_code)
+
+    @with_shell
+    def test_run_batch_of_no_commands_returns_no_results(shell):
+        assert_equal([], shell.run_batch([]))
+
     @with_shell
     def test_return_code_stored_if_errors_allowed(shell):
         result = shell.run(["sh", "-c", "exit 14"], allow_error=True)
@@ -142,6 +229,65 @@ class ProcessTestSet(object):
         result = process.wait_for_result()
         assert_equal(b"hello\n", result.output)
 
+    @with_shell
+    def test_closing_stdin_of_spawned_process_sends_eof(shell):
+        process = shell.spawn(["cat"])
+        process.stdin_write(b"hello\n")
+        process.stdin_close()
+        result = process.wait_for_result()
+        assert_equal(b"hello\n", result.output)
+
+    @with_shell
+    def test_stdin_can_be_read_from_local_path(shell):
+        with create_temporary_dir() as temp_dir:
+            path = os.path.join(temp_dir, "input")
+            with open(path, "wb") as f:
+                f.write(b"x" * 3000000)
+            result = shell.run(["wc", "-c"], stdin=path)
+            assert_equal(b"3000000", result.output.strip())
+
+    @with_shell
+    def test_stdin_can_be_read_from_file_object_from_its_current_position(shell):
+        with create_temporary_dir() as temp_dir:
+            path = os.path.join(temp_dir, "input")
+            with open(path, "wb") as f:
+                f.write(b"skipped\nhello\n")
+            with open(path, "rb") as f:
+                f.readline()
+                result = shell.run(["cat"], stdin=f)
+            assert_equal(b"hello\n", result.output)
+
+    @with_shell
+    def test_stdin_can_be_read_from_in_memory_file_object(shell):
+        result = shell.run(["cat"], stdin=io.BytesIO(b"hello\n"))
+        assert_equal(b"hello\n", result.output)
+
+    @with_shell
+    def test_stdin_can_be_bytes(shell):
+        result = shell.run(["cat"], stdin=b"hello\n")
+        assert_equal(b"hello\n", result.output)
+
+    @with_shell
+    def test_stdin_can_be_read_from_iterator_of_bytes(shell):
+        chunks = (b"line " + str(index).encode("ascii") + b"\n" for index in range(3))
+        result = shell.run(["cat"], stdin=chunks)
+        assert_equal(b"line 0\nline 1\nline 2\n", result.output)
+
+    @with_shell
+    def test_stdin_is_not_written_once_process_exits(shell):
+        chunks = (b"x" * 100000 for index in range(1000))
+        result = shell.run(["head", "-c", "10"], stdin=chunks)
+        assert_equal(b"x" * 10, result.output)
+
+    @with_shell
+    def test_error_reading_stdin_is_raised_when_waiting_for_result(shell):
+        def chunks():
+            yield b"hello\n"
+            raise ValueError("could not read")
+
+        process = shell.spawn(["cat"], stdin=chunks())
+        assert_raises(ValueError, process.wait_for_result)
+
     @with_shell
     def test_can_tell_if_spawned_process_is_running(shell):
         process = shell.spawn(["sh", "-c", "echo after; read dont_care; echo after"])
@@ -186,6 +332,38 @@ class ProcessTestSet(object):
         process.stdin_write(b"\n")
         assert_equal(_u("☃hello\n"), process.wait_for_result().output)
 
+    @with_shell
+    def test_can_iterate_over_lines_of_output_of_spawned_process(shell):
+        process = shell.spawn(["sh", "-c", "echo one; echo two 1>&2; printf 'three\\nfour'"])
+        assert_equal([b"one\n", b"three\n", b"four"], list(process.iter_lines()))
+        assert_equal(b"two\n", process.wait_for_result().stderr_output)
+
+    @with_shell
+    def test_can_iterate_over_chunks_of_decoded_output_of_spawned_process(shell):
+        process = shell.spawn(["bash", "-c", r'echo -e "\u2603"'], encoding="utf8")
+        assert_equal(_u("☃\n"), "".join(process.iter_chunks()))
+
+    @with_shell
+    def test_can_iterate_over_output_while_process_is_executing(shell):
+        process = shell.spawn(["sh", "-c", "echo hello; read dont_care; echo goodbye"])
+        lines = process.iter_lines()
+        assert_equal(b"hello\n", next(lines))
+        assert process.is_running()
+        process.stdin_write(b"\n")
+        assert_equal([b"goodbye\n"], list(lines))
+
+    @with_shell
+    def test_stderr_is_read_while_iterating_over_output(shell):
+        process = shell.spawn(["sh", "-c", "head -c 1000000 /dev/zero 1>&2; echo done"])
+        assert_equal([b"done\n"], list(process.iter_lines()))
+        assert_equal(1000000, len(process.wait_for_result().stderr_output))
+
+    @with_shell
+    def test_cannot_iterate_over_output_that_is_written_to_stdout_argument(shell):
+        process = shell.spawn(["echo", "hello"], stdout=io.BytesIO())
+        assert_raises(RuntimeError, process.iter_chunks)
+        process.wait_for_result()
+
     @with_shell
     def test_can_get_process_id_of_process_if_store_pid_is_true(shell):
         process = shell.spawn(["sh", "-c", "echo $$"], store_pid=True)
@@ -204,6 +382,51 @@ class ProcessTestSet(object):
         process.send_signal(signal.SIGTERM)
         _wait_for_assertion(lambda: assert_equal(False, process.is_running()))
 
+    @with_shell
+    def test_timings_of_command_are_stored_on_result(shell):
+        result = shell.run(["sh", "-c", "echo hello; echo error >&2"])
+        timings = result.timings
+        assert_equal("spawn", timings.operation)
+        assert_equal(6, timings.stdout_bytes)
+        assert_equal(6, timings.stderr_bytes)
+        assert timings.started <= timings.initialized <= timings.first_byte <= timings.drained <= timings.finished
+        assert timings.exited is not None
+        assert_equal(
+            set(["initialized", "first_byte", "exited", "drained", "finished"]),
+            set(timings.durations()) - set(["connected", "authenticated", "channel_opened"]),
+        )
+
+    @with_shell
+    def test_run_raises_timeout_error_if_command_does_not_finish_within_timeout(shell):
+        start = time.time()
+        try:
+            shell.run(["sh", "-c", "echo hello; sleep 10"], timeout=0.5)
+            assert False, "Expected error"
+        except spur.CommandTimeoutError as error:
+            assert time.time() - start < 5
+            assert_equal(0.5, error.timeout)
+            assert_equal(b"hello\n", error.output)
+
+    @with_shell
+    def test_commands_that_finish_within_timeout_return_result(shell):
+        result = shell.run(["echo", "hello"], timeout=10)
+        assert_equal(b"hello\n", result.output)
+
+    @with_shell
+    def test_wait_for_result_raises_timeout_error_if_process_does_not_finish_within_timeout(shell):
+        process = shell.spawn(["sleep", "10"])
+        start = time.time()
+        assert_raises(spur.CommandTimeoutError, lambda: process.wait_for_result(timeout=0.2))
+        assert time.time() - start < 5
+        _wait_for_assertion(lambda: assert_equal(False, process.is_running()))
+
+    @with_shell
+    def test_process_is_killed_when_timeout_passed_to_spawn_expires(shell):
+        process = shell.spawn(["sleep", "10"], timeout=0.2)
+        time.sleep(0.2)
+        _wait_for_assertion(lambda: assert_equal(False, process.is_running()))
+        assert_raises(spur.CommandTimeoutError, process.wait_for_result)
+
 
     @with_shell
     def test_spawning_non_existent_command_raises_specific_no_such_command_exception(shell):
@@ -275,6 +498,19 @@ class ProcessTestSet(object):
         # Get the output twice since the pty echoes input
         assert_equal(b"hello\r\nhello\r\n", result.output)
 
+    @with_shell
+    def test_size_of_pty_can_be_set(shell):
+        result = shell.run(["stty", "size"], use_pty=True, pty_size=(100, 40))
+        assert_equal(b"40 100\r\n", result.output)
+
+    @with_shell
+    def test_pty_can_be_resized_while_process_is_running(shell):
+        process = shell.spawn(["sh", "-c", "read value; stty size"], use_pty=True, pty_size=(100, 40))
+        process.resize_pty(120, 50)
+        process.stdin_write(b"\n")
+        result = process.wait_for_result()
+        assert_equal(b"\r\n50 120\r\n", result.output)
+
     @with_shell
     def test_using_non_existent_cwd_raises_could_not_change_directory_error(shell):
         cwd = "/some/silly/path"
@@ -336,8 +572,6 @@ class ProcessTestSet(object):
             shell.close()
 
 
-# TODO: timeouts in wait_for_result
-
 def _wait_for_assertion(assertion):
     timeout = 1
     period = 0.01
@@ -1,14 +1,27 @@
 from __future__ import unicode_literals
 
 import io
+import os
+import signal
 import socket
+import time
+import uuid
+
+import paramiko
 
 import spur
 import spur.ssh
+import spur.pool
+from spur.tempdir import create_temporary_dir
 from .assertions import assert_equal, assert_raises
-from .testing import create_ssh_shell, HOSTNAME, PORT, PASSWORD, USERNAME
+from .testing import create_ssh_shell, create_async_ssh_shell, HOSTNAME, PORT, PASSWORD, USERNAME
 from .process_test_set import ProcessTestSet
 from .open_test_set import OpenTestSet
+from .async_process_test_set import AsyncProcessTestSet
+from .sync_dir_test_set import SyncDirTestSet
+from .files_test_set import FilesTestSet
+from .transfer_test_set import TransferTestSet
+from .pipeline_test_set import PipelineTestSet
 
 
 class SshTestMixin(object):
@@ -24,6 +37,46 @@ class SshProcessTests(ProcessTestSet, SshTestMixin):
     pass
 
 
+class SshSyncDirTests(SyncDirTestSet, SshTestMixin):
+    pass
+
+
+class SshFilesTests(FilesTestSet, SshTestMixin):
+    pass
+
+
+class SshTransferTests(TransferTestSet, SshTestMixin):
+    pass
+
+
+class SshPipelineTests(PipelineTestSet, SshTestMixin):
+    pass
+
+
+class BulkPerformanceProfileSshTestMixin(object):
+    def create_shell(self):
+        return create_ssh_shell(performance_profile=spur.ssh.PerformanceProfiles.bulk)
+
+
+class BulkPerformanceProfileSshOpenTests(OpenTestSet, BulkPerformanceProfileSshTestMixin):
+    pass
+
+
+class AsyncSshProcessTests(AsyncProcessTestSet):
+    def create_async_shell(self):
+        return create_async_ssh_shell()
+
+
+def test_channel_reader_returns_output_after_initialization_lines_in_order():
+    chunks = [b"1\nspur-cd: ", b"0\nhel", b"lo\n", b"world", b""]
+    reader = spur.ssh._ChannelReader(lambda size: chunks.pop(0))
+    assert_equal(b"1\n", reader.readline())
+    assert_equal(b"spur-cd: 0\n", reader.readline())
+    assert_equal(b"hel", reader.read1(3))
+    assert_equal(b"lo\n", reader.readline())
+    assert_equal(b"world", reader.read())
+
+
 def test_attempting_to_connect_to_wrong_port_raises_connection_error():
     def try_connection():
         shell = _create_shell_with_wrong_port()
@@ -83,6 +136,290 @@ def test_an_open_socket_can_be_used_for_ssh_connection_with_sock_argument():
         assert_equal(b"hello\n", result.output)
 
 
+def test_remote_process_is_killed_when_command_times_out():
+    with create_ssh_shell() as shell:
+        with shell.temporary_dir() as temp_dir:
+            path = "{0}/finished".format(temp_dir)
+            command = ["sh", "-c", 'sleep 1 && touch "$0"', path]
+            assert_raises(spur.CommandTimeoutError, lambda: shell.run(command, timeout=0.2))
+            time.sleep(1.5)
+            assert not shell.files.exists(path)
+
+
+def test_process_id_is_only_read_if_needed():
+    with create_ssh_shell() as shell:
+        process = shell.spawn(["true"])
+        process.wait_for_result()
+        assert_equal(None, process._pid)
+        assert not hasattr(process, "pid")
+
+        process = shell.spawn(["true"], timeout=5)
+        process.wait_for_result()
+        assert process._pid is not None
+        assert not hasattr(process, "pid")
+
+
+def test_timings_of_connecting_are_recorded_by_first_command():
+    recorded = []
+    with create_ssh_shell(timings_hook=recorded.append) as shell:
+        shell.run(["true"])
+        shell.run(["true"])
+
+    first, second = recorded
+    assert first.started <= first.connected <= first.authenticated <= first.channel_opened <= first.initialized
+    assert_equal(None, second.connected)
+    assert_equal(None, second.authenticated)
+    assert second.channel_opened is not None
+
+
+def test_timings_hook_is_called_when_opening_file():
+    recorded = []
+    with create_ssh_shell(timings_hook=recorded.append) as shell:
+        with shell.temporary_dir() as temp_dir:
+            path = "{0}/hello".format(temp_dir)
+            with shell.open(path, "w") as f:
+                f.write("hello")
+
+    timings, = [timings for timings in recorded if timings.operation == "open"]
+    assert_equal(path, timings.target)
+    assert timings.channel_opened is not None
+
+
+def test_timings_of_upload_dir_include_bytes_sent():
+    recorded = []
+    with create_temporary_dir() as local_dir:
+        _write_local_file(os.path.join(local_dir, "hello"), "hello")
+        with create_ssh_shell(timings_hook=recorded.append) as shell:
+            with shell.temporary_dir() as temp_dir:
+                shell.upload_dir(local_dir, temp_dir, ignore=[], stream=True)
+
+    timings, = [timings for timings in recorded if timings.operation == "upload_dir"]
+    assert timings.bytes_sent > 0
+
+
+def test_connections_are_reused_by_shells_with_same_connection_pool():
+    with spur.pool.ConnectionPool() as pool:
+        for index in range(2):
+            with create_ssh_shell(connection_pool=pool) as shell:
+                assert_equal(b"hello\n", shell.run(["echo", "hello"]).output)
+
+        statistics = pool.statistics()
+        assert_equal(1, statistics.misses)
+        assert_equal(1, statistics.hits)
+        assert_equal(1, statistics.idle_connections)
+
+
+def test_connections_with_different_missing_host_key_policies_are_not_shared_by_pool():
+    with spur.pool.ConnectionPool() as pool:
+        with create_ssh_shell(connection_pool=pool) as shell:
+            shell.run(["true"])
+        with create_ssh_shell(connection_pool=pool, missing_host_key=spur.ssh.MissingHostKey.auto_add) as shell:
+            shell.run(["true"])
+
+        assert_equal(2, pool.statistics().misses)
+
+
+def test_connection_error_is_raised_if_connection_pool_is_exhausted_until_connect_timeout():
+    with spur.pool.ConnectionPool(max_connections_per_host=1) as pool:
+        with create_ssh_shell(connection_pool=pool) as first_shell:
+            first_shell.run(["true"])
+            with create_ssh_shell(connection_pool=pool, connect_timeout=0.1) as second_shell:
+                try:
+                    second_shell.run(["true"])
+                    assert False
+                except spur.ssh.ConnectionError as error:
+                    assert isinstance(error.original_error, socket.timeout)
+                assert_equal(1, pool.statistics().connections)
+
+
+def test_concurrent_commands_are_spread_across_connections_up_to_max_connections():
+    with create_ssh_shell(max_connections=2) as shell:
+        processes = [shell.spawn(["sh", "-c", "read line"]) for index in range(4)]
+        try:
+            transports = [process._channel.get_transport() for process in processes]
+            assert_equal(2, len(set(transports)))
+            assert_equal([2, 2], sorted(transports.count(transport) for transport in set(transports)))
+        finally:
+            for process in processes:
+                process.stdin_write(b"\n")
+                process.wait_for_result()
+
+
+def test_connections_are_reused_once_commands_have_finished():
+    with create_ssh_shell(max_connections=2) as shell:
+        transports = set()
+        for index in range(3):
+            process = shell.spawn(["true"])
+            transports.add(process._channel.get_transport())
+            process.wait_for_result()
+
+        assert_equal(1, len(transports))
+
+
+def test_existing_connection_is_used_when_connection_pool_is_at_max_connections():
+    with spur.pool.ConnectionPool(max_connections_per_host=1) as pool:
+        with create_ssh_shell(max_connections=2, connection_pool=pool) as shell:
+            process = shell.spawn(["sh", "-c", "read value"])
+            try:
+                result = shell.run(["echo", "hello"], timeout=5)
+                assert_equal(b"hello\n", result.output)
+                assert_equal(1, pool.statistics().connections)
+            finally:
+                process.stdin_write(b"\n")
+                process.wait_for_result()
+
+
+def test_new_connection_is_opened_when_server_refuses_to_open_session():
+    with create_ssh_shell(max_connections=2) as shell:
+        shell.run(["true"])
+        first_transport = shell._get_ssh_transport()
+
+        def refuse_session(*args, **kwargs):
+            raise paramiko.ChannelException(
+                paramiko.common.OPEN_FAILED_ADMINISTRATIVELY_PROHIBITED,
+                "Administratively prohibited",
+            )
+        first_transport.open_session = refuse_session
+
+        process = shell.spawn(["true"])
+        try:
+            assert process._channel.get_transport() is not first_transport
+        finally:
+            process.wait_for_result()
+
+
+def test_error_is_raised_when_every_connection_refuses_to_open_session():
+    with create_ssh_shell() as shell:
+        shell.run(["true"])
+
+        def refuse_session(*args, **kwargs):
+            raise paramiko.ChannelException(
+                paramiko.common.OPEN_FAILED_ADMINISTRATIVELY_PROHIBITED,
+                "Administratively prohibited",
+            )
+        shell._get_ssh_transport().open_session = refuse_session
+
+        assert_raises(paramiko.ChannelException, lambda: shell.run(["true"]))
+
+
+def test_output_of_local_process_can_be_piped_to_remote_process():
+    with create_ssh_shell() as remote_shell:
+        pipeline = spur.pipe(
+            spur.LocalShell().spawn(["head", "-c", "1000000", "/dev/zero"]),
+            remote_shell.spawn(["wc", "-c"]),
+        )
+        assert_equal(b"1000000", pipeline.wait_for_result().output.strip())
+
+
+def test_output_of_remote_process_can_be_piped_to_process_on_another_connection():
+    with create_ssh_shell() as first_shell, create_ssh_shell() as second_shell:
+        pipeline = spur.pipe(
+            first_shell.spawn(["head", "-c", "1000000", "/dev/zero"]),
+            second_shell.spawn(["wc", "-c"]),
+            spur.LocalShell().spawn(["cat"]),
+        )
+        assert_equal(b"1000000", pipeline.wait_for_result().output.strip())
+
+
+def test_performance_profile_sets_preferred_cipher_and_mac():
+    profile = spur.ssh.PerformanceProfile(ciphers=["aes256-ctr"], macs=["hmac-sha2-512"])
+    with create_ssh_shell(performance_profile=profile) as shell:
+        shell.run(["true"])
+        transport = shell._get_ssh_transport()
+        assert_equal("aes256-ctr", transport.local_cipher)
+        assert_equal("hmac-sha2-512", transport.local_mac)
+
+
+def test_performance_profile_ignores_algorithms_unsupported_by_paramiko():
+    profile = spur.ssh.PerformanceProfile(ciphers=["not-a-cipher", "aes256-ctr"])
+    with create_ssh_shell(performance_profile=profile) as shell:
+        shell.run(["true"])
+        assert_equal("aes256-ctr", shell._get_ssh_transport().local_cipher)
+
+
+def test_performance_profile_sets_window_and_packet_size_of_sessions_and_sftp():
+    profile = spur.ssh.PerformanceProfile(window_size=8 * 1024 * 1024, max_packet_size=64 * 1024)
+    with create_ssh_shell(performance_profile=profile) as shell:
+        process = shell.spawn(["true"])
+        assert_equal(8 * 1024 * 1024, process._channel.in_window_size)
+        assert_equal(64 * 1024, process._channel.in_max_packet_size)
+        process.wait_for_result()
+
+        with shell.open("/dev/null", "rb") as f:
+            assert_equal(8 * 1024 * 1024, f.sftp.get_channel().in_window_size)
+
+
+def test_connections_with_different_performance_profiles_are_not_shared_by_pool():
+    with spur.pool.ConnectionPool() as pool:
+        with create_ssh_shell(connection_pool=pool) as shell:
+            shell.run(["true"])
+        profile = spur.ssh.PerformanceProfiles.bulk
+        with create_ssh_shell(connection_pool=pool, performance_profile=profile) as shell:
+            shell.run(["true"])
+
+        assert_equal(2, pool.statistics().misses)
+
+
+def test_sftp_session_is_reused_by_files_opened_one_after_another():
+    with create_ssh_shell() as shell:
+        channels = set()
+        for index in range(3):
+            with shell.open("/dev/null", "rb") as f:
+                channels.add(f.sftp.get_channel().get_id())
+
+        assert_equal(1, len(channels))
+
+
+def test_sftp_session_is_closed_when_shell_is_closed():
+    with create_ssh_shell() as shell:
+        with shell.open("/dev/null", "rb") as f:
+            channel = f.sftp.get_channel()
+
+    assert channel.closed
+
+
+def test_upload_dir_can_stream_archive_to_remote_tar():
+    _assert_upload_dir_streams(compression="gzip")
+
+
+def test_upload_dir_can_stream_uncompressed_archive():
+    _assert_upload_dir_streams(compression="none")
+
+
+def test_upload_dir_can_stream_archive_when_using_persistent_session():
+    _assert_upload_dir_streams(compression="gzip", shell_type=spur.ssh.ShellTypes.persistent_sh)
+
+
+def _assert_upload_dir_streams(compression, shell_type=None):
+    with create_temporary_dir() as local_dir:
+        os.makedirs(os.path.join(local_dir, "one", "two"))
+        os.makedirs(os.path.join(local_dir, "ignored-dir"))
+        _write_local_file(os.path.join(local_dir, "one", "two", "hello.txt"), "hello")
+        _write_local_file(os.path.join(local_dir, "top.txt"), "top")
+        _write_local_file(os.path.join(local_dir, "ignored-dir", "a.txt"), "a")
+        _write_local_file(os.path.join(local_dir, "one", "b.pyc"), "b")
+
+        remote_dir = "/tmp/{0}/upload".format(uuid.uuid4())
+        with create_ssh_shell(shell_type=shell_type) as shell:
+            try:
+                shell.upload_dir(local_dir, remote_dir, ["ignored-dir", "*.pyc"], stream=True, compression=compression)
+                result = shell.run(["find", ".", "-type", "f"], cwd=remote_dir, encoding="ascii")
+                assert_equal(["./one/two/hello.txt", "./top.txt"], sorted(result.output.split()))
+                assert_equal(b"hello", shell.run(["cat", remote_dir + "/one/two/hello.txt"]).output)
+            finally:
+                shell.run(["rm", "-rf", os.path.dirname(remote_dir)])
+
+
+def test_upload_dir_raises_error_for_unsupported_compression():
+    with create_ssh_shell() as shell:
+        assert_raises(ValueError, lambda: shell.upload_dir("/tmp", "/tmp", [], stream=True, compression="lzma"))
+
+
+def _write_local_file(path, contents):
+    with open(path, "w") as f:
+        f.write(contents)
+
+
 def _create_shell_with_wrong_port(**kwargs):
     return spur.SshShell(
         username=USERNAME,
@@ -156,6 +493,124 @@ class MinimalSshProcessTests(ProcessTestSet, MinimalSshTestMixin):
 
 
 
+class PersistentSshTestMixin(object):
+    def create_shell(self):
+        return create_ssh_shell(shell_type=spur.ssh.ShellTypes.persistent_sh)
+
+
+class PersistentSshProcessTests(ProcessTestSet, PersistentSshTestMixin):
+    # Commands run in a persistent session have an empty stdin
+    test_can_write_to_stdin_of_spawned_processes = None
+    test_can_tell_if_spawned_process_is_running = None
+    test_can_write_stdout_to_file_object_while_process_is_executing = None
+    test_can_write_stderr_to_file_object_while_process_is_executing = None
+    test_when_encoding_is_set_then_stdout_is_decoded_before_writing_to_stdout_argument = None
+    test_can_iterate_over_output_while_process_is_executing = None
+    test_can_send_signal_to_process_if_store_pid_is_set = None
+    test_closing_stdin_of_spawned_process_sends_eof = None
+    test_stdin_can_be_read_from_local_path = None
+    test_stdin_can_be_read_from_file_object_from_its_current_position = None
+    test_stdin_can_be_read_from_in_memory_file_object = None
+    test_stdin_can_be_bytes = None
+    test_stdin_can_be_read_from_iterator_of_bytes = None
+    test_stdin_is_not_written_once_process_exits = None
+    test_error_reading_stdin_is_raised_when_waiting_for_result = None
+
+    # use_pty is not supported when using a persistent session
+    test_command_can_be_explicitly_run_with_pseudo_terminal = None
+    test_output_is_captured_when_using_pty = None
+    test_stderr_is_redirected_stdout_when_using_pty = None
+    test_can_write_to_stdin_of_spawned_process_when_using_pty = None
+    test_size_of_pty_can_be_set = None
+    test_pty_can_be_resized_while_process_is_running = None
+
+    def test_commands_are_run_using_one_channel(self):
+        with self.create_shell() as shell:
+            channels = set()
+            for index in range(3):
+                process = shell.spawn(["true"])
+                channels.add(process._session.channel.get_id())
+                process.wait_for_result()
+            assert_equal(1, len(channels))
+
+    def test_cwd_and_environment_only_apply_to_one_command(self):
+        with self.create_shell() as shell:
+            shell.run(["true"], cwd="/", update_env={"NAME": "Bob"})
+            result = shell.run(["sh", "-c", "echo $NAME"])
+            assert_equal(b"\n", result.output)
+
+    def test_can_tell_if_process_is_running(self):
+        with self.create_shell() as shell:
+            process = shell.spawn(["sh", "-c", "sleep 0.5"])
+            assert_equal(True, process.is_running())
+            _wait_for_assertion(lambda: assert_equal(False, process.is_running()))
+
+    def test_can_send_signal_to_process_if_store_pid_is_set(self):
+        with self.create_shell() as shell:
+            process = shell.spawn(["sleep", "10"], store_pid=True)
+            assert process.is_running()
+            process.send_signal(signal.SIGTERM)
+            _wait_for_assertion(lambda: assert_equal(False, process.is_running()))
+
+    def test_cannot_write_to_stdin(self):
+        with self.create_shell() as shell:
+            process = shell.spawn(["true"])
+            assert_raises(spur.ssh.UnsupportedArgumentError, lambda: process.stdin_write(b"\n"))
+
+    def test_cannot_pass_stdin_to_spawn(self):
+        with self.create_shell() as shell:
+            assert_raises(spur.ssh.UnsupportedArgumentError, lambda: shell.spawn(["cat"], stdin=b"hello"))
+
+    def test_new_session_is_started_if_session_ends(self):
+        with self.create_shell() as shell:
+            assert_raises(
+                spur.ssh.ConnectionError,
+                lambda: shell.run(["sh", "-c", "kill -9 $PPID; sleep 1"]),
+            )
+            assert_equal(b"hello\n", shell.run(["echo", "hello"]).output)
+
+
+class PersistentSshSyncDirTests(SyncDirTestSet, PersistentSshTestMixin):
+    pass
+
+
+class CommandPathCacheSshTestMixin(object):
+    def create_shell(self):
+        return create_ssh_shell(command_path_cache_ttl=60)
+
+
+class CommandPathCacheSshProcessTests(ProcessTestSet, CommandPathCacheSshTestMixin):
+    def test_path_of_command_is_cached_when_command_is_run(self):
+        with self.create_shell() as shell:
+            shell.run(["cat", "/dev/null"])
+            assert_equal(_command_path(shell, "cat"), shell._command_paths.get("cat"))
+            assert_equal(b"hello", shell.run(["printf", "hello"]).output)
+            assert_equal(b"hello", shell.run(["printf", "hello"]).output)
+
+    def test_resolve_commands_looks_up_paths_of_many_commands(self):
+        with self.create_shell() as shell:
+            paths = shell.resolve_commands(["cat", "i-am-not-a-command"])
+            assert_equal({"cat": _command_path(shell, "cat"), "i-am-not-a-command": None}, paths)
+            assert_equal(paths["cat"], shell._command_paths.get("cat"))
+
+    def test_cache_is_not_used_if_path_is_changed(self):
+        with self.create_shell() as shell:
+            shell.resolve_commands(["cat"])
+            assert_raises(
+                spur.NoSuchCommandError,
+                lambda: shell.run(["cat", "/dev/null"], update_env={"PATH": "/i-am-not-a-directory"}),
+            )
+
+    def test_cached_paths_expire_after_ttl(self):
+        with create_ssh_shell(command_path_cache_ttl=0) as shell:
+            shell.resolve_commands(["cat"])
+            assert_equal(None, shell._command_paths.get("cat"))
+
+
+def _command_path(shell, command):
+    return shell.run(["sh", "-c", "command -v {0}".format(command)], encoding="ascii").output.strip()
+
+
 class ReadInitializationLineTests(object):
     def test_reading_initialization_line_returns_int_from_line_of_file(self):
         assert_equal(42, spur.ssh._read_int_initialization_line(io.StringIO("42\n")))
@@ -169,3 +624,17 @@ class ReadInitializationLineTests(object):
             assert False, "Expected error"
         except spur.CommandInitializationError as error:
             assert "Failed to parse line 'x' as integer" in str(error)
+
+
+def _wait_for_assertion(assertion):
+    timeout = 1
+    period = 0.01
+    start = time.time()
+    while True:
+        try:
+            assertion()
+            return
+        except AssertionError:
+            if time.time() - start > timeout:
+                raise
+            time.sleep(period)
@@ -0,0 +1,136 @@
+from __future__ import unicode_literals
+
+import contextlib
+import os
+import uuid
+
+from spur.tempdir import create_temporary_dir
+from .assertions import assert_equal, assert_raises
+
+
+__all__ = ["SyncDirTestSet"]
+
+
+class SyncDirTestSet(object):
+    def test_sync_dir_copies_all_files_to_new_directory(self):
+        with self._create_dirs() as (shell, source, dest):
+            _write_file(source, "one.txt", "one")
+            _write_file(source, "sub/two.txt", "two")
+
+            result = shell.sync_dir(source, dest)
+
+            assert_equal(["one.txt", "sub", "sub/two.txt"], result.copied)
+            assert_equal({"one.txt": "one", "sub/two.txt": "two"}, _read_files(dest))
+
+    def test_sync_dir_only_copies_changed_files(self):
+        with self._create_dirs() as (shell, source, dest):
+            _write_file(source, "one.txt", "one")
+            _write_file(source, "two.txt", "two")
+            shell.sync_dir(source, dest)
+            _write_file(source, "two.txt", "two, changed", mtime_offset=10)
+
+            result = shell.sync_dir(source, dest)
+
+            assert_equal(["two.txt"], result.copied)
+            assert_equal({"one.txt": "one", "two.txt": "two, changed"}, _read_files(dest))
+
+    def test_sync_dir_copies_nothing_if_nothing_has_changed(self):
+        with self._create_dirs() as (shell, source, dest):
+            _write_file(source, "sub/one.txt", "one")
+            shell.sync_dir(source, dest)
+
+            result = shell.sync_dir(source, dest)
+
+            assert_equal([], result.copied)
+            assert_equal([], result.deleted)
+
+    def test_sync_dir_deletes_files_removed_from_source(self):
+        with self._create_dirs() as (shell, source, dest):
+            _write_file(source, "one.txt", "one")
+            _write_file(source, "sub/two.txt", "two")
+            shell.sync_dir(source, dest)
+            os.remove(os.path.join(source, "sub/two.txt"))
+            os.rmdir(os.path.join(source, "sub"))
+
+            result = shell.sync_dir(source, dest)
+
+            assert_equal(["sub"], result.deleted)
+            assert_equal({"one.txt": "one"}, _read_files(dest))
+
+    def test_sync_dir_keeps_removed_files_if_delete_is_false(self):
+        with self._create_dirs() as (shell, source, dest):
+            _write_file(source, "one.txt", "one")
+            shell.sync_dir(source, dest)
+            os.remove(os.path.join(source, "one.txt"))
+
+            result = shell.sync_dir(source, dest, delete=False)
+
+            assert_equal([], result.deleted)
+            assert_equal({"one.txt": "one"}, _read_files(dest))
+
+    def test_sync_dir_skips_and_keeps_ignored_files(self):
+        with self._create_dirs() as (shell, source, dest):
+            _write_file(source, "one.txt", "one")
+            _write_file(source, "one.pyc", "compiled")
+            _write_file(dest, "two.pyc", "compiled")
+
+            shell.sync_dir(source, dest, ignore=["*.pyc"])
+
+            assert_equal({"one.txt": "one", "two.pyc": "compiled"}, _read_files(dest))
+
+    def test_sync_dir_with_checksum_copies_files_with_same_size_and_different_content(self):
+        with self._create_dirs() as (shell, source, dest):
+            _write_file(source, "one.txt", "one")
+            _write_file(source, "two.txt", "two")
+            shell.sync_dir(source, dest)
+            _write_file(source, "two.txt", "TWO")
+            os.utime(os.path.join(source, "two.txt"), (0, os.path.getmtime(os.path.join(dest, "two.txt"))))
+
+            result = shell.sync_dir(source, dest, checksum=True)
+
+            assert_equal(["two.txt"], result.copied)
+            assert_equal({"one.txt": "one", "two.txt": "TWO"}, _read_files(dest))
+
+    def test_sync_dir_raises_error_for_unsupported_compression_without_changing_destination(self):
+        with self._create_dirs() as (shell, source, dest):
+            _write_file(source, "one.txt", "one")
+            shell.sync_dir(source, dest)
+            os.remove(os.path.join(source, "one.txt"))
+            _write_file(source, "two.txt", "two")
+
+            assert_raises(ValueError, lambda: shell.sync_dir(source, dest, compression="lzma"))
+
+            assert_equal({"one.txt": "one"}, _read_files(dest))
+
+    @contextlib.contextmanager
+    def _create_dirs(self):
+        # The destination is created under /tmp so that it can be inspected
+        # locally when the shell is connected to localhost over SSH
+        with self.create_shell() as shell:
+            with create_temporary_dir() as source:
+                dest = "/tmp/{0}".format(uuid.uuid4())
+                try:
+                    yield shell, source, dest
+                finally:
+                    shell.run(["rm", "-rf", dest])
+
+
+def _write_file(root, path, contents, mtime_offset=0):
+    path = os.path.join(root, path)
+    if not os.path.isdir(os.path.dirname(path)):
+        os.makedirs(os.path.dirname(path))
+    with open(path, "w") as f:
+        f.write(contents)
+    if mtime_offset:
+        mtime = os.path.getmtime(path) + mtime_offset
+        os.utime(path, (mtime, mtime))
+
+
+def _read_files(root):
+    files = {}
+    for dir_path, dir_names, file_names in os.walk(root):
+        for name in file_names:
+            path = os.path.join(dir_path, name)
+            with open(path) as f:
+                files[os.path.relpath(path, root)] = f.read()
+    return files
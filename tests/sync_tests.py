@@ -0,0 +1,60 @@
+from __future__ import unicode_literals
+
+from spur.sync import ManifestEntry, compare, parse_find_manifest
+from .assertions import assert_equal
+
+
+def test_files_with_different_size_or_mtime_are_copied():
+    source = {
+        "same": _file(size=1, mtime=1),
+        "size": _file(size=2, mtime=1),
+        "mtime": _file(size=1, mtime=2),
+        "new": _file(size=1, mtime=1),
+    }
+    destination = {
+        "same": _file(size=1, mtime=1),
+        "size": _file(size=1, mtime=1),
+        "mtime": _file(size=1, mtime=1),
+    }
+    to_copy, to_delete, to_hash = compare(source, destination, checksum=False, delete=True)
+    assert_equal(["mtime", "new", "size"], to_copy)
+    assert_equal([], to_delete)
+    assert_equal([], to_hash)
+
+
+def test_files_with_same_size_are_hashed_instead_of_comparing_mtime_if_checksum_is_set():
+    source = {"a": _file(size=1, mtime=1), "b": _file(size=2, mtime=1)}
+    destination = {"a": _file(size=1, mtime=2), "b": _file(size=1, mtime=1)}
+    to_copy, to_delete, to_hash = compare(source, destination, checksum=True, delete=True)
+    assert_equal(["b"], to_copy)
+    assert_equal(["a"], to_hash)
+
+
+def test_contents_of_deleted_directories_are_not_deleted_separately():
+    destination = {
+        "dir": ManifestEntry("d", 0, 0),
+        "dir/file": _file(size=1, mtime=1),
+        "dir-file": _file(size=1, mtime=1),
+    }
+    to_copy, to_delete, to_hash = compare({}, destination, checksum=False, delete=True)
+    assert_equal(["dir", "dir-file"], to_delete)
+
+
+def test_paths_are_only_deleted_to_change_their_type_if_delete_is_false():
+    source = {"changed": ManifestEntry("d", 0, 0)}
+    destination = {"changed": _file(size=1, mtime=1), "removed": _file(size=1, mtime=1)}
+    to_copy, to_delete, to_hash = compare(source, destination, checksum=False, delete=False)
+    assert_equal(["changed"], to_copy)
+    assert_equal(["changed"], to_delete)
+
+
+def test_find_manifest_is_parsed_without_ignored_paths():
+    output = b"d 4096 1.5 dir\0f 3 2.25 dir/a b\0f 1 3.0 dir/x.pyc\0"
+    assert_equal(
+        {"dir": ManifestEntry("d", 4096, 1), "dir/a b": ManifestEntry("f", 3, 2)},
+        parse_find_manifest(output, ["*.pyc"]),
+    )
+
+
+def _file(size, mtime):
+    return ManifestEntry("f", size, mtime)
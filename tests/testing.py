@@ -14,8 +14,16 @@ PASSWORD = os.environ["TEST_SSH_PASSWORD"]
 PORT = _int_or_none(os.environ.get("TEST_SSH_PORT", 22))
 
 
-def create_ssh_shell(missing_host_key=None, shell_type=None):
-    return spur.SshShell(
+def create_ssh_shell(missing_host_key=None, shell_type=None, **kwargs):
+    return spur.SshShell(**dict(_ssh_shell_kwargs(missing_host_key, shell_type), **kwargs))
+
+
+def create_async_ssh_shell(missing_host_key=None, shell_type=None):
+    return spur.AsyncSshShell(**_ssh_shell_kwargs(missing_host_key, shell_type))
+
+
+def _ssh_shell_kwargs(missing_host_key, shell_type):
+    return dict(
         hostname=HOSTNAME,
         username=USERNAME,
         password=PASSWORD,
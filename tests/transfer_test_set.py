@@ -0,0 +1,80 @@
+from __future__ import unicode_literals
+
+import contextlib
+import os
+import uuid
+
+from spur.tempdir import create_temporary_dir
+from .assertions import assert_equal
+
+
+__all__ = ["TransferTestSet"]
+
+
+class TransferTestSet(object):
+    def test_upload_files_copies_each_file_to_its_destination(self):
+        with self._create_dirs() as (shell, local_dir, remote_dir):
+            paths = _write_files(local_dir, 10)
+
+            shell.upload_files(
+                [(path, "{0}/sub/{1}".format(remote_dir, os.path.basename(path))) for path in paths],
+                concurrency=3,
+            )
+
+            for index, path in enumerate(paths):
+                remote_path = "{0}/sub/{1}".format(remote_dir, os.path.basename(path))
+                assert_equal(_contents(index), shell.files.read_bytes(remote_path))
+
+    def test_download_files_copies_each_file_to_its_destination(self):
+        with self._create_dirs() as (shell, local_dir, remote_dir):
+            remote_paths = ["{0}/{1}".format(remote_dir, index) for index in range(10)]
+            for index, remote_path in enumerate(remote_paths):
+                shell.files.write_bytes(remote_path, _contents(index))
+
+            local_paths = [os.path.join(local_dir, "sub", str(index)) for index in range(10)]
+            shell.download_files(list(zip(remote_paths, local_paths)), concurrency=3)
+
+            for index, local_path in enumerate(local_paths):
+                with open(local_path, "rb") as f:
+                    assert_equal(_contents(index), f.read())
+
+    def test_progress_is_reported_until_whole_file_is_transferred(self):
+        with self._create_dirs() as (shell, local_dir, remote_dir):
+            path, = _write_files(local_dir, 1, size=100 * 1024)
+            reports = []
+
+            shell.upload_files(
+                [(path, remote_dir + "/file")],
+                chunk_size=32 * 1024,
+                progress=lambda *args: reports.append(args),
+            )
+
+            assert_equal((path, 100 * 1024, 100 * 1024), reports[-1])
+
+    @contextlib.contextmanager
+    def _create_dirs(self):
+        with self.create_shell() as shell:
+            with create_temporary_dir() as local_dir:
+                remote_dir = "/tmp/{0}".format(uuid.uuid4())
+                shell.files.makedirs(remote_dir)
+                try:
+                    yield shell, local_dir, remote_dir
+                finally:
+                    shell.run(["rm", "-rf", remote_dir])
+
+
+def _write_files(root, count, size=None):
+    paths = []
+    for index in range(count):
+        path = os.path.join(root, str(index))
+        with open(path, "wb") as f:
+            f.write(_contents(index, size))
+        paths.append(path)
+    return paths
+
+
+def _contents(index, size=None):
+    contents = "file {0}\n".format(index).encode("ascii")
+    if size is not None:
+        contents = (contents * size)[:size]
+    return contents